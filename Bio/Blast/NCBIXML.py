@@ -19,6 +19,10 @@ _XMLParser          Generic SAX parser (private).
 Functions:
 parse               Incremental parser, this is an iterator that returns
                     Blast records.  It uses the BlastParser internally.
+parse_hsps          Fast incremental parser, this is an iterator that
+                    returns a tuple of scores and coordinates per HSP.
+index               Indexes a file and returns a dictionary like object,
+                    giving random access to the Blast record of each query.
 read                Returns a single Blast record. Uses the BlastParser internally.
 """
 from Bio.Blast import Record
@@ -37,10 +41,13 @@ class _XMLparser(ContentHandler):
 
         debug - integer, amount of debug information to print
         """
-        self._tag = []
+        self._tag = [] # the currently open tags
         self._value = ''
+        self._chunks = []
         self._debug = debug
         self._debug_ignore_list = []
+        # tag name -> method (or None), see _get_method
+        self._methods = {}
 
     def _secure_name(self, name):
         """Removes 'dangerous' from tag names
@@ -50,6 +57,20 @@ class _XMLparser(ContentHandler):
         # Replace '-' with '_' in XML tag names
         return name.replace('-', '_')
     
+    def _get_method(self, prefix, name):
+        """Return the bound method for a tag, or None (PRIVATE).
+
+        The methods are looked up once per tag name and cached.
+        """
+        key = prefix + name
+        try:
+            return self._methods[key]
+        except KeyError:
+            pass
+        method = getattr(self, self._secure_name(key), None)
+        self._methods[key] = method
+        return method
+
     def startElement(self, name, attr):
         """Found XML start tag
 
@@ -62,34 +83,33 @@ class _XMLparser(ContentHandler):
         self._tag.append(name)
         
         # Try to call a method (defined in subclasses)
-        method = self._secure_name('_start_' + name)
-
-        #Note could use try / except AttributeError
-        #BUT I found often triggered by nested errors...
-        if hasattr(self, method):
-            eval("self.%s()" % method)
+        method = self._get_method('_start_', name)
+        if method is not None:
+            method()
             if self._debug > 4:
-                print "NCBIXML: Parsed:  " + method
-        else:
+                print "NCBIXML: Parsed:  " + self._secure_name('_start_' + name)
+        elif self._debug > 3:
             # Doesn't exist (yet)
+            method = self._secure_name('_start_' + name)
             if method not in self._debug_ignore_list:
-                if self._debug > 3:
-                    print "NCBIXML: Ignored: " + method
+                print "NCBIXML: Ignored: " + method
                 self._debug_ignore_list.append(method)
 
         #We don't care about white space in parent tags like Hsp,
         #but that white space doesn't belong to child tags like Hsp_midline
-        if self._value.strip():
-            raise ValueError("What should we do with %s before the %s tag?" \
-                             % (repr(self._value), name))
-        self._value = ""
+        if self._chunks:
+            value = "".join(self._chunks)
+            if value.strip():
+                raise ValueError("What should we do with %s before the %s tag?" \
+                                 % (repr(value), name))
+            self._chunks = []
 
     def characters(self, ch):
         """Found some text
 
         ch -- characters read
         """
-        self._value += ch # You don't ever get the whole string
+        self._chunks.append(ch) # You don't ever get the whole string
 
     def endElement(self, name):
         """Found XML end tag
@@ -97,24 +117,25 @@ class _XMLparser(ContentHandler):
         name -- tag name
         """
         # DON'T strip any white space, we may need it e.g. the hsp-midline
+        self._value = "".join(self._chunks)
+        self._tag.pop()
         
         # Try to call a method (defined in subclasses)
-        method = self._secure_name('_end_' + name)
-        #Note could use try / except AttributeError
-        #BUT I found often triggered by nested errors...
-        if hasattr(self, method):
-            eval("self.%s()" % method)
+        method = self._get_method('_end_', name)
+        if method is not None:
+            method()
             if self._debug > 2:
-                print "NCBIXML: Parsed:  " + method, self._value
-        else:
+                print "NCBIXML: Parsed:  " + self._secure_name('_end_' + name), self._value
+        elif self._debug > 1:
             # Doesn't exist (yet)
+            method = self._secure_name('_end_' + name)
             if method not in self._debug_ignore_list:
-                if self._debug > 1:
-                    print "NCBIXML: Ignored: " + method, self._value
+                print "NCBIXML: Ignored: " + method, self._value
                 self._debug_ignore_list.append(method)
         
         # Reset character buffer
         self._value = ''
+        self._chunks = []
         
 class BlastParser(_XMLparser):
     """Parse XML BLAST data into a Record.Blast object
@@ -124,13 +145,16 @@ class BlastParser(_XMLparser):
     _end_TAG        called when the end tag is found
     """
 
-    def __init__(self, debug=0):
+    def __init__(self, debug=0, max_evalue=None):
         """Constructor
 
         debug - integer, amount of debug information to print
+        max_evalue - if given, HSPs with a larger e-value are dropped,
+                     and hits without HSPs left
         """
         # Calling superclass method
         _XMLparser.__init__(self, debug)
+        self._max_evalue = max_evalue
         
         self._parser = xml.sax.make_parser()
         self._parser.setContentHandler(self)
@@ -383,6 +407,10 @@ class BlastParser(_XMLparser):
         self._descr.num_alignments = 0
 
     def _end_Hit(self):
+        if self._max_evalue is not None and not self._hit.hsps:
+            # all HSPs were filtered out, drop the hit
+            self._blast.alignments.pop()
+            self._blast.descriptions.pop()
         #Cleanup
         self._blast.multiple_alignment = None
         self._hit = None
@@ -420,6 +448,20 @@ class BlastParser(_XMLparser):
         self._blast.multiple_alignment.append(Record.MultipleAlignment())
         self._mult_al = self._blast.multiple_alignment[-1]
 
+    def _end_Hsp(self):
+        if self._max_evalue is not None \
+        and self._hsp.expect > self._max_evalue:
+            self._hit.hsps.pop()
+            self._blast.multiple_alignment.pop()
+            self._descr.num_alignments -= 1
+            if not self._hit.hsps:
+                # take the description scores from the next HSP
+                self._descr.score = None
+                self._descr.bits = None
+                self._descr.e = None
+        self._hsp = None
+        self._mult_al = None
+
     # Hsp_num is useless
     def _end_Hsp_score(self):
         """raw score of HSP
@@ -561,6 +603,81 @@ class BlastParser(_XMLparser):
         """
         self._blast.ka_params = self._blast.ka_params + (float(self._value),)
     
+#Fields of the tuples given by parse_hsps
+HSP_FIELDS = ("query_id", "query", "hit_id", "hit_def", "expect", "bits",
+              "score", "identities", "positives", "gaps", "align_length",
+              "query_start", "query_end", "sbjct_start", "sbjct_end")
+
+#HSP tags, with their index in HSP_FIELDS and type
+_HSP_TAGS = {"Hsp_evalue" : (4, float),
+             "Hsp_bit-score" : (5, float),
+             "Hsp_score" : (6, float),
+             "Hsp_identity" : (7, int),
+             "Hsp_positive" : (8, int),
+             "Hsp_gaps" : (9, int),
+             "Hsp_align-len" : (10, int),
+             "Hsp_query-from" : (11, int),
+             "Hsp_query-to" : (12, int),
+             "Hsp_hit-from" : (13, int),
+             "Hsp_hit-to" : (14, int)}
+
+#Query and hit tags, with the _HSPParser attribute they are stored in
+_HSP_CONTEXT_TAGS = {"BlastOutput_query-ID" : "_query_id",
+                     "BlastOutput_query-def" : "_query",
+                     "Iteration_query-ID" : "_iteration_query_id",
+                     "Iteration_query-def" : "_iteration_query",
+                     "Hit_id" : "_hit_id",
+                     "Hit_def" : "_hit_def"}
+
+class _HSPParser:
+    """Collects the HSPs in BLAST XML as tuples (PRIVATE).
+
+    Used by the parse_hsps function, only looks at the tags listed in
+    _HSP_TAGS and _HSP_CONTEXT_TAGS.
+    """
+    def __init__(self, max_evalue=None):
+        self._records = []
+        self._max_evalue = max_evalue
+        self._chunks = []
+        self._query_id = None
+        self._query = None
+        self._iteration_query_id = None
+        self._iteration_query = None
+        self._hit_id = None
+        self._hit_def = None
+        self._hsp = None
+
+    def startElement(self, name, attr):
+        if name == "Hsp":
+            self._hsp = [None] * len(HSP_FIELDS)
+        elif name == "Iteration":
+            self._iteration_query_id = None
+            self._iteration_query = None
+        self._chunks = []
+
+    def characters(self, ch):
+        self._chunks.append(ch)
+
+    def endElement(self, name):
+        tag = _HSP_TAGS.get(name)
+        if tag is not None:
+            index, convert = tag
+            self._hsp[index] = convert("".join(self._chunks))
+        elif name == "Hsp":
+            hsp = self._hsp
+            if self._max_evalue is None or hsp[4] <= self._max_evalue:
+                #As in the BlastParser, fall back on the query of the
+                #header for old pre 2.2.14 BLAST
+                hsp[0] = self._iteration_query_id or self._query_id
+                hsp[1] = self._iteration_query or self._query
+                hsp[2] = self._hit_id
+                hsp[3] = self._hit_def
+                self._records.append(tuple(hsp))
+            self._hsp = None
+        elif name in _HSP_CONTEXT_TAGS:
+            setattr(self, _HSP_CONTEXT_TAGS[name], "".join(self._chunks))
+        self._chunks = []
+
 def read(handle, debug=0):
    """Returns a single Blast record (assumes just one query).
 
@@ -587,11 +704,13 @@ def read(handle, debug=0):
    return first
 
 
-def parse(handle, debug=0):
+def parse(handle, debug=0, max_evalue=None):
     """Returns an iterator a Blast record for each query.
 
     handle - file handle to and XML file to parse
     debug - integer, amount of debug information to print
+    max_evalue - if given, HSPs with a larger e-value are dropped while
+                 parsing, and so are hits without any HSPs left
 
     This is a generator function that returns multiple Blast records
     objects - one for each query sequence given to blast.  The file
@@ -604,8 +723,68 @@ def parse(handle, debug=0):
     Should also cope with XML output from older versions BLAST which
     gave multiple XML files concatenated together (giving a single file
     which strictly speaking wasn't valid XML)."""
+    return _parse(handle, lambda : BlastParser(debug, max_evalue))
+
+def parse_hsps(handle, max_evalue=None):
+    """Returns an iterator giving a tuple for each HSP.
+
+    handle - file handle to and XML file to parse
+    max_evalue - if given, HSPs with a larger e-value are skipped
+
+    This is a much faster and leaner alternative to the parse function
+    for large BLAST runs, when the alignments themselves are not needed.
+    No record objects are created; the tuples hold the fields listed in
+    HSP_FIELDS (query and hit identifiers, e-value, scores and
+    coordinates), e.g.
+
+    >>> for hsp in parse_hsps(handle, max_evalue=1e-10):
+    ...     query_id, query, hit_id, hit_def, expect = hsp[:5]
+
+    Missing values (e.g. no Hsp_gaps tag) are None.
+    """
+    return _parse(handle, lambda : _HSPParser(max_evalue))
+
+def index(filename, key_function=None, index_filename=None):
+    """Indexes a BLAST XML file and returns a dictionary like object.
+
+    filename - string giving name of the XML file to be indexed
+    key_function - optional callback function which when given a query
+                   identifier string should return a unique key for the
+                   dictionary.
+    index_filename - optional name of a file to save the index in. If it
+                     exists and matches the XML file (same size and
+                     modification time), the saved index is used instead
+                     of scanning the XML file again.
+
+    The XML file is scanned once, noting the location of each <Iteration>
+    (i.e. each query). When you access a query via the dictionary methods,
+    just that part of the file is parsed into a Blast record:
+
+    >>> records = index("Blast/xbt010.xml")
+    >>> len(records)
+    4
+    >>> print records["2"].query_letters
+    304
+
+    The keys are the query identifiers (Iteration_query-ID), or for the
+    output of BLAST before 2.2.14 (several XML files concatenated together)
+    the BlastOutput_query-ID. These must be unique, for instance PSI-BLAST
+    output with several rounds per query cannot be indexed.
+
+    As with Bio.SeqIO.index, the values() and items() methods are not
+    supported since this would load all the records into memory at once.
+    """
+    from Bio.Blast._index import XmlBlastDict
+    return XmlBlastDict(filename, key_function, index_filename)
+
+def _parse(handle, create_parser):
+    """Generic incremental parser, used by parse and parse_hsps (PRIVATE).
+
+    create_parser - function returning a new SAX style content handler,
+                    which collects its results in a _records list.
+    """
     from xml.parsers import expat
-    BLOCK = 1024
+    BLOCK = 65536
     MARGIN = 10 # must be at least length of newline + XML start
     XML_START = "<?xml"
 
@@ -623,16 +802,17 @@ def parse(handle, debug=0):
                              % XML_START)
 
         expat_parser = expat.ParserCreate()
-        blast_parser = BlastParser(debug)
+        # Deliver text in large pieces rather than line by line
+        expat_parser.buffer_text = True
+        expat_parser.buffer_size = BLOCK
+        blast_parser = create_parser()
         expat_parser.StartElementHandler = blast_parser.startElement
         expat_parser.EndElementHandler = blast_parser.endElement
         expat_parser.CharacterDataHandler = blast_parser.characters
 
-        expat_parser.Parse(text, False)
-        while blast_parser._records:
-            record = blast_parser._records[0]
-            blast_parser._records = blast_parser._records[1:]
-            yield record
+        #The first block may already contain the start of the next
+        #XML file, so handle it like the other blocks
+        pending = text
 
         while True:
             #Read in another block of the file...
@@ -0,0 +1,254 @@
+# Copyright 2026 by the Biopython contributors.  All rights reserved.
+# This code is part of the Biopython distribution and governed by its
+# license.  Please see the LICENSE file that should have been included
+# as part of this package.
+"""Run a BLAST search in parallel on chunks of a FASTA query file.
+
+The query file is split into chunks, and the BLAST command line (from
+Bio.Blast.Applications) is run on each chunk using several local worker
+threads, each running one BLAST process at a time. The output of the
+chunks is parsed and returned in the order of the queries, while BLAST
+is still running on later chunks:
+
+>>> from Bio.Blast.Applications import NcbiblastpCommandline
+>>> from Bio.Blast.Parallel import ParallelBlast
+>>> cline = NcbiblastpCommandline(db="nr", evalue=0.001, outfmt=5)
+>>> for record in ParallelBlast(cline, "queries.fasta", num_workers=4):
+...     print record.query, len(record.alignments)
+
+The query and output file options of the command line are set for each
+chunk (query and out for the BLAST+ tools, infile and outfile for the
+classic tools), so you don't need to set them. The output is parsed
+with Bio.Blast.NCBIXML.parse by default, so ask BLAST for XML output
+(outfmt=5 or align_view=7), or give another parser function.
+
+Temporary files are written to a new directory (see the tempfile module),
+which is removed again once all the results have been returned, or when
+the close method is called.
+"""
+
+import os
+import sys
+import copy
+import shutil
+import tempfile
+import threading
+import traceback
+import subprocess
+
+class ParallelBlast:
+    """Iterator over the BLAST results of a FASTA file, run in parallel.
+
+    Each chunk which fails (non-zero return code or no output file) is
+    run again up to the given number of retries. If it still fails,
+    a RuntimeError is raised once its results are due.
+    """
+    def __init__(self, cline, query_file, num_chunks=None, num_workers=2,
+                 parser=None, retries=1, tmp_dir=None):
+        """Create the iterator (BLAST is only run once iteration starts).
+
+        cline - A BLAST command line object from Bio.Blast.Applications
+                (or another AbstractCommandline with query and output
+                file options).
+        query_file - Name of the FASTA file of query sequences.
+        num_chunks - Number of chunks to split the queries in (default
+                     four per worker, to share out the work evenly).
+        num_workers - Number of BLAST processes to run at the same time.
+        parser - Function taking a handle to the output of a chunk and
+                 returning an iterator over the results (default
+                 Bio.Blast.NCBIXML.parse).
+        retries - Number of times a failing chunk is run again.
+        tmp_dir - Directory in which the temporary directory is made.
+        """
+        if num_workers < 1:
+            raise ValueError("Need at least one worker")
+        if num_chunks is None:
+            num_chunks = 4 * num_workers
+        if num_chunks < 1:
+            raise ValueError("Need at least one chunk")
+        if retries < 0:
+            raise ValueError("The number of retries can't be negative")
+        if parser is None:
+            from Bio.Blast.NCBIXML import parse as parser
+        self._cline = cline
+        self._input_name = self._find_parameter(["query", "infile"])
+        self._output_name = self._find_parameter(["out", "outfile"])
+        self.query_file = query_file
+        self.num_chunks = num_chunks
+        self.num_workers = num_workers
+        self._parser = parser
+        self.retries = retries
+        self._tmp_dir = tmp_dir
+        self._directory = None
+        self._started = False
+        self._stopped = False
+        self._threads = []
+        self._commands = []
+        self._outputs = []
+        #The results of the chunks (None until it finished, then an error
+        #message or "" if it ran fine), and the next chunk to run
+        self._errors = []
+        self._next = 0
+        self._condition = threading.Condition()
+
+    def _find_parameter(self, names):
+        """Return the first of these option names the command line has."""
+        for name in names:
+            try:
+                self._cline._get_parameter(name)
+                return name
+            except ValueError:
+                pass
+        raise ValueError("Command line has none of the options %s" \
+                         % ", ".join(names))
+
+    def _split(self):
+        """Write the chunks of the query file, return their file names."""
+        handle = open(self.query_file, "rU")
+        count = 0
+        for line in handle:
+            if line[0] == ">":
+                count += 1
+        handle.close()
+        if not count:
+            return []
+        num_chunks = min(self.num_chunks, count)
+        #Chunk i gets the records bounds[i] to bounds[i+1]-1
+        bounds = [(i * count) // num_chunks for i in range(num_chunks + 1)]
+        filenames = []
+        handle = open(self.query_file, "rU")
+        out_handle = None
+        record = -1
+        for line in handle:
+            if line[0] == ">":
+                record += 1
+                if record == bounds[len(filenames)]:
+                    if out_handle:
+                        out_handle.close()
+                    filename = os.path.join(self._directory, "chunk%i.fasta" \
+                                            % len(filenames))
+                    out_handle = open(filename, "w")
+                    filenames.append(filename)
+            if out_handle:
+                out_handle.write(line)
+        if out_handle:
+            out_handle.close()
+        handle.close()
+        return filenames
+
+    def _start(self):
+        """Split the queries and start the worker threads (PRIVATE)."""
+        self._started = True
+        self._directory = tempfile.mkdtemp(prefix="blast", dir=self._tmp_dir)
+        for filename in self._split():
+            output = filename[:-len(".fasta")] + ".out"
+            cline = copy.deepcopy(self._cline)
+            cline.set_parameter(self._input_name, filename)
+            cline.set_parameter(self._output_name, output)
+            self._commands.append(str(cline))
+            self._outputs.append(output)
+            self._errors.append(None)
+        for i in range(min(self.num_workers, len(self._commands))):
+            thread = threading.Thread(target=self._work)
+            thread.setDaemon(True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        """Run chunks until there are none left (PRIVATE)."""
+        condition = self._condition
+        while True:
+            condition.acquire()
+            index = self._next
+            self._next += 1
+            stopped = self._stopped
+            condition.release()
+            if stopped or index >= len(self._commands):
+                return
+            try:
+                error = self._run(self._commands[index],
+                                  self._outputs[index])
+            except Exception:
+                #e.g. the command could not be started, record the error
+                #so that the thread waiting for this chunk doesn't hang
+                error = "".join(traceback.format_exception_only(
+                    *sys.exc_info()[:2])).strip()
+            condition.acquire()
+            self._errors[index] = error
+            condition.notifyAll()
+            condition.release()
+
+    def _run(self, command, output):
+        """Run one command, with retries, and return an error message."""
+        for attempt in range(self.retries + 1):
+            if os.path.isfile(output):
+                os.remove(output)
+            #Use .communicate as can get deadlocks with .wait(), see Bug 2804
+            child = subprocess.Popen(command,
+                                     stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.PIPE,
+                                     close_fds=(sys.platform!="win32"),
+                                     shell=(sys.platform!="win32"))
+            stdout, stderr = child.communicate()
+            if child.returncode == 0 and os.path.isfile(output):
+                return ""
+            if child.returncode == 0:
+                stderr = "No output file %s. %s" % (output, stderr)
+        return "Return code %i from %s\n%s" \
+               % (child.returncode, command, stderr.strip())
+
+    def _wait(self, index):
+        """Wait for a chunk to finish, raise RuntimeError if it failed."""
+        condition = self._condition
+        condition.acquire()
+        while self._errors[index] is None:
+            condition.wait()
+        error = self._errors[index]
+        condition.release()
+        if error:
+            raise RuntimeError("BLAST failed on chunk %i of %s after %i "
+                               "attempts. %s" % (index, self.query_file,
+                                                 self.retries + 1, error))
+
+    def __iter__(self):
+        """Iterate over the parsed results, in the order of the queries."""
+        if self._started:
+            raise ValueError("The BLAST run can only be iterated over once")
+        self._start()
+        handle = None
+        try:
+            for index in range(len(self._commands)):
+                self._wait(index)
+                handle = open(self._outputs[index])
+                for record in self._parser(handle):
+                    yield record
+                handle.close()
+                handle = None
+                #Don't keep the output of the finished chunks
+                os.remove(self._outputs[index])
+        except:
+            #A parser error, or the generator was closed (GeneratorExit).
+            #The handle must be closed first for close to remove the file
+            #on Windows.
+            if handle is not None:
+                handle.close()
+            self.close()
+            raise
+        self.close()
+
+    def close(self):
+        """Stop running chunks and remove the temporary files.
+
+        Chunks which are running are finished first (so this may take
+        as long as a BLAST search on one chunk).
+        """
+        condition = self._condition
+        condition.acquire()
+        self._stopped = True
+        condition.release()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._directory is not None and os.path.isdir(self._directory):
+            shutil.rmtree(self._directory)
@@ -6,6 +6,10 @@
 """A parser for the NCBI blastpgp version 2.2.5 output format. Currently only supports
 the '-m 9' option, (table w/ annotations).
 Returns a BlastTableRec instance
+
+For large tables, the parse_columns and parse_query_groups functions read
+the hits into NumPy arrays instead (for the '-m 8' and '-m 9' options, and
+the BLAST+ '-outfmt 6' and '-outfmt 7' options).
 """
 
 class BlastTableEntry:
@@ -53,13 +57,16 @@ class BlastTableReader:
       self.table_record = BlastTableRec()
       self._n += 1
       inline = self._lookahead
+      # BLAST+ -outfmt 7 ends with a "# BLAST processed N queries" line
+      while inline.startswith('# BLAST processed'):
+         inline = self.handle.readline()
       if not inline:
          return None
       while inline:
          if inline[0] == '#':
             if self._in_header:
                self._in_header = self._consume_header(inline)
-            else:
+            elif inline.find('hits found') == -1:
                break
          else:
             self._consume_entry(inline)
@@ -74,16 +81,20 @@ class BlastTableReader:
       current_entry = BlastTableEntry(inline)
       self.table_record.add_entry(current_entry)
    def _consume_header(self, inline):
+      # BLAST+ -outfmt 7 gives the number of hits ("# 0 hits found"),
+      # after the Fields line if there are hits
+      in_header = inline.find('hits found') == -1
       for keyword in reader_keywords.keys():
          if inline.find(keyword) > -1:
             in_header = self._Parse('_parse_%s' % reader_keywords[keyword],inline)
             break
       return in_header
    def _parse_version(self, inline):
-      program, version, date = inline.split()[1:]
-      self.table_record.program = program
-      self.table_record.version = version
-      self.table_record.date = date
+      # BLAST+ doesn't give the date
+      fields = inline.split()[1:]
+      self.table_record.program = fields[0]
+      self.table_record.version = fields[1]
+      self.table_record.date = " ".join(fields[2:]) or None
       return 1
    def _parse_iteration(self, inline):
       self.table_record.iteration = int(inline.split()[2])
@@ -98,6 +109,208 @@ class BlastTableReader:
       return 0
    def _Parse(self, method_name, inline):
       return getattr(self,method_name)(inline)
-      
 
+def index(filename, key_function=None, index_filename=None):
+   """Indexes a BLAST table file and returns a dictionary like object.
+
+   filename - string giving name of the table file to be indexed
+   key_function - optional callback function which when given a query
+                  identifier string should return a unique key for the
+                  dictionary.
+   index_filename - optional name of a file to save the index in, which
+                    is reused while the table file is unchanged.
+
+   The values are BlastTableRec instances, parsed when they are accessed.
+   Both tables with comment lines ('-m 9') and without ('-m 8') can be
+   indexed; in the latter case the lines of each query are expected to
+   be together. See also Bio.Blast.NCBIXML.index for XML output.
+   """
+   from Bio.Blast._index import TableBlastDict
+   return TableBlastDict(filename, key_function, index_filename)
+
+
+#Columnar reading into NumPy arrays
+STANDARD_FIELDS = ("qseqid", "sseqid", "pident", "length", "mismatch",
+                   "gapopen", "qstart", "qend", "sstart", "send", "evalue",
+                   "bitscore")
+_FLOAT_FIELDS = ["pident", "ppos", "evalue", "bitscore"]
+_INT_FIELDS = ["length", "mismatch", "gapopen", "gaps", "qstart", "qend",
+               "sstart", "send", "qlen", "slen", "score", "nident",
+               "positive", "qframe", "sframe", "qcovs", "qcovhsp"]
+
+class BlastTableColumns:
+   """Columns of (part of) a BLAST table, as NumPy arrays.
+
+   There is an attribute for each field (using the BLAST+ -outfmt field
+   names, e.g. qseqid, sseqid, pident, length, evalue, bitscore). Numeric
+   fields are float or integer arrays, while identifiers and other text
+   fields are integer codes; the text for code i of a field is ids[field][i].
+   The codes are shared between all the chunks of a file.
+
+   Use NumPy operations and the take method to work on the hits, e.g.
+
+   >>> good = columns.take(columns.evalue <= 1e-5)
+   >>> best = good.best_hits()
+   >>> print best.ids["qseqid"][best.qseqid[0]], best.sseqid[0]
+   """
+   def __init__(self, fields, arrays, ids):
+      self.fields = fields
+      self.ids = ids
+      for field in fields:
+         setattr(self, field, arrays[field])
+
+   def __len__(self):
+      return len(getattr(self, self.fields[0]))
+
+   def take(self, index):
+      """Returns the selected rows (index is a slice, mask or index array)."""
+      arrays = {}
+      for field in self.fields:
+         arrays[field] = getattr(self, field)[index]
+      return BlastTableColumns(self.fields, arrays, self.ids)
+
+   def best_hits(self):
+      """Returns the rows with the highest bit score for each query.
+
+      For ties, the first of these rows is used. The rows stay in order.
+      """
+      import numpy
+      if not len(self):
+         return self
+      order = numpy.lexsort((-self.bitscore, self.qseqid))
+      query = self.qseqid[order]
+      first = numpy.concatenate(([True], query[1:] != query[:-1]))
+      return self.take(numpy.sort(order[first]))
+
+   def query_coverage(self):
+      """Returns the fraction of the query covered by each alignment.
+
+      This needs the qlen field (e.g. BLAST+ -outfmt "6 std qlen").
+      """
+      import numpy
+      return (abs(self.qend - self.qstart) + 1) / numpy.asarray(self.qlen, "d")
+
+def _make_columns(text, fields, ids, index):
+   """Turns lines of tab separated text into a BlastTableColumns (PRIVATE)."""
+   import numpy
+   from itertools import izip
+   from operator import itemgetter
+   if "\r" in text:
+      text = text.replace("\r", "")
+   if text.startswith("#") or "\n#" in text or "\n\n" in text:
+      #Drop the comment and blank lines
+      text = "".join([line for line in text.splitlines(True)
+                      if line[0] not in "#\n"])
+   values = text.replace("\n", "\t").split("\t")
+   count = len(fields)
+   rows = (len(values) - 1) // count
+   if len(values) != rows * count + 1:
+      raise ValueError("Expected %i tab separated fields on each line"
+                       % count)
+   arrays = {}
+   for i, field in enumerate(fields):
+      column = values[i:rows*count:count]
+      if field in _FLOAT_FIELDS:
+         arrays[field] = numpy.fromstring(" ".join(column), "d", sep=" ")
+      elif field in _INT_FIELDS:
+         arrays[field] = numpy.fromstring(" ".join(column), "i", sep=" ")
+      else:
+         if not column:
+            arrays[field] = numpy.zeros(0, "i")
+            continue
+         #Look up the codes in a dictionary, adding the new texts
+         field_ids = ids[field]
+         field_index = index[field]
+         codes = numpy.array(map(field_index.get, column, [-1] * rows), "i")
+         missing = numpy.flatnonzero(codes < 0).tolist()
+         if missing:
+            if len(missing) == 1:
+               missing_names = [column[missing[0]]]
+            else:
+               missing_names = itemgetter(*missing)(column)
+            #Number the new texts in order of their first line
+            new_names, first = numpy.unique(numpy.array(missing_names),
+                                            return_index=True)
+            new_names = new_names[numpy.argsort(first)].tolist()
+            new_index = dict(izip(new_names,
+                                  xrange(len(field_ids),
+                                         len(field_ids) + len(new_names))))
+            field_index.update(new_index)
+            field_ids.extend(new_names)
+            codes[missing] = map(new_index.get, missing_names)
+         arrays[field] = codes
+      if len(arrays[field]) != rows:
+         raise ValueError("Bad value in field %s" % field)
+   return BlastTableColumns(fields, arrays, ids)
+
+def parse_columns(handle, fields=STANDARD_FIELDS, block_size=16777216):
+   """Iterates over a BLAST table in chunks, as BlastTableColumns objects.
+
+   handle - handle to a tab separated BLAST table (blastall -m 8 or 9,
+            BLAST+ -outfmt 6 or 7), comment lines are skipped
+   fields - the field names of the columns; the default is the standard
+            twelve columns (BLAST+ -outfmt 6 or "6 std")
+   block_size - about how many bytes to read for each chunk
+
+   This avoids creating an object for each line, so for large tables it
+   is faster than the BlastTableReader and needs far less memory. The
+   best_hits method and parse_query_groups function need the qseqid
+   field. Needs NumPy.
+   """
+   fields = tuple(fields)
+   ids = {}
+   index = {}
+   for field in fields:
+      ids[field] = []
+      index[field] = {}
+   pending = ""
+   while True:
+      text = handle.read(block_size)
+      if not text:
+         break
+      text = pending + text
+      end = text.rfind("\n") + 1
+      pending = text[end:]
+      if end:
+         yield _make_columns(text[:end], fields, ids, index)
+   if pending.strip():
+      yield _make_columns(pending + "\n", fields, ids, index)
+
+def _join(first, second):
+   """Joins two BlastTableColumns objects of the same file (PRIVATE)."""
+   import numpy
+   arrays = {}
+   for field in first.fields:
+      arrays[field] = numpy.concatenate((getattr(first, field),
+                                         getattr(second, field)))
+   return BlastTableColumns(first.fields, arrays, first.ids)
+
+def parse_query_groups(handle, fields=STANDARD_FIELDS, block_size=16777216):
+   """Iterates over a BLAST table as (query id, BlastTableColumns) tuples.
+
+   Arguments as for parse_columns. The lines for each query are expected
+   to be together (as in the output of BLAST). The columns for a query are
+   views on the columns of the chunk, so no object is made for each line:
 
+   >>> for query, hits in parse_query_groups(handle):
+   ...     print query, len(hits), hits.evalue.min()
+   """
+   import numpy
+   #The last query seen, which may continue in the next chunk
+   previous = None
+   for columns in parse_columns(handle, fields, block_size):
+      if not len(columns):
+         continue
+      query = columns.qseqid
+      starts = numpy.flatnonzero(query[1:] != query[:-1]) + 1
+      starts = [0] + starts.tolist() + [len(query)]
+      for i in range(len(starts) - 1):
+         group = columns.take(slice(starts[i], starts[i + 1]))
+         if previous is not None:
+            if i == 0 and previous.qseqid[0] == group.qseqid[0]:
+               previous = _join(previous, group)
+               continue
+            yield previous.ids["qseqid"][previous.qseqid[0]], previous
+         previous = group
+   if previous is not None:
+      yield previous.ids["qseqid"][previous.qseqid[0]], previous
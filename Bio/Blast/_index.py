@@ -0,0 +1,380 @@
+# Copyright 2026 by the Biopython contributors.  All rights reserved.
+# This code is part of the Biopython distribution and governed by its
+# license.  Please see the LICENSE file that should have been included
+# as part of this package.
+"""Dictionary like indexing of BLAST output files (PRIVATE).
+
+You are not expected to access this module, or any of its code, directly.
+This is all handled internally by the Bio.Blast.NCBIXML.index(...) and
+Bio.Blast.ParseBlastTable.index(...) functions which are the public
+interface for this functionality.
+
+As in Bio.SeqIO.index, we scan over the file once, noting the file offset
+of each query's result against the query identifier, and only parse the
+result for a query when it is accessed.
+
+The offsets can be saved to an index file, which is reused as long as the
+BLAST output file has not changed (same size and modification time). This
+saves scanning a very large file again.
+"""
+
+import os
+import re
+
+class _IndexedBlastDict(dict):
+    """Read only dictionary interface to a BLAST output file (PRIVATE).
+
+    Keeps the keys (query identifiers) and file offsets in memory, and
+    parses the result of a query when it is accessed.
+
+    As with Bio.SeqIO.index, duplicate keys are not allowed. If this
+    happens (e.g. several PSI-BLAST rounds for one query), a ValueError
+    exception is raised.
+
+    By default the query identifier is used as the dictionary key.
+    This can be changed by supplying an optional key_function, a callback
+    function which will be given the query identifier and must return the
+    desired key.
+
+    Note that this dictionary is essentially read only. You cannot
+    add or change values, pop values, nor clear the dictionary.
+    """
+    def __init__(self, filename, key_function, index_filename):
+        dict.__init__(self) #init as empty dict!
+        self._handle = open(filename, "rb")
+        self._key_function = key_function
+        self._index_filename = index_filename
+        self._format = ""
+        #Subclasses set self._format and call self._load_or_build()
+
+    def __repr__(self):
+        return "%s.index('%s', key_function=%s)" \
+               % (self._format, self._handle.name, self._key_function)
+
+    def __str__(self):
+        if self:
+            return "{%s : Record(...), ...}" % repr(self.keys()[0])
+        else:
+            return "{}"
+
+    def _record_key(self, identifier, value):
+        """Used by subclasses to record file offsets for identifiers (PRIVATE).
+
+        This will apply the key_function (if given) to map the query
+        identifier to the desired key.
+
+        This will raise a ValueError if a key occurs more than once.
+        """
+        if self._key_function:
+            key = self._key_function(identifier)
+        else:
+            key = identifier
+        if key in self:
+            raise ValueError("Duplicate key '%s'" % key)
+        else:
+            dict.__setitem__(self, key, value)
+
+    def _scan(self):
+        """Generate (identifier, value) pairs for the file (PRIVATE).
+
+        The value is a tuple of integers. Must be overridden."""
+        raise NotImplementedError
+
+    def _file_signature(self):
+        """String identifying the version of the indexed file (PRIVATE)."""
+        info = os.stat(self._handle.name)
+        return "%s\t%i\t%i" % (self._format, info.st_size, int(info.st_mtime))
+
+    def _load_or_build(self):
+        """Read the index file if it is up to date, otherwise scan (PRIVATE).
+
+        The index file is a tab separated text file, with the format and
+        signature of the BLAST file on the first line, followed by a line
+        with the identifier and integer values for each query.
+        """
+        signature = self._file_signature()
+        index_filename = self._index_filename
+        if index_filename and os.path.isfile(index_filename):
+            handle = open(index_filename, "rb")
+            if handle.readline().rstrip("\n") == signature:
+                for line in handle:
+                    parts = line.rstrip("\n").split("\t")
+                    self._record_key(parts[0], tuple(map(int, parts[1:])))
+                handle.close()
+                return
+            handle.close()
+        entries = []
+        for identifier, value in self._scan():
+            self._record_key(identifier, value)
+            entries.append((identifier, value))
+        if index_filename:
+            handle = open(index_filename, "wb")
+            handle.write(signature + "\n")
+            for identifier, value in entries:
+                if "\t" in identifier or "\n" in identifier:
+                    handle.close()
+                    os.remove(index_filename)
+                    raise ValueError("Cannot save query identifier %s "
+                                     "in an index file" % repr(identifier))
+                handle.write("\t".join([identifier] + map(str, value)) + "\n")
+            handle.close()
+
+    def values(self):
+        """Would be a list of the Record objects, but not implemented.
+
+        In general you can be indexing very very large files, with millions
+        of queries. Loading all these into memory at once as Record objects
+        would (probably) use up all the RAM. Therefore we simply don't
+        support this dictionary method.
+        """
+        raise NotImplementedError("Due to memory concerns, when indexing a "
+                                  "BLAST file you cannot access all the "
+                                  "records at once.")
+
+    def items(self):
+        """Would be a list of the (key, Record) tuples, but not implemented.
+
+        See the values method.
+        """
+        raise NotImplementedError("Due to memory concerns, when indexing a "
+                                  "BLAST file you cannot access all the "
+                                  "records at once.")
+
+    def iteritems(self):
+        """Iterate over the (key, Record) items."""
+        for key in self.__iter__():
+            yield key, self.__getitem__(key)
+
+    def get(self, k, d=None):
+        """D.get(k[,d]) -> D[k] if k in D, else d.  d defaults to None."""
+        try:
+            return self.__getitem__(k)
+        except KeyError:
+            return d
+
+    def get_offset(self, key):
+        """Return the file offset of the result for a key."""
+        return dict.__getitem__(self, key)[-2]
+
+    def __setitem__(self, key, value):
+        """Would allow setting or replacing records, but not implemented."""
+        raise NotImplementedError("An indexed a BLAST file is read only.")
+
+    def update(self, **kwargs):
+        """Would allow adding more values, but not implemented."""
+        raise NotImplementedError("An indexed a BLAST file is read only.")
+
+    def pop(self, key, default=None):
+        """Would remove specified record, but not implemented."""
+        raise NotImplementedError("An indexed a BLAST file is read only.")
+
+    def popitem(self):
+        """Would remove and return a Record, but not implemented."""
+        raise NotImplementedError("An indexed a BLAST file is read only.")
+
+    def clear(self):
+        """Would clear dictionary, but not implemented."""
+        raise NotImplementedError("An indexed a BLAST file is read only.")
+
+    def fromkeys(self, keys, value=None):
+        """A dictionary method which we don't implement."""
+        raise NotImplementedError("An indexed a BLAST file doesn't "
+                                  "support this.")
+
+    def copy(self):
+        """A dictionary method which we don't implement."""
+        raise NotImplementedError("An indexed a BLAST file doesn't "
+                                  "support this.")
+
+
+#Tags of interest when scanning XML output
+_xml_tag_re = re.compile(r"<\?xml|</?Iteration>|<BlastOutput_iterations>|"
+                         r"<(Iteration|BlastOutput)_query-ID>([^<]*)<")
+
+class XmlBlastDict(_IndexedBlastDict):
+    """Indexed dictionary like access to BLAST XML output.
+
+    The values are tuples (header offset, header length, offset, length)
+    of the XML header (everything up to the <BlastOutput_iterations> tag)
+    and of the <Iteration> element of the query. Several concatenated XML
+    files (output of BLAST before 2.2.14) are fine.
+    """
+    BLOCK = 1048576
+    #Matches must end this far from the end of the buffer, unless
+    #we are at the end of the file (keeps tags in one piece)
+    MARGIN = 65536
+
+    def __init__(self, filename, key_function=None, index_filename=None):
+        _IndexedBlastDict.__init__(self, filename, key_function,
+                                   index_filename)
+        self._format = "NCBIXML"
+        self._load_or_build()
+
+    def _scan(self):
+        handle = self._handle
+        handle.seek(0)
+        BLOCK = self.BLOCK
+        MARGIN = self.MARGIN
+        buffer = ""
+        buffer_offset = 0
+        header_offset = header_length = None
+        header_query_id = ""
+        start = query_id = None
+        at_end = False
+        while not at_end:
+            data = handle.read(BLOCK)
+            at_end = not data
+            buffer += data
+            limit = len(buffer)
+            if not at_end:
+                limit -= MARGIN
+            position = 0
+            while True:
+                match = _xml_tag_re.search(buffer, position)
+                if match is None:
+                    #Keep enough for a tag cut in two by the block end
+                    position = max(position, len(buffer) - MARGIN)
+                    break
+                if not at_end and match.end() > limit:
+                    #Look at this tag again with the next block
+                    position = match.start()
+                    break
+                position = match.end()
+                tag = match.group(0)
+                offset = buffer_offset + match.start()
+                if tag == "<?xml":
+                    header_offset = offset
+                    header_length = None
+                    header_query_id = ""
+                elif tag == "<BlastOutput_iterations>":
+                    header_length = buffer_offset + match.end() \
+                                    - header_offset
+                elif tag == "<Iteration>":
+                    start = offset
+                    query_id = ""
+                elif tag == "</Iteration>":
+                    if start is None or header_length is None:
+                        raise ValueError("Unexpected </Iteration> at offset "
+                                         "%i" % offset)
+                    #As in the BlastParser, old pre 2.2.14 BLAST only
+                    #gives the query ID in the header
+                    yield query_id or header_query_id, \
+                          (header_offset, header_length, start,
+                           buffer_offset + match.end() - start)
+                    start = None
+                elif match.group(1) == "Iteration":
+                    query_id = _unescape(match.group(2))
+                else:
+                    header_query_id = _unescape(match.group(2))
+            buffer_offset += position
+            buffer = buffer[position:]
+
+    def _read(self, offset, length):
+        handle = self._handle
+        handle.seek(offset)
+        return handle.read(length)
+
+    def __getitem__(self, key):
+        """x.__getitem__(y) <==> x[y]"""
+        from xml.parsers import expat
+        from Bio.Blast.NCBIXML import BlastParser
+        header_offset, header_length, offset, length \
+                       = dict.__getitem__(self, key)
+        expat_parser = expat.ParserCreate()
+        blast_parser = BlastParser()
+        expat_parser.StartElementHandler = blast_parser.startElement
+        expat_parser.EndElementHandler = blast_parser.endElement
+        expat_parser.CharacterDataHandler = blast_parser.characters
+        expat_parser.Parse(self._read(header_offset, header_length), False)
+        expat_parser.Parse(self._read(offset, length), False)
+        assert len(blast_parser._records) == 1
+        return blast_parser._records[0]
+
+def _unescape(text):
+    """Replace the standard XML entities in text (PRIVATE)."""
+    if "&" not in text:
+        return text
+    from xml.sax.saxutils import unescape
+    return unescape(text, {"&apos;" : "'", "&quot;" : '"'})
+
+
+#The program line of each query in tables with comment lines, e.g.
+#"# BLASTP 2.2.18 [Mar-02-2008]" or "# TBLASTN 2.2.25+"
+_program_line = re.compile(r"# (?:[A-Z]+BLAST[A-Z]*|BLAST[A-Z]+) ")
+
+class TableBlastDict(_IndexedBlastDict):
+    """Indexed dictionary like access to BLAST tabular output.
+
+    Handles tables with comment lines (blastall/blastpgp -m 9), where
+    each query starts with a "# BLASTP ..." line, and plain tables (-m 8),
+    where the lines of each query are grouped by the query identifier
+    in the first column. The values are tuples
+    (offset, length) of the query's lines.
+    """
+    def __init__(self, filename, key_function=None, index_filename=None):
+        _IndexedBlastDict.__init__(self, filename, key_function,
+                                   index_filename)
+        self._format = "ParseBlastTable"
+        self._load_or_build()
+
+    def _scan(self):
+        handle = self._handle
+        handle.seek(0)
+        offset = 0
+        start = None
+        query_id = None
+        #Did the current query start with comment lines?
+        commented = False
+        while True:
+            line = handle.readline()
+            if not line:
+                break
+            if line.startswith("# BLAST processed"):
+                #BLAST+ -outfmt 7 trailer, after the last query
+                if start is not None:
+                    yield query_id, (start, offset - start)
+                start = None
+            elif line[0] == "#":
+                if start is None or _program_line.match(line):
+                    #The program line (e.g. "# BLASTP 2.2.18") starts
+                    #a new query
+                    if start is not None:
+                        yield query_id, (start, offset - start)
+                    start = offset
+                    query_id = None
+                    commented = True
+                if line.startswith("# Query:") and line[8:].split():
+                    query_id = line[8:].split()[0]
+            elif line.strip():
+                this_id = line.split(None, 1)[0]
+                if commented:
+                    if query_id is None:
+                        query_id = this_id
+                elif this_id != query_id:
+                    #Plain table, the first column changed
+                    if start is not None:
+                        yield query_id, (start, offset - start)
+                    start = offset
+                    query_id = this_id
+            offset += len(line)
+        if start is not None:
+            yield query_id, (start, offset - start)
+
+    def __getitem__(self, key):
+        """x.__getitem__(y) <==> x[y]"""
+        from StringIO import StringIO
+        from Bio.Blast.ParseBlastTable import BlastTableReader, \
+             BlastTableRec, BlastTableEntry
+        offset, length = dict.__getitem__(self, key)
+        handle = self._handle
+        handle.seek(offset)
+        text = handle.read(length)
+        if text.startswith("#"):
+            return BlastTableReader(StringIO(text)).next()
+        #Plain table without comment lines
+        record = BlastTableRec()
+        for line in text.splitlines():
+            if line.strip():
+                record.add_entry(BlastTableEntry(line))
+        record.query = [text.split(None, 1)[0]]
+        return record
@@ -0,0 +1,195 @@
+# Copyright 2026 by the Biopython contributors.  All rights reserved.
+# This code is part of the Biopython distribution and governed by its
+# license.  Please see the LICENSE file that should have been included
+# as part of this package.
+"""Local on-disk cache of replies from the NCBI Entrez Utilities.
+
+Pipelines which send the same requests every time they run (e.g. the same
+einfo, esummary or efetch calls) can keep the replies on disk, so that
+repeated requests are answered locally without contacting NCBI (and
+without waiting for the three requests per second limit):
+
+>>> from Bio import Entrez
+>>> from Bio.Entrez.Cache import ResponseCache
+>>> Entrez.cache = ResponseCache("entrez_cache", ttl=7*24*3600)
+>>> handle = Entrez.efetch(db="nucleotide", id="57240072", rettype="gb")
+>>> print Entrez.cache.hits, Entrez.cache.misses
+
+Bio.Entrez.Session objects use the same cache. Requests are identified
+by the URL and the parameters (in sorted order, ignoring the tool and
+email parameters). Only successful GET requests are cached, so EPost
+(which stores identifiers on the history server) is never answered from
+the cache. Nor are requests using the history server (with a usehistory
+or WebEnv parameter), since the WebEnv of a cached reply would soon have
+expired on the server, and the same WebEnv refers to different data
+once more identifiers have been posted to it. Replies are compressed
+with zlib, and the least recently used replies are removed once the
+cache grows beyond its maximum size.
+"""
+
+import os
+import time
+import zlib
+import urllib
+import threading
+try:
+    #Python 2.5 sha1 is in hashlib
+    from hashlib import sha1
+except ImportError:
+    #For older versions
+    from sha import new as sha1
+
+class ResponseCache:
+    """Directory of compressed Entrez replies with expiry and LRU eviction.
+
+    Each reply is a file, named after a hash of the request, holding the
+    time it was stored followed by the compressed data. The modification
+    time of a file is updated whenever it is used, and is the basis for
+    removing the least recently used replies.
+
+    The attributes hits, misses and evictions count the requests found
+    and not found in the cache (including expired replies), and the
+    replies removed to keep the cache small enough.
+    """
+    def __init__(self, directory, ttl=None, max_size=100000000, level=6):
+        """Create the cache, making the directory if needed.
+
+        directory - Where to store the replies.
+        ttl - Time to live in seconds, after which a reply is fetched
+              again (default None, meaning replies never expire).
+        max_size - Maximum total size of the compressed replies in bytes.
+        level - zlib compression level.
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.ttl = ttl
+        self.max_size = max_size
+        self.level = level
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        #Total size of the files, worked out when first needed
+        self._size = None
+
+    def key(self, url, params):
+        """Return the name of the file for a request (normalised)."""
+        params = [(key, value) for (key, value) in params.items()
+                  if key not in ["tool", "email"] and value is not None]
+        params.sort()
+        text = url + "?" + urllib.urlencode(params, doseq=True)
+        return os.path.join(self.directory, sha1(text).hexdigest())
+
+    def cacheable(self, params):
+        """Return False for requests using the Entrez history server."""
+        for key in params:
+            if key.lower() in ["usehistory", "webenv"]:
+                return False
+        return True
+
+    def _count(self, name):
+        """Increase one of the counters (PRIVATE)."""
+        self._lock.acquire()
+        setattr(self, name, getattr(self, name) + 1)
+        self._lock.release()
+
+    def get(self, url, params):
+        """Return the stored reply to a request, or None."""
+        filename = self.key(url, params)
+        try:
+            handle = open(filename, "rb")
+            try:
+                stored = float(handle.readline())
+                data = handle.read()
+            finally:
+                handle.close()
+        except (IOError, ValueError):
+            self._count("misses")
+            return None
+        if self.ttl is not None and time.time() - stored > self.ttl:
+            self._count("misses")
+            return None
+        try:
+            data = zlib.decompress(data)
+        except zlib.error:
+            #e.g. a file left half written by a crash
+            self._count("misses")
+            return None
+        try:
+            #Mark it as recently used
+            os.utime(filename, None)
+        except OSError:
+            pass
+        self._count("hits")
+        return data
+
+    def put(self, url, params, data):
+        """Store the reply to a request, evicting old replies if needed."""
+        filename = self.key(url, params)
+        data = "%f\n" % time.time() + zlib.compress(data, self.level)
+        #Write to a temporary file first, so readers never see half a file
+        temp_filename = "%s.%i.%i.tmp" % (filename, os.getpid(),
+                                          id(threading.currentThread()))
+        handle = open(temp_filename, "wb")
+        handle.write(data)
+        handle.close()
+        try:
+            old_size = os.path.getsize(filename)
+        except OSError:
+            old_size = 0
+        try:
+            os.rename(temp_filename, filename)
+        except OSError:
+            #On Windows, can't rename onto an existing file
+            os.remove(filename)
+            os.rename(temp_filename, filename)
+        self._lock.acquire()
+        try:
+            if self._size is not None:
+                self._size += len(data) - old_size
+        finally:
+            self._lock.release()
+        self._evict()
+
+    def _evict(self):
+        """Remove the least recently used replies if too big (PRIVATE)."""
+        self._lock.acquire()
+        try:
+            if self._size is not None and self._size <= self.max_size:
+                return
+            files = []
+            size = 0
+            for name in os.listdir(self.directory):
+                if name.endswith(".tmp"):
+                    continue
+                filename = os.path.join(self.directory, name)
+                try:
+                    info = os.stat(filename)
+                except OSError:
+                    continue
+                files.append((info.st_mtime, info.st_size, filename))
+                size += info.st_size
+            files.sort()
+            for mtime, file_size, filename in files:
+                if size <= self.max_size:
+                    break
+                try:
+                    os.remove(filename)
+                except OSError:
+                    continue
+                size -= file_size
+                self.evictions += 1
+            self._size = size
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        """Remove all the stored replies (the counters are kept)."""
+        self._lock.acquire()
+        try:
+            for name in os.listdir(self.directory):
+                os.remove(os.path.join(self.directory, name))
+            self._size = 0
+        finally:
+            self._lock.release()
@@ -81,17 +81,41 @@ class CorruptedXMLError(ValueError):
 
 class DataHandler:
 
-    def __init__(self, dtd_dir):
+    def __init__(self, dtd_dir, keep=None):
+        """Create the handler.
+
+        dtd_dir - Directory with the DTD files.
+        keep - Optional list of element paths to store, such as
+               "PubmedArticle/MedlineCitation/PMID", starting with the
+               element below the top level element. The elements on these
+               paths and everything inside the last element of each path
+               are stored, all other elements are skipped while parsing.
+        """
         self.stack = []
-        self.errors = []
-        self.integers = []
-        self.strings = []
-        self.lists = []
-        self.dictionaries = []
+        # The element names declared in the DTDs, by type
+        self.errors = set()
+        self.integers = set()
+        self.strings = set()
+        self.lists = set()
+        self.dictionaries = set()
         self.structures = {}
-        self.items = []
+        self.items = set()
         self.dtd_dir = dtd_dir
         self.valid = True
+        # For the keep option, the names of the open elements, the number
+        # of open elements being skipped, and of those inside a kept path.
+        if keep is None:
+            self.keep = None
+        else:
+            self.keep = set(keep)
+            self.keep_parents = set()
+            for path in keep:
+                names = path.split("/")
+                for i in range(1, len(names)):
+                    self.keep_parents.add("/".join(names[:i]))
+        self.path = []
+        self.skipping = 0
+        self.keeping = 0
         # Set to False once EUtils always returns XML files starting with <!xml
         self.parser = expat.ParserCreate(namespace_separator=" ")
         self.parser.SetParamEntityParsing(expat.XML_PARAM_ENTITY_PARSING_ALWAYS)
@@ -119,7 +143,12 @@ class DataHandler:
         return self.object
 
     def parse(self, handle):
-        BLOCK = 1024
+        """Iterate over the records of the top level list.
+
+        Each record is returned once the block of the file in which it
+        ends has been parsed, and is then removed from the list.
+        """
+        BLOCK = 65536
         while True:
             #Read in another block of the file...
             text = handle.read(BLOCK)
@@ -153,9 +182,15 @@ class DataHandler:
             records = self.stack[0]
             if not isinstance(records, list):
                 raise ValueError("The XML file does not represent a list. Please use Entrez.read instead of Entrez.parse")
-            while len(records) > 1: # Then the top record is finished
-                record = records.pop(0)
-                yield record
+            finished = len(records)
+            if finished and len(self.stack) > 1 \
+            and self.stack[1] is records[-1]:
+                # The last record is still being parsed
+                finished -= 1
+            if finished:
+                for record in records[:finished]:
+                    yield record
+                del records[:finished]
 
     def xmlDeclHandler(self, version, encoding, standalone):
         # The purpose of this method is to make sure that we are parsing XML.
@@ -167,7 +202,21 @@ class DataHandler:
     def startElementHandler(self, name, attrs):
         if not self.valid:
             raise NotXMLError
-        self.content = ""
+        if self.keep is not None:
+            if self.skipping:
+                self.skipping += 1
+                return
+            if self.keeping:
+                self.keeping += 1
+            elif self.path:
+                path = "/".join(self.path[1:] + [name])
+                if path in self.keep:
+                    self.keeping = 1
+                elif not path in self.keep_parents:
+                    self.skipping = 1
+                    return
+            self.path.append(name)
+        self.content = []
         if name in self.lists:
             object = ListElement()
         elif name in self.dictionaries:
@@ -189,7 +238,8 @@ class DataHandler:
                 object = StringElement()
             object.itemname = name
             object.itemtype = itemtype
-        elif name in self.strings + self.errors + self.integers:
+        elif name in self.strings or name in self.errors \
+        or name in self.integers:
             self.attributes = attrs
             return
         else:
@@ -210,7 +260,14 @@ class DataHandler:
     def endElementHandler(self, name):
         if not self.valid:
             raise NotXMLError
-        value = self.content
+        if self.keep is not None:
+            if self.skipping:
+                self.skipping -= 1
+                return
+            if self.keeping:
+                self.keeping -= 1
+            self.path.pop()
+        value = "".join(self.content)
         if name in self.errors:
             if value=="":
                 return
@@ -253,7 +310,9 @@ class DataHandler:
     def characterDataHandler(self, content):
         if not self.valid:
             raise NotXMLError
-        self.content += content
+        if self.skipping:
+            return
+        self.content.append(content)
 
     def elementDecl(self, name, model):
         """This callback function is called for each element declaration:
@@ -264,7 +323,7 @@ class DataHandler:
         if not self.valid:
             raise NotXMLError
         if name.upper()=="ERROR":
-            self.errors.append(name)
+            self.errors.add(name)
             return
         if name=='Item' and model==(expat.model.XML_CTYPE_MIXED,
                                     expat.model.XML_CQUANT_REP,
@@ -277,7 +336,7 @@ class DataHandler:
                                    ):
             # Special case. As far as I can tell, this only occurs in the
             # eSummary DTD.
-            self.items.append(name)
+            self.items.add(name)
             return
         # First, remove ignorable parentheses around declarations
         while (model[0] in (expat.model.XML_CTYPE_SEQ,
@@ -289,14 +348,14 @@ class DataHandler:
         # PCDATA declarations correspond to strings
         if model[0] in (expat.model.XML_CTYPE_MIXED,
                         expat.model.XML_CTYPE_EMPTY):
-            self.strings.append(name)
+            self.strings.add(name)
             return
         # List-type elements
         if (model[0] in (expat.model.XML_CTYPE_CHOICE,
                          expat.model.XML_CTYPE_SEQ) and
             model[1] in (expat.model.XML_CQUANT_PLUS,
                          expat.model.XML_CQUANT_REP)):
-            self.lists.append(name)
+            self.lists.add(name)
             return
         # This is the tricky case. Check which keys can occur multiple
         # times. If only one key is possible, and it can occur multiple
@@ -329,9 +388,9 @@ class DataHandler:
                     multiple.append(name)
         count(model)
         if len(single)==0 and len(multiple)==1:
-            self.lists.append(name)
+            self.lists.add(name)
         elif len(multiple)==0:
-            self.dictionaries.append(name)
+            self.dictionaries.add(name)
         else:
             self.structures.update({name: multiple})
 
@@ -0,0 +1,519 @@
+# Copyright 2026 by the Biopython contributors.  All rights reserved.
+# This code is part of the Biopython distribution and governed by its
+# license.  Please see the LICENSE file that should have been included
+# as part of this package.
+"""Keep-alive connections, rate limiting and retries for NCBI Entrez.
+
+The functions in Bio.Entrez open a new connection to NCBI for each
+request. A Session object instead keeps its HTTP connections open and
+reuses them (HTTP keep-alive), retries requests which fail with a network
+error or a server error such as "503 Service Unavailable", and can run
+many requests at once from several threads:
+
+>>> from Bio import Entrez
+>>> from Bio.Entrez.Session import Session
+>>> Entrez.email = "A.N.Other@example.com"
+>>> session = Session()
+>>> record = Entrez.read(session.einfo(db="pubmed"))
+>>> calls = [("efetch", {"db": "nucleotide", "id": i, "rettype": "fasta"})
+...          for i in ["57240072", "57240071", "6273287"]]
+>>> for handle in session.batch(calls, num_threads=3):
+...     print handle.readline().rstrip()
+>>> session.close()
+
+NCBI asks for no more than three requests a second, so all the threads
+(and sessions) share one RateLimiter with the plain Bio.Entrez functions,
+unless a session is given its own rate. When a request fails, the shared
+limiter is paused for the back off time, so that the other threads also
+slow down while NCBI is busy.
+
+The replies are read completely before they are returned (as a handle to
+the data in memory), so that the connection can be used again.
+
+To download many records, the efetch_records method posts the identifiers
+to the Entrez history server, fetches the records in batches, and parses
+each batch while the next one is downloading:
+
+>>> ids = [line.strip() for line in open("accessions.txt")]
+>>> records = session.efetch_records("nucleotide", ids, rettype="gb",
+...                                  batch_size=500, checkpoint="gb.pos")
+>>> for record in records:
+...     print record.id, len(record)
+
+If this stops part way (e.g. after a network failure), running it again
+with the same checkpoint file carries on after the last complete batch.
+"""
+
+import os
+import time
+import socket
+import httplib
+import urllib
+import urlparse
+import threading
+import Queue
+from cStringIO import StringIO
+
+from Bio import File
+
+#HTTP status codes worth trying again
+_RETRY_STATUS = [429, 500, 502, 503, 504]
+
+class RateLimiter:
+    """Token bucket limiting the number of requests per second.
+
+    One limiter can be shared by several threads; each thread calls the
+    wait method before making a request. Up to burst requests can be made
+    at once after a quiet period, after which requests are spaced at
+    1/rate seconds.
+    """
+    def __init__(self, rate=3, burst=1):
+        """Create the limiter for rate requests a second."""
+        if rate <= 0:
+            raise ValueError("The rate must be positive")
+        if burst < 1:
+            raise ValueError("The burst size must be at least one")
+        self.rate = float(rate)
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.time()
+        self._lock = threading.Lock()
+
+    def _take(self, tokens):
+        """Take tokens from the bucket, return the time to wait (PRIVATE).
+
+        The bucket can go below zero, which reserves the next free slots
+        for the callers already waiting.
+        """
+        self._lock.acquire()
+        try:
+            now = time.time()
+            elapsed = max(0.0, now - self._last)
+            self._last = now
+            self._tokens = min(float(self.burst),
+                               self._tokens + elapsed * self.rate)
+            self._tokens -= tokens
+            tokens = self._tokens
+        finally:
+            self._lock.release()
+        return -tokens / self.rate
+
+    def wait(self):
+        """Wait until the next request may be made."""
+        delay = self._take(1)
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, delay):
+        """Hold off all further requests for (at least) delay seconds."""
+        self._take(delay * self.rate)
+
+
+class Session:
+    """Connection pool for the NCBI Entrez Utilities.
+
+    The methods einfo, esearch, efetch, epost, elink, esummary, egquery
+    and espell take the same arguments as the functions in Bio.Entrez, and
+    return a handle to the reply. The open method can be used for other
+    URLs, and the batch method runs many of these calls at once.
+    """
+    def __init__(self, rate=None, retries=3, backoff=1.0, timeout=None,
+                 max_connections=3,
+                 base_url="http://eutils.ncbi.nlm.nih.gov/entrez/eutils/"):
+        """Create the session (connections are only made when needed).
+
+        rate - Maximum number of requests per second. The default (None)
+               shares the Bio.Entrez limit of three requests a second.
+               Only use a higher rate with a local server, or if NCBI
+               allows it.
+        retries - Number of times a request is tried again after a
+                  network error or an HTTP status of 429 or 5xx.
+        backoff - Seconds to wait before the first retry, doubled for
+                  each further retry.
+        timeout - Socket timeout in seconds (default no timeout).
+        max_connections - Number of idle connections kept open per host.
+        base_url - URL of the Entrez Utilities (e.g. a local test server).
+        """
+        if rate is None:
+            from Bio import Entrez
+            self.rate_limiter = Entrez._rate_limiter
+        else:
+            self.rate_limiter = RateLimiter(rate)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.base_url = base_url
+        #Maps (scheme, host, port) to a list of idle connections
+        self._idle = {}
+        self._lock = threading.Lock()
+        #Number of new connections made, and of requests retried
+        self.connections = 0
+        self.retried = 0
+
+    def _get_connection(self, scheme, host, port):
+        """Return an idle connection to the host, or a new one (PRIVATE).
+
+        Returns a tuple of the connection and whether it has been used.
+        """
+        key = (scheme, host, port)
+        self._lock.acquire()
+        try:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        finally:
+            self._lock.release()
+        return self._new_connection(scheme, host, port), False
+
+    def _new_connection(self, scheme, host, port):
+        """Return a new connection to the host (PRIVATE)."""
+        self._lock.acquire()
+        self.connections += 1
+        self._lock.release()
+        if scheme == "https":
+            connection_class = httplib.HTTPSConnection
+        else:
+            connection_class = httplib.HTTPConnection
+        if self.timeout is None:
+            return connection_class(host, port)
+        return connection_class(host, port, timeout=self.timeout)
+
+    def _put_connection(self, scheme, host, port, connection):
+        """Keep a connection for reuse, or close it if enough are idle."""
+        key = (scheme, host, port)
+        self._lock.acquire()
+        try:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_connections:
+                idle.append(connection)
+                connection = None
+        finally:
+            self._lock.release()
+        if connection is not None:
+            connection.close()
+
+    def close(self):
+        """Close all the idle connections."""
+        self._lock.acquire()
+        try:
+            idle = self._idle
+            self._idle = {}
+        finally:
+            self._lock.release()
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def _request(self, url, params, post):
+        """Make one HTTP request, return the status and data (PRIVATE).
+
+        Raises socket.error or httplib.HTTPException on network errors.
+        """
+        scheme, host, path = urlparse.urlsplit(url)[:3]
+        port = None
+        if ":" in host:
+            host, port = host.rsplit(":", 1)
+            port = int(port)
+        options = urllib.urlencode(params, doseq=True)
+        connection, reused = self._get_connection(scheme, host, port)
+        while True:
+            try:
+                if post:
+                    headers = {"Content-Type":
+                               "application/x-www-form-urlencoded"}
+                    connection.request("POST", path, options, headers)
+                else:
+                    connection.request("GET", path + "?" + options)
+                response = connection.getresponse()
+                data = response.read()
+                break
+            except (socket.error, httplib.HTTPException):
+                connection.close()
+                if not reused:
+                    raise
+                #The server may have closed the idle connection meanwhile
+                connection = self._new_connection(scheme, host, port)
+                reused = False
+            except:
+                connection.close()
+                raise
+        if response.will_close:
+            connection.close()
+        else:
+            self._put_connection(scheme, host, port, connection)
+        return response.status, response.reason, data
+
+    def open(self, utility, params={}, post=False):
+        """Send a request to Entrez, return a handle to the reply.
+
+        utility - The name of the E-utility (e.g. "efetch"), which is
+                  added to the base URL, or a full URL.
+        params - Dictionary of the options to send (the tool and email
+                 options are added as for the Bio.Entrez functions).
+        post - Use HTTP POST instead of GET.
+
+        Raises an IOError after the last retry, or if the reply is an
+        error. GET requests use the Bio.Entrez.cache, if one is set
+        (except for requests using the history server).
+        """
+        from Bio import Entrez
+        if "://" in utility:
+            url = utility
+        else:
+            url = self.base_url + utility + ".fcgi"
+        params = Entrez._clean_params(params)
+        cache = Entrez.cache
+        use_cache = cache is not None and not post \
+                    and cache.cacheable(params)
+        if use_cache:
+            data = cache.get(url, params)
+            if data is not None:
+                return File.UndoHandle(StringIO(data))
+        attempt = 0
+        while True:
+            self.rate_limiter.wait()
+            try:
+                status, reason, data = self._request(url, params, post)
+            except (socket.error, httplib.HTTPException), err:
+                error = "%s: %s" % (err.__class__.__name__, err)
+            else:
+                if status not in _RETRY_STATUS:
+                    break
+                error = "HTTP Error %i: %s" % (status, reason)
+            if attempt >= self.retries:
+                raise IOError("%s (after %i attempts for %s)" \
+                              % (error, attempt + 1, url))
+            self._lock.acquire()
+            self.retried += 1
+            self._lock.release()
+            self.rate_limiter.pause(self.backoff * 2 ** attempt)
+            attempt += 1
+        Entrez._check_data(data[:1000])
+        if status >= 400:
+            raise IOError("HTTP Error %i: %s" % (status, reason))
+        if use_cache:
+            cache.put(url, params, data)
+        return File.UndoHandle(StringIO(data))
+
+    def batch(self, calls, num_threads=3, parser=None):
+        """Make many requests using several threads, return a list.
+
+        calls - A list of (method name, keyword dictionary) tuples,
+                e.g. ("efetch", {"db": "protein", "id": "15718680"})
+        num_threads - Number of requests to run at once (each still waits
+                      for the rate limiter).
+        parser - Optional function (e.g. Bio.Entrez.read) applied to the
+                 handle of each reply, in the worker threads.
+
+        The results are in the order of the calls. If any call fails, its
+        exception is raised once all the calls have finished.
+        """
+        if num_threads < 1:
+            raise ValueError("Need at least one thread")
+        calls = list(calls)
+        results = [None] * len(calls)
+        errors = [None] * len(calls)
+        #The index of the next call to make, as a one element list
+        counter = [0]
+        lock = threading.Lock()
+
+        def work():
+            while True:
+                lock.acquire()
+                index = counter[0]
+                counter[0] += 1
+                lock.release()
+                if index >= len(calls):
+                    return
+                name, keywds = calls[index]
+                try:
+                    result = getattr(self, name)(**keywds)
+                    if parser is not None:
+                        result = parser(result)
+                    results[index] = result
+                except Exception, err:
+                    errors[index] = err
+
+        threads = []
+        for i in range(min(num_threads, len(calls))):
+            thread = threading.Thread(target=work)
+            thread.setDaemon(True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        for error in errors:
+            if error is not None:
+                raise error
+        return results
+
+    def efetch_records(self, db, ids=None, webenv=None, query_key=None,
+                       count=None, batch_size=500, post_size=10000,
+                       parser=None, checkpoint=None, **keywds):
+        """Fetch many records in batches, iterating over the parsed records.
+
+        db - The Entrez database (e.g. "nucleotide").
+        ids - List of identifiers to fetch. These are posted to the
+              history server with EPost, post_size at a time.
+        webenv, query_key, count - Instead of ids, fetch the count results
+              of an earlier search or post on the history server (e.g.
+              from ESearch with usehistory="y").
+        batch_size - Number of records to fetch with each EFetch call.
+        parser - Function taking a handle to a batch, and returning an
+                 iterator over its records. By default this is Bio.SeqIO
+                 for rettype "gb", "gp", "gbwithparts" or "fasta", and
+                 Bio.Entrez.parse for retmode "xml".
+        checkpoint - Optional file name. The number of records done is
+                     written to it after each batch, and if it exists at
+                     the start, the records already done are skipped.
+
+        Any other keyword arguments (e.g. rettype and retmode) are passed
+        to EFetch. The next batch is downloaded in a background thread
+        while the current batch is parsed (this starts once iteration
+        starts).
+        """
+        if parser is None:
+            parser = _default_parser(keywds)
+        if ids is None:
+            if webenv is None or query_key is None or count is None:
+                raise ValueError("Give either ids, or webenv, query_key "
+                                 "and count")
+            total = count
+        else:
+            if webenv is not None or query_key is not None:
+                raise ValueError("Give either ids, or webenv and query_key")
+            ids = [str(identifier) for identifier in ids]
+            total = len(ids)
+        start = 0
+        if checkpoint is not None and os.path.isfile(checkpoint):
+            handle = open(checkpoint)
+            start = int(handle.read())
+            handle.close()
+
+        def batches():
+            """Yield the position, size and EFetch options of each batch."""
+            if ids is None:
+                for position in range(start, total, batch_size):
+                    params = dict(keywds)
+                    params.update({"WebEnv": webenv,
+                                   "query_key": query_key,
+                                   "retstart": position,
+                                   "retmax": batch_size})
+                    yield position, min(batch_size, total - position), params
+                return
+            from Bio import Entrez
+            for post_start in range(start, total, post_size):
+                group = ids[post_start:post_start + post_size]
+                record = Entrez.read(self.epost(db, id=",".join(group)))
+                for offset in range(0, len(group), batch_size):
+                    params = dict(keywds)
+                    params.update({"WebEnv": record["WebEnv"],
+                                   "query_key": record["QueryKey"],
+                                   "retstart": offset,
+                                   "retmax": batch_size})
+                    yield post_start + offset, \
+                          min(batch_size, len(group) - offset), params
+
+        #Holds at most one downloaded batch waiting to be parsed
+        queue = Queue.Queue(1)
+        stopped = threading.Event()
+
+        def put(item):
+            while not stopped.isSet():
+                try:
+                    queue.put(item, True, 0.1)
+                    return
+                except Queue.Full:
+                    pass
+
+        def download():
+            try:
+                for position, size, params in batches():
+                    if stopped.isSet():
+                        return
+                    data = self.efetch(db, **params).read()
+                    put((position, size, data))
+                put(None)
+            except Exception, err:
+                put(err)
+
+        def records():
+            thread = threading.Thread(target=download)
+            thread.setDaemon(True)
+            thread.start()
+            try:
+                while True:
+                    item = queue.get()
+                    if item is None:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    position, size, data = item
+                    for record in parser(StringIO(data)):
+                        yield record
+                    if checkpoint is not None:
+                        handle = open(checkpoint, "w")
+                        handle.write("%i\n" % (position + size))
+                        handle.close()
+            except:
+                stopped.set()
+                raise
+            stopped.set()
+
+        return records()
+
+    def epost(self, db, **keywds):
+        """Post a list of identifiers (see Bio.Entrez.epost)."""
+        keywds["db"] = db
+        return self.open("epost", keywds, post=True)
+
+    def efetch(self, db, **keywds):
+        """Fetch records (see Bio.Entrez.efetch)."""
+        keywds["db"] = db
+        return self.open("efetch", keywds)
+
+    def esearch(self, db, term, **keywds):
+        """Run a search (see Bio.Entrez.esearch)."""
+        keywds["db"] = db
+        keywds["term"] = term
+        return self.open("esearch", keywds)
+
+    def elink(self, **keywds):
+        """Check for linked records (see Bio.Entrez.elink)."""
+        return self.open("elink", keywds)
+
+    def einfo(self, **keywds):
+        """Get a summary of the Entrez databases (see Bio.Entrez.einfo)."""
+        return self.open("einfo", keywds)
+
+    def esummary(self, **keywds):
+        """Get document summaries (see Bio.Entrez.esummary)."""
+        return self.open("esummary", keywds)
+
+    def egquery(self, **keywds):
+        """Get database counts for a global search (see Bio.Entrez.egquery)."""
+        return self.open("egquery", keywds)
+
+    def espell(self, **keywds):
+        """Get spelling suggestions (see Bio.Entrez.espell)."""
+        return self.open("espell", keywds)
+
+
+def _default_parser(keywds):
+    """Return a parser for the EFetch rettype and retmode (PRIVATE)."""
+    rettype = keywds.get("rettype", "")
+    retmode = keywds.get("retmode", "")
+    if rettype in ["gb", "gp", "gbwithparts", "fasta"] \
+    and retmode in ["", "text"]:
+        from Bio import SeqIO
+        if rettype == "fasta":
+            format = "fasta"
+        else:
+            format = "genbank"
+        return lambda handle: SeqIO.parse(handle, format)
+    if retmode == "xml":
+        from Bio import Entrez
+        return Entrez.parse
+    raise ValueError("Please give a parser for rettype %r and retmode %r" \
+                     % (rettype, retmode))
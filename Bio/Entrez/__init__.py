@@ -40,16 +40,26 @@ read         Parses the XML results returned by any of the above functions.
              >>> handle = Entrez.einfo() # or esearch, efetch, ...
              >>> record = Entrez.read(handle)
              where record is now a Python dictionary or list.
+parse        Parses the XML results one record at a time, for XML files
+             holding a list of records (e.g. from efetch).
 
 _open        Internally used function.
 
+See also the Bio.Entrez.Session module, for keep-alive connections,
+automatic retries and running many requests at once from several threads,
+and the Bio.Entrez.Cache module, to keep the replies on disk.
+
 """
-import urllib, time, warnings
+import urllib, warnings
 import os.path
+from cStringIO import StringIO
 from Bio import File
+from Session import RateLimiter
 
 
 email = None
+# Optional Bio.Entrez.Cache.ResponseCache for the replies
+cache = None
 
 
 # XXX retmode?
@@ -237,7 +247,7 @@ def espell(**keywds):
     variables.update(keywds)
     return _open(cgi, variables)
 
-def read(handle):
+def read(handle, keep=None):
     """Parses an XML file from the NCBI Entrez Utilities into python objects.
     
     This function parses an XML file created by NCBI's Entrez Utilities,
@@ -251,17 +261,43 @@ def read(handle):
     derived from the base type. This allows us to store the attributes
     (if any) of each element in a dictionary my_element.attributes, and
     the tag name in my_element.tag.
+
+    To save time and memory, the optional argument keep gives a list of
+    the element paths to store, e.g. ["DbInfo/DbName", "DbInfo/Count"]
+    for EInfo. Each path starts with a child of the top level element,
+    and everything inside the last element of a path is stored too. All
+    other elements are skipped.
     """
     from Parser import DataHandler
     DTDs = os.path.join(__path__[0], "DTDs")
-    handler = DataHandler(DTDs)
+    handler = DataHandler(DTDs, keep)
     record = handler.read(handle)
     return record
 
-def parse(handle):
+def parse(handle, keep=None):
+    """Parses an XML file from the NCBI Entrez Utilities one record at a time.
+
+    For XML files whose top level element is a list of records (such as
+    the PubmedArticleSet from EFetch), this returns an iterator over the
+    records, each of which is returned as soon as it has been read. This
+    uses much less memory than the read function for large files:
+
+    >>> handle = Entrez.efetch(db="pubmed", id=ids, retmode="xml")
+    >>> for record in Entrez.parse(handle):
+    ...     print record["MedlineCitation"]["PMID"]
+
+    The optional argument keep gives a list of element paths to store,
+    starting with the record element, and all other elements are skipped
+    while parsing, for example:
+
+    >>> keep = ["PubmedArticle/MedlineCitation/PMID",
+    ...         "PubmedArticle/MedlineCitation/Article/ArticleTitle"]
+    >>> for record in Entrez.parse(handle, keep):
+    ...     print record["MedlineCitation"]["Article"]["ArticleTitle"]
+    """
     from Parser import DataHandler
     DTDs = os.path.join(__path__[0], "DTDs")
-    handler = DataHandler(DTDs)
+    handler = DataHandler(DTDs, keep)
     records = handler.parse(handle)
     return records
 
@@ -273,18 +309,55 @@ def _open(cgi, params={}, post=False):
     simple error checking, and will raise an IOError if it encounters one.
 
     This function also enforces the "up to three queries per second rule"
-    to avoid abusing the NCBI servers.
+    to avoid abusing the NCBI servers (the limit is shared with any
+    Bio.Entrez.Session.Session objects using the default rate).
+
+    If a cache has been set (see Bio.Entrez.Cache), GET requests are
+    answered from it when possible, and the replies are stored in it
+    (except for requests using the history server).
     """
+    params = _clean_params(params)
+    use_cache = cache is not None and not post and cache.cacheable(params)
+    if use_cache:
+        data = cache.get(cgi, params)
+        if data is not None:
+            return File.UndoHandle(StringIO(data))
     # NCBI requirement: At most three queries per second.
-    # Equivalently, at least a third of second between queries
-    delay = 0.333333334
-    current = time.time()
-    wait = _open.previous + delay - current
-    if wait > 0:
-        time.sleep(wait)
-        _open.previous = current + wait
+    _rate_limiter.wait()
+    # Open a handle to Entrez.
+    options = urllib.urlencode(params, doseq=True)
+    if post:
+        #HTTP POST
+        handle = urllib.urlopen(cgi, data=options)
     else:
-        _open.previous = current
+        #HTTP GET
+        handle = urllib.urlopen(cgi + "?" + options)
+
+    # Wrap the handle inside an UndoHandle.
+    uhandle = File.UndoHandle(handle)
+
+    # Check for errors in the first 7 lines.
+    # This is kind of ugly.
+    lines = []
+    for i in range(7):
+        lines.append(uhandle.readline())
+    for i in range(6, -1, -1):
+        uhandle.saveline(lines[i])
+    _check_data(''.join(lines))
+    if use_cache:
+        data = uhandle.read()
+        handle.close()
+        cache.put(cgi, params, data)
+        return File.UndoHandle(StringIO(data))
+    return uhandle
+
+def _clean_params(params):
+    """Return a copy of the parameters ready to send to Entrez (PRIVATE).
+
+    Removes None values and adds the tool and email parameters (warning
+    if no email address has been given).
+    """
+    params = dict(params)
     # Remove None values from the parameters
     for key, value in params.items():
         if value is None:
@@ -309,28 +382,10 @@ can specify it as follows:
 In case of excessive usage of the E-utilities, NCBI will attempt to contact
 a user at the email address provided before blocking access to the
 E-utilities.""", UserWarning)
-    # Open a handle to Entrez.
-    options = urllib.urlencode(params, doseq=True)
-    if post:
-        #HTTP POST
-        handle = urllib.urlopen(cgi, data=options)
-    else:
-        #HTTP GET
-        cgi += "?" + options
-        handle = urllib.urlopen(cgi)
+    return params
 
-    # Wrap the handle inside an UndoHandle.
-    uhandle = File.UndoHandle(handle)
-
-    # Check for errors in the first 7 lines.
-    # This is kind of ugly.
-    lines = []
-    for i in range(7):
-        lines.append(uhandle.readline())
-    for i in range(6, -1, -1):
-        uhandle.saveline(lines[i])
-    data = ''.join(lines)
-                   
+def _check_data(data):
+    """Raise an IOError if the start of a reply is an error page (PRIVATE)."""
     if "500 Proxy Error" in data:
         # Sometimes Entrez returns a Proxy Error instead of results
         raise IOError("500 Proxy Error (NCBI busy?)")
@@ -365,6 +420,6 @@ E-utilities.""", UserWarning)
         # occurs on the first line.  I need to check this!
         raise IOError("ERROR, possibly because id not available?")
     # Should I check for 404?  timeout?  etc?
-    return uhandle
 
-_open.previous = 0
+# Shared by all threads, and by Session objects using the default rate
+_rate_limiter = RateLimiter(3)
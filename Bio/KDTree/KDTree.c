@@ -1178,3 +1178,278 @@ KDTree_neighbor_simple_search(struct KDTree* tree, float radius,
 
     return 1;
 }
+
+/* Reentrant queries
+ *
+ * The functions below only read the tree. All their state is kept on the
+ * stack or in memory allocated by the caller, so they do not use the 
+ * _query_region/_radius_list members or the Region_dim global, and 
+ * several threads can search the same tree at the same time (as long as 
+ * KDTree_set_data is not called meanwhile). The left subtree of a node 
+ * holds the points with coord<=cut value, the right one those with 
+ * coord>=cut value. The off array holds the distance of the center to
+ * the current cell along each dimension, and rd the sum of their squares
+ * (see Arya & Mount, "Algorithms for fast vector quantization", 1993).
+ */
+
+struct Hits
+{
+    long int *indices;
+    float *radii;
+    long int count;
+    long int size;
+};
+
+static int Hits_add(struct Hits* hits, long int index, float radius)
+{
+    if (hits->count==hits->size)
+    {
+        long int size = 2*hits->size+64;
+        long int *indices;
+        float *radii;
+
+        indices = realloc(hits->indices, size*sizeof(long int));
+        if (indices==NULL) return 0;
+        hits->indices=indices;
+        radii = realloc(hits->radii, size*sizeof(float));
+        if (radii==NULL) return 0;
+        hits->radii=radii;
+        hits->size=size;
+    }
+    hits->indices[hits->count]=index;
+    hits->radii[hits->count]=radius;
+    hits->count++;
+    return 1;
+}
+
+static int KDTree_radius_search(struct KDTree* tree, struct Node *node, float *coord, float radius_sq, float *off, float rd, struct Hits* hits)
+{
+    int d;
+    float diff, old;
+    struct Node *near_node, *far_node;
+
+    if (Node_is_leaf(node))
+    {
+        long int i;
+
+        for (i=node->_start; i<node->_end; i++)
+        {
+            struct DataPoint data_point;
+            float r;
+
+            data_point=tree->_data_point_list[i];
+            r=KDTree_dist(coord, data_point._coord, tree->dim);
+            if (r<=radius_sq)
+            {
+                if (!Hits_add(hits, data_point._index, sqrt(r))) return 0;
+            }
+        }
+        return 1;
+    }
+
+    d=node->_cut_dim;
+    diff=coord[d]-node->_cut_value;
+    if (diff<=0)
+    {
+        near_node=node->_left;
+        far_node=node->_right;
+    }
+    else
+    {
+        near_node=node->_right;
+        far_node=node->_left;
+    }
+    if (!KDTree_radius_search(tree, near_node, coord, radius_sq, off, rd, hits)) return 0;
+    old=off[d];
+    rd=rd-old*old+diff*diff;
+    if (rd<=radius_sq)
+    {
+        int ok;
+
+        off[d]=diff;
+        ok=KDTree_radius_search(tree, far_node, coord, radius_sq, off, rd, hits);
+        off[d]=old;
+        if (!ok) return 0;
+    }
+    return 1;
+}
+
+int KDTree_search_center_radius_batch(struct KDTree* tree, float *centers, long int nr_centers, float radius, long int *indptr, long int **indices, float **radii)
+{
+    long int i;
+    int j;
+    float *off;
+    struct Hits hits;
+
+    hits.indices=NULL;
+    hits.radii=NULL;
+    hits.count=0;
+    hits.size=0;
+
+    off=malloc(tree->dim*sizeof(float));
+    if (off==NULL) return 0;
+
+    indptr[0]=0;
+    for (i=0; i<nr_centers; i++)
+    {
+        if (tree->_root)
+        {
+            for (j=0; j<tree->dim; j++) off[j]=0;
+            if (!KDTree_radius_search(tree, tree->_root, centers+i*tree->dim, radius*radius, off, 0, &hits))
+            {
+                free(off);
+                if (hits.indices) free(hits.indices);
+                if (hits.radii) free(hits.radii);
+                return 0;
+            }
+        }
+        indptr[i+1]=hits.count;
+    }
+    free(off);
+    /* the caller frees these */
+    *indices=hits.indices;
+    *radii=hits.radii;
+    return 1;
+}
+
+/* k nearest neighbors; the best points found so far are kept in a max
+ * heap of squared distances */
+
+static void Heap_sift_down(float *values, long int *indices, int count, int i)
+{
+    float value=values[i];
+    long int index=indices[i];
+
+    while (1)
+    {
+        int child=2*i+1;
+
+        if (child>=count) break;
+        if (child+1<count && values[child+1]>values[child]) child++;
+        if (values[child]<=value) break;
+        values[i]=values[child];
+        indices[i]=indices[child];
+        i=child;
+    }
+    values[i]=value;
+    indices[i]=index;
+}
+
+static void Heap_push(float *values, long int *indices, int count, float value, long int index)
+{
+    /* add to a heap with count elements */
+    int i=count;
+
+    while (i>0)
+    {
+        int parent=(i-1)/2;
+
+        if (values[parent]>=value) break;
+        values[i]=values[parent];
+        indices[i]=indices[parent];
+        i=parent;
+    }
+    values[i]=value;
+    indices[i]=index;
+}
+
+static void KDTree_nearest_search(struct KDTree* tree, struct Node *node, float *coord, int k, float *values, long int *indices, int *count, float *off, float rd)
+{
+    int d;
+    float diff, old;
+    struct Node *near_node, *far_node;
+
+    if (Node_is_leaf(node))
+    {
+        long int i;
+
+        for (i=node->_start; i<node->_end; i++)
+        {
+            struct DataPoint data_point;
+            float r;
+
+            data_point=tree->_data_point_list[i];
+            r=KDTree_dist(coord, data_point._coord, tree->dim);
+            if (*count<k)
+            {
+                Heap_push(values, indices, *count, r, data_point._index);
+                (*count)++;
+            }
+            else if (r<values[0])
+            {
+                values[0]=r;
+                indices[0]=data_point._index;
+                Heap_sift_down(values, indices, k, 0);
+            }
+        }
+        return;
+    }
+
+    d=node->_cut_dim;
+    diff=coord[d]-node->_cut_value;
+    if (diff<=0)
+    {
+        near_node=node->_left;
+        far_node=node->_right;
+    }
+    else
+    {
+        near_node=node->_right;
+        far_node=node->_left;
+    }
+    KDTree_nearest_search(tree, near_node, coord, k, values, indices, count, off, rd);
+    old=off[d];
+    rd=rd-old*old+diff*diff;
+    if (*count<k || rd<values[0])
+    {
+        off[d]=diff;
+        KDTree_nearest_search(tree, far_node, coord, k, values, indices, count, off, rd);
+        off[d]=old;
+    }
+}
+
+int KDTree_search_nearest_batch(struct KDTree* tree, float *centers, long int nr_centers, int k, long int *indices, float *radii)
+{
+    /* indices and radii are nr_centers*k arrays. The neighbors of each
+     * center are sorted by distance; missing neighbors (if there are
+     * less than k points) have index -1 and radius HUGE_VAL. */
+    long int i;
+    int j;
+    float *off;
+
+    off=malloc(tree->dim*sizeof(float));
+    if (off==NULL) return 0;
+
+    for (i=0; i<nr_centers; i++)
+    {
+        float *values=radii+i*k;
+        long int *heap_indices=indices+i*k;
+        int count=0;
+
+        if (tree->_root)
+        {
+            for (j=0; j<tree->dim; j++) off[j]=0;
+            KDTree_nearest_search(tree, tree->_root, centers+i*tree->dim, k, values, heap_indices, &count, off, 0);
+        }
+        for (j=count; j<k; j++)
+        {
+            values[j]=HUGE_VAL;
+            heap_indices[j]=-1;
+        }
+        /* heap sort, and take the square root */
+        for (j=count-1; j>0; j--)
+        {
+            float value=values[j];
+            long int index=heap_indices[j];
+
+            values[j]=values[0];
+            heap_indices[j]=heap_indices[0];
+            values[0]=value;
+            heap_indices[0]=index;
+            Heap_sift_down(values, heap_indices, j, 0);
+        }
+        for (j=0; j<count; j++) values[j]=sqrt(values[j]);
+    }
+    free(off);
+    return 1;
+}
@@ -12,3 +12,5 @@ void KDTree_copy_indices(struct KDTree* tree, long *indices);
 void KDTree_copy_radii(struct KDTree* tree, float *radii);
 int KDTree_neighbor_search(struct KDTree* tree, float neighbor_radius, struct Neighbor** neighbors);
 int KDTree_neighbor_simple_search(struct KDTree* tree, float radius, struct Neighbor** neighbors);
+int KDTree_search_center_radius_batch(struct KDTree* tree, float *centers, long int nr_centers, float radius, long int *indptr, long int **indices, float **radii);
+int KDTree_search_nearest_batch(struct KDTree* tree, float *centers, long int nr_centers, int k, long int *indices, float *radii);
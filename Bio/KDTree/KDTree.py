@@ -14,7 +14,9 @@ Algorithms and Applications" (Mark de Berg, Marc van Kreveld, Mark Overmars,
 Otfried Schwarzkopf). Author: Thomas Hamelryck.
 """
 
-from numpy import sum, sqrt, dtype, array
+import threading
+
+from numpy import sum, sqrt, dtype, array, asarray, concatenate, zeros
 from numpy.random import random
 
 from Bio.KDTree import _CKDTree 
@@ -88,6 +90,39 @@ def _test(nr_points, dim, bucket_size, radius):
     else:
         print "Not passed: %i != %i." % (l1, l2)
 
+def _batch_test(nr_points, dim, bucket_size, radius, k):
+    """Test the batch searches.
+
+    Compare the batch radius and nearest neighbor searches (with
+    two threads) with a brute force search.
+
+    o nr_points - number of points used in test
+    o dim - dimension of coords
+    o bucket_size - nr of points per tree node
+    o radius - radius of search (typically 0.05 or so) 
+    o k - number of nearest neighbors
+    """
+    kdt=KDTree(dim, bucket_size)
+    coords=random((nr_points, dim))
+    kdt.set_coords(coords)
+    centers=random((20, dim))
+    indptr, indices, radii=kdt.search_batch(centers, radius, num_threads=2)
+    nn_indices, nn_radii=kdt.nearest_batch(centers, k, num_threads=2)
+    ok=1
+    for i in range(0, len(centers)):
+        d=sqrt(sum((coords-centers[i])**2, 1))
+        found=indices[indptr[i]:indptr[i+1]]
+        expected=(d<=radius).nonzero()[0]
+        if sorted(found)!=sorted(expected):
+            ok=0
+        nearest=d.argsort()[:k]
+        if abs(nn_radii[i]-d[nearest]).max()>1e-5:
+            ok=0
+    if ok:
+        print "Passed."
+    else:
+        print "Not passed."
+
 class KDTree:
     """
     KD tree implementation (C++, SWIG python wrapper)
@@ -183,6 +218,93 @@ class KDTree:
             return []
         return a
 
+    # Searches for many points at once
+
+    def _check_centers(self, centers):
+        if not self.built:
+                raise Exception("No point set specified")
+        centers=asarray(centers)
+        if len(centers.shape)!=2 or centers.shape[1]!=self.dim:
+                raise Exception("Expected a Nx%i NumPy array" % self.dim)
+        return centers
+
+    def _run_threads(self, search, centers, num_threads):
+        # Split the centers over num_threads threads; the C code
+        # releases the GIL, so the searches run in parallel.
+        # Returns the list of results of each part.
+        if num_threads<=1 or len(centers)<2*num_threads:
+            return [search(centers)]
+        step=(len(centers)+num_threads-1)//num_threads
+        results=[None]*num_threads
+        errors=[]
+        def run(i):
+            try:
+                results[i]=search(centers[i*step:(i+1)*step])
+            except Exception, e:
+                errors.append(e)
+        threads=[]
+        for i in range(0, num_threads):
+            thread=threading.Thread(target=run, args=(i,))
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return results
+
+    def search_batch(self, centers, radius, num_threads=1):
+        """Search all points within radius of many centers.
+
+        Return a tuple (indptr, indices, radii) of NumPy arrays. The 
+        indices and distances of the points within radius of centers[i]
+        are indices[indptr[i]:indptr[i+1]] and radii[indptr[i]:indptr[i+1]].
+
+        Unlike search, this does not store the results in the tree, so
+        the same tree can be searched from several threads at once.
+
+        o centers - two dimensional NumPy array. E.g. if the points
+        have dimensionality D, the centers array should be MxD 
+        dimensional. 
+        o radius - float>0
+        o num_threads - number of threads to split the centers over
+        """
+        centers=self._check_centers(centers)
+        search=lambda c: self.kdt.search_center_radius_batch(c, radius)
+        results=self._run_threads(search, centers, num_threads)
+        if len(results)==1:
+            return results[0]
+        indptr_list=[zeros(1, "l")]
+        offset=0
+        for indptr, indices, radii in results:
+            indptr_list.append(indptr[1:]+offset)
+            offset=offset+indptr[-1]
+        return (concatenate(indptr_list), 
+                concatenate([r[1] for r in results]),
+                concatenate([r[2] for r in results]))
+
+    def nearest_batch(self, centers, k=1, num_threads=1):
+        """Search the k nearest points of many centers.
+
+        Return a tuple (indices, radii) of Mxk NumPy arrays. Row i 
+        holds the indices and distances of the nearest points of 
+        centers[i], nearest first. If there are less than k points, 
+        the rows are padded with index -1 and distance inf.
+
+        Like search_batch, this can be used from several threads at once.
+
+        o centers - MxD NumPy array
+        o k - int>0, the number of neighbors
+        o num_threads - number of threads to split the centers over
+        """
+        centers=self._check_centers(centers)
+        search=lambda c: self.kdt.search_nearest_batch(c, k)
+        results=self._run_threads(search, centers, num_threads)
+        if len(results)==1:
+            return results[0]
+        return (concatenate([r[0] for r in results]),
+                concatenate([r[1] for r in results]))
+
     # Fixed radius search for all points
 
 
@@ -140,6 +140,9 @@ static PyTypeObject PyNeighborType = {
 typedef struct {
     PyObject_HEAD
     struct KDTree* tree;
+    int dim;
+    /* number of running batch queries (which release the GIL) */
+    int nr_queries;
 } PyTree;
 
 static void
@@ -172,6 +175,8 @@ PyTree_init(PyTree* self, PyObject* args, PyObject* kwds)
     }
 
     self->tree = tree;
+    self->dim = dim;
+    self->nr_queries = 0;
     return 0;
 }
 
@@ -221,6 +226,13 @@ PyTree_set_data(PyTree* self, PyObject* args)
 
     if(!PyArg_ParseTuple(args, "O:KDTree_set_data",&obj)) return NULL;
 
+    if (self->nr_queries > 0)
+    {
+        PyErr_SetString(PyExc_RuntimeError,
+                        "Cannot change the data during a search.");
+        return NULL;
+    }
+
     /* Check if it is an array */
     if (!PyArray_Check(obj))
     {
@@ -495,6 +507,221 @@ PyTree_neighbor_simple_search(PyTree* self, PyObject* args)
     return list;
 }
 
+static float*
+PyTree_get_centers(PyTree* self, PyObject* obj, long int* nr_centers)
+{
+    /* Copy a two dimensional array of centers to a new float array */
+    float* coords;
+    long int n, m, i;
+    PyArrayObject *array;
+    npy_intp rowstride, colstride;
+    const char* p;
+
+    if (!PyArray_Check(obj))
+    {
+        PyErr_SetString(PyExc_TypeError, "First argument must be an array.");
+        return NULL;
+    }
+    array=(PyArrayObject *) obj;
+    if(PyArray_NDIM(array)!=2 || PyArray_DIM(array, 1)!=self->dim)
+    {
+        PyErr_SetString(PyExc_ValueError,
+                        "Array must be two dimensional, with one row per center.");
+        return NULL;
+    }
+    if (PyArray_TYPE(array) == NPY_DOUBLE)
+    {
+        Py_INCREF(obj);
+    }
+    else
+    {
+        /* Cast to type double */
+        obj = PyArray_Cast(array, NPY_DOUBLE);
+        if (!obj)
+        {
+            PyErr_SetString(PyExc_ValueError,
+                            "coordinates cannot be cast to needed type.");
+            return NULL;
+        }
+        array = (PyArrayObject*) obj;
+    }
+
+    n = (long int) PyArray_DIM(array, 0);
+    m = (long int) PyArray_DIM(array, 1);
+
+    coords= malloc((m*n+1)*sizeof(float));
+    if (!coords)
+    {
+        Py_DECREF(obj);
+        PyErr_SetString (PyExc_MemoryError, "Failed to allocate memory for coordinates.");
+        return NULL;
+    }
+
+    rowstride =  PyArray_STRIDE(array, 0);
+    colstride =  PyArray_STRIDE(array, 1);
+    p = PyArray_BYTES(array);
+
+    for (i=0; i<n; i++)
+    {
+        int j;
+
+        for (j=0; j<m; j++)
+        {
+            coords[i*m+j]=*(double *) (p+i*rowstride+j*colstride);
+        }
+    }
+    Py_DECREF(obj);
+    *nr_centers = n;
+    return coords;
+}
+
+static char PyTree_search_center_radius_batch__doc__[] =
+"search_center_radius_batch(centers, radius) -> (indptr, indices, radii)\n"
+"\n"
+"Search the points within radius of each row of centers. The indices\n"
+"and distances of the points found for center i are\n"
+"indices[indptr[i]:indptr[i+1]] and radii[indptr[i]:indptr[i+1]].\n"
+"The search releases the GIL and does not change the tree.\n";
+
+static PyObject*
+PyTree_search_center_radius_batch(PyTree* self, PyObject* args)
+{
+    PyObject *obj;
+    double radius;
+    float *centers;
+    long int n, *indices=NULL;
+    float *radii=NULL;
+    npy_intp length;
+    PyArrayObject *indptr_array, *indices_array, *radii_array;
+    struct KDTree* tree = self->tree;
+    int ok;
+
+    if(!PyArg_ParseTuple(args, "Od:KDTree_search_center_radius_batch", &obj, &radius))
+        return NULL;
+
+    if(radius <= 0)
+    {
+        PyErr_SetString(PyExc_ValueError, "Radius must be positive.");
+        return NULL;
+    }
+
+    centers = PyTree_get_centers(self, obj, &n);
+    if (!centers) return NULL;
+
+    length = n+1;
+    indptr_array=(PyArrayObject *) PyArray_SimpleNew(1, &length, PyArray_LONG);
+    if (!indptr_array)
+    {
+        free(centers);
+        PyErr_SetString(PyExc_MemoryError, "Insufficient memory for array");
+        return NULL;
+    }
+
+    self->nr_queries++;
+    Py_BEGIN_ALLOW_THREADS
+    ok = KDTree_search_center_radius_batch(tree, centers, n, radius,
+        (long int *) PyArray_BYTES(indptr_array), &indices, &radii);
+    Py_END_ALLOW_THREADS
+    self->nr_queries--;
+    free(centers);
+
+    if (!ok)
+    {
+        Py_DECREF(indptr_array);
+        PyErr_SetString (PyExc_MemoryError, "Insufficient memory for calculation.");
+        return NULL;
+    }
+
+    length = ((long int *) PyArray_BYTES(indptr_array))[n];
+    indices_array=(PyArrayObject *) PyArray_SimpleNew(1, &length, PyArray_LONG);
+    radii_array=(PyArrayObject *) PyArray_SimpleNew(1, &length, PyArray_FLOAT);
+    if (!indices_array || !radii_array)
+    {
+        Py_DECREF(indptr_array);
+        Py_XDECREF(indices_array);
+        Py_XDECREF(radii_array);
+        if (indices) free(indices);
+        if (radii) free(radii);
+        PyErr_SetString(PyExc_MemoryError, "Insufficient memory for array");
+        return NULL;
+    }
+    if (length > 0)
+    {
+        memcpy(PyArray_BYTES(indices_array), indices, length*sizeof(long int));
+        memcpy(PyArray_BYTES(radii_array), radii, length*sizeof(float));
+    }
+    if (indices) free(indices);
+    if (radii) free(radii);
+
+    return Py_BuildValue("NNN", indptr_array, indices_array, radii_array);
+}
+
+static char PyTree_search_nearest_batch__doc__[] =
+"search_nearest_batch(centers, k) -> (indices, radii)\n"
+"\n"
+"Search the k nearest points of each row of centers. Row i of the Nxk\n"
+"arrays holds the indices and distances of the neighbors of center i,\n"
+"nearest first. If there are less than k points, the row is padded with\n"
+"index -1 and distance inf.\n"
+"The search releases the GIL and does not change the tree.\n";
+
+static PyObject*
+PyTree_search_nearest_batch(PyTree* self, PyObject* args)
+{
+    PyObject *obj;
+    int k;
+    float *centers;
+    long int n;
+    npy_intp shape[2];
+    PyArrayObject *indices_array, *radii_array;
+    struct KDTree* tree = self->tree;
+    int ok;
+
+    if(!PyArg_ParseTuple(args, "Oi:KDTree_search_nearest_batch", &obj, &k))
+        return NULL;
+
+    if(k <= 0)
+    {
+        PyErr_SetString(PyExc_ValueError, "Number of neighbors must be positive.");
+        return NULL;
+    }
+
+    centers = PyTree_get_centers(self, obj, &n);
+    if (!centers) return NULL;
+
+    shape[0] = n;
+    shape[1] = k;
+    indices_array=(PyArrayObject *) PyArray_SimpleNew(2, shape, PyArray_LONG);
+    radii_array=(PyArrayObject *) PyArray_SimpleNew(2, shape, PyArray_FLOAT);
+    if (!indices_array || !radii_array)
+    {
+        Py_XDECREF(indices_array);
+        Py_XDECREF(radii_array);
+        free(centers);
+        PyErr_SetString(PyExc_MemoryError, "Insufficient memory for array");
+        return NULL;
+    }
+
+    self->nr_queries++;
+    Py_BEGIN_ALLOW_THREADS
+    ok = KDTree_search_nearest_batch(tree, centers, n, k,
+        (long int *) PyArray_BYTES(indices_array),
+        (float *) PyArray_BYTES(radii_array));
+    Py_END_ALLOW_THREADS
+    self->nr_queries--;
+    free(centers);
+
+    if (!ok)
+    {
+        Py_DECREF(indices_array);
+        Py_DECREF(radii_array);
+        PyErr_SetString (PyExc_MemoryError, "Insufficient memory for calculation.");
+        return NULL;
+    }
+
+    return Py_BuildValue("NN", indices_array, radii_array);
+}
+
 static char PyTree_get_indices__doc__[] =
 "returns indices of coordinates within radius as a Numpy array\n";
 
@@ -564,6 +791,8 @@ static PyMethodDef PyTree_methods[] = {
     {"neighbor_simple_search", (PyCFunction)PyTree_neighbor_simple_search, METH_VARARGS, NULL},
     {"get_indices", (PyCFunction)PyTree_get_indices, METH_NOARGS, PyTree_get_indices__doc__},
     {"get_radii", (PyCFunction)PyTree_get_radii, METH_NOARGS, PyTree_get_radii__doc__},
+    {"search_center_radius_batch", (PyCFunction)PyTree_search_center_radius_batch, METH_VARARGS, PyTree_search_center_radius_batch__doc__},
+    {"search_nearest_batch", (PyCFunction)PyTree_search_nearest_batch, METH_VARARGS, PyTree_search_nearest_batch__doc__},
     {NULL}  /* Sentinel */
 };
 
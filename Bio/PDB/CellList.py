@@ -0,0 +1,264 @@
+# Copyright (C) 2026, the Biopython contributors
+# This code is part of the Biopython distribution and governed by its
+# license.  Please see the LICENSE file that should have been included
+# as part of this package.
+
+import numpy
+
+from PDBExceptions import PDBException
+
+__doc__="Fixed radius neighbor search using a grid of cells (cell list)."
+
+
+class CellList:
+    """
+    Grid based fixed radius neighbor search, implemented with NumPy.
+
+    The points are sorted into cubic cells. A query only looks at the
+    points in the cells surrounding the query point, and all queries
+    of a batch are handled together in array operations. For data with
+    a roughly uniform density (like the atoms of a protein) this is
+    fast, and there is no per-query Python overhead.
+
+    Optionally, an orthorhombic periodic box can be given, in which
+    case distances follow the minimum image convention.
+
+    Example:
+
+    >>> cl=CellList(coords, 5.0)
+    >>> indptr, indices=cl.search_batch(centers, 5.0)
+    >>> # points within 5.0 of centers[i]
+    >>> indices[indptr[i]:indptr[i+1]]
+    """
+    # Largest number of cells for which a lookup table is made
+    _max_table_size=1000000
+
+    def __init__(self, coords, cell_size, box=None):
+        """
+        o coords - Nx3 NumPy array of point coordinates
+        o cell_size - float, edge length of the cells. Querying is
+        fastest if this is about the search radius.
+        o box - sequence of 3 floats (box edge lengths) for periodic
+        boundary conditions, or None
+        """
+        coords=numpy.asarray(coords, "d")
+        if len(coords.shape)!=2 or coords.shape[1]!=3:
+            raise PDBException("Expected a Nx3 NumPy array")
+        if cell_size<=0:
+            raise PDBException("Cell size should be positive")
+        if box is None:
+            self.box=None
+            self.origin=coords.min(0)-1e-6
+            extent=coords.max(0)-self.origin
+            self.shape=numpy.floor(extent/cell_size).astype("l")+1
+            self.cell_size=numpy.array((cell_size,)*3, "d")
+        else:
+            self.box=numpy.asarray(box, "d")
+            if self.box.shape!=(3,) or self.box.min()<=0:
+                raise PDBException("Expected 3 positive box lengths")
+            self.origin=numpy.zeros(3, "d")
+            # the cells should fill the box exactly
+            self.shape=numpy.maximum(numpy.floor(self.box/cell_size), 1).astype("l")
+            self.cell_size=self.box/self.shape
+            coords=coords-numpy.floor(coords/self.box)*self.box
+        self.coords=coords
+        # sort the points by cell (empty cells take no memory)
+        cell_indices=self._cell_indices(coords)
+        if self.box is not None:
+            # guard against rounding at the upper box edge
+            cell_indices=cell_indices%self.shape
+        cell_ids=self._cell_ids(cell_indices)
+        self.order=numpy.argsort(cell_ids, kind="mergesort")
+        self.sorted_ids=cell_ids[self.order]
+        self.sorted_coords=coords[self.order]
+        nr_cells=self.shape[0]*self.shape[1]*self.shape[2]
+        if nr_cells<=max(self._max_table_size, 8*len(coords)):
+            # table with the start of each cell in the sorted points
+            self.cell_start=numpy.searchsorted(self.sorted_ids, 
+                                               numpy.arange(nr_cells+1))
+        else:
+            # sparse grid, look cells up in the sorted ids instead
+            self.cell_start=None
+
+    # Private
+
+    def _cell_indices(self, coords):
+        # Nx3 array of integer cell indices (not clipped)
+        return numpy.floor((coords-self.origin)/self.cell_size).astype("l")
+
+    def _cell_ids(self, cell_indices):
+        # flat cell ids of in-range cell indices, as 64 bit integers
+        # since a sparse grid can have more than 2**31 cells
+        ny, nz=int(self.shape[1]), int(self.shape[2])
+        cell_indices=cell_indices.astype("q")
+        return (cell_indices[:,0]*ny+cell_indices[:,1])*nz+cell_indices[:,2]
+
+    def _offsets(self, radius):
+        # All cell offsets that need to be visited for this radius
+        reach=numpy.ceil(radius/self.cell_size).astype("l")
+        offsets=[]
+        for dx in range(-reach[0], reach[0]+1):
+            for dy in range(-reach[1], reach[1]+1):
+                for dz in range(-reach[2], reach[2]+1):
+                    offsets.append((dx, dy, dz))
+        offsets=numpy.array(offsets, "l")
+        # skip the corner cells that are out of reach
+        gap=numpy.maximum(abs(offsets)-1, 0)*self.cell_size
+        offsets=offsets[numpy.sum(gap*gap, 1)<=radius*radius]
+        if self.box is not None:
+            # don't visit a cell twice when wrapping around
+            offsets=offsets%self.shape
+            ids=self._cell_ids(offsets)
+            offsets=offsets[numpy.unique(ids, return_index=True)[1]]
+        return offsets
+
+    def _candidates(self, centers, radius):
+        # For each visited cell offset, yield arrays with the center 
+        # index, the position in the sorted points and the squared 
+        # distance of all center/point pairs in the visited cells.
+        # The center indices are in increasing order.
+        if self.box is not None:
+            centers=centers-numpy.floor(centers/self.box)*self.box
+        center_cells=self._cell_indices(centers)
+        for offset in self._offsets(radius):
+            cells=center_cells+offset
+            if self.box is None:
+                inside=numpy.logical_and(cells>=0, cells<self.shape).all(1)
+                query=numpy.nonzero(inside)[0]
+                cells=cells[query]
+            else:
+                query=numpy.arange(len(centers))
+                cells=cells%self.shape
+            cell_ids=self._cell_ids(cells)
+            if self.cell_start is not None:
+                starts=self.cell_start[cell_ids]
+                counts=self.cell_start[cell_ids+1]-starts
+            else:
+                starts=numpy.searchsorted(self.sorted_ids, cell_ids, "left")
+                counts=numpy.searchsorted(self.sorted_ids, cell_ids, 
+                                          "right")-starts
+            total=counts.sum()
+            if total==0:
+                continue
+            # expand each query into the range of points in its cell
+            ends=numpy.cumsum(counts)
+            center_index=numpy.repeat(query, counts)
+            point_pos=numpy.arange(total)+numpy.repeat(starts-(ends-counts),
+                                                       counts)
+            diff=self.sorted_coords[point_pos]-centers[center_index]
+            if self.box is not None:
+                diff=diff-numpy.round(diff/self.box)*self.box
+            yield center_index, point_pos, numpy.sum(diff*diff, 1)
+
+    def _check_centers(self, centers):
+        centers=numpy.asarray(centers, "d")
+        if len(centers.shape)!=2 or centers.shape[1]!=3:
+            raise PDBException("Expected a Mx3 NumPy array")
+        return centers
+
+    def _pairs(self, centers, radius):
+        # Return (center index, point index) arrays of all pairs
+        # within radius, sorted by center index and point index.
+        centers=self._check_centers(centers)
+        radius_sq=radius*radius
+        center_list=[]
+        point_list=[]
+        for center_index, point_pos, d2 in self._candidates(centers, radius):
+            hits=d2<=radius_sq
+            center_list.append(center_index[hits])
+            point_list.append(self.order[point_pos[hits]])
+        if not center_list:
+            empty=numpy.zeros(0, "l")
+            return empty, empty
+        center_index=numpy.concatenate(center_list)
+        point_index=numpy.concatenate(point_list)
+        sort=numpy.lexsort((point_index, center_index))
+        return center_index[sort], point_index[sort]
+
+    # Public
+
+    def search_batch(self, centers, radius):
+        """Search all points within radius of each center.
+
+        Return a tuple (indptr, indices) of NumPy arrays in compressed
+        sparse row layout: the indices of the points within radius of
+        centers[i] are indices[indptr[i]:indptr[i+1]], in increasing
+        order.
+
+        o centers - Mx3 NumPy array
+        o radius - float>0
+        """
+        center_index, point_index=self._pairs(centers, radius)
+        indptr=numpy.searchsorted(center_index, numpy.arange(len(centers)+1))
+        return indptr, point_index
+
+    def search(self, center, radius):
+        """Return the indices of all points within radius of center.
+
+        o center - NumPy array of length 3
+        o radius - float>0
+        """
+        indptr, indices=self.search_batch(numpy.reshape(center, (1, 3)), radius)
+        return indices
+
+    def nearest(self, centers, radius):
+        """Find the nearest point of each center.
+
+        Return a tuple (distances, indices) of NumPy arrays with the
+        distance and index of the nearest point within radius of each 
+        center. If there is no point within radius, the distance is
+        inf and the index -1.
+
+        o centers - Mx3 NumPy array
+        o radius - float>0
+        """
+        centers=self._check_centers(centers)
+        d2_min=numpy.empty(len(centers), "d")
+        d2_min.fill(numpy.inf)
+        pos_min=numpy.zeros(len(centers), "l")
+        pos_min.fill(-1)
+        for center_index, point_pos, d2 in self._candidates(centers, radius):
+            # the pairs of each center are contiguous
+            starts=numpy.nonzero(numpy.concatenate(([1], 
+                center_index[1:]!=center_index[:-1])))[0]
+            index=center_index[starts]
+            segment_min=numpy.minimum.reduceat(d2, starts)
+            better=segment_min<d2_min[index]
+            if not better.any():
+                continue
+            # position of the (first) minimum in each segment
+            is_min=d2==numpy.repeat(segment_min, 
+                numpy.diff(numpy.concatenate((starts, [len(d2)]))))
+            first=numpy.unique(center_index[is_min], return_index=True)[1]
+            min_pos=point_pos[numpy.nonzero(is_min)[0][first]]
+            index=index[better]
+            d2_min[index]=segment_min[better]
+            pos_min[index]=min_pos[better]
+        found=d2_min<=radius*radius
+        distances=numpy.sqrt(d2_min)
+        distances[numpy.logical_not(found)]=numpy.inf
+        indices=numpy.where(found, self.order[pos_min], -1)
+        return distances, indices
+
+    def all_search(self, radius):
+        """Return all point pairs within radius.
+
+        Return a Nx2 NumPy array of point indices, where the first
+        index of each pair is smaller than the second.
+
+        o radius - float>0
+        """
+        index1, index2=self._pairs(self.coords, radius)
+        keep=index1<index2
+        return numpy.column_stack((index1[keep], index2[keep]))
+
+
+if __name__=="__main__":
+
+    from numpy.random import random
+
+    coords=100*random((10000, 3))
+    cl=CellList(coords, 5.0)
+    indptr, indices=cl.search_batch(coords[:100], 5.0)
+    print "Found %i neighbors of 100 points." % len(indices)
+    print "Found %i point pairs." % len(cl.all_search(5.0))
@@ -0,0 +1,263 @@
+# Copyright (C) 2026, the Biopython contributors
+# This code is part of the Biopython distribution and governed by its
+# license.  Please see the LICENSE file that should have been included
+# as part of this package.
+
+import numpy
+
+try:
+    import multiprocessing
+except ImportError:
+    # Python 2.5 and older
+    multiprocessing=None
+
+from PDBExceptions import PDBException
+
+__doc__="""
+All-vs-all RMSD of an ensemble of structures (e.g. NMR models or decoys).
+
+The RMSD after optimal superposition is calculated with the quaternion
+characteristic polynomial (QCP) method, which gives the RMSD without
+calculating the rotation. The RMSDs of one structure with many others are
+calculated together in NumPy array operations.
+
+Reference:
+
+Theobald DL, "Rapid calculation of RMSDs using a quaternion-based
+characteristic polynomial", Acta Cryst A61, 478-480 (2005)
+
+Example:
+
+    >>> from Bio.PDB.EnsembleRMSD import get_coord_stack, rmsd_matrix
+    >>> coords=get_coord_stack([list_of_ca_atoms_1, list_of_ca_atoms_2, ...])
+    >>> matrix=rmsd_matrix(coords, num_processes=4)
+
+The matrix can be used directly as distance matrix in Bio.Cluster:
+
+    >>> from Bio.Cluster import treecluster, kmedoids
+    >>> tree=treecluster(distancematrix=matrix.copy(), method='a')
+    >>> clusterid, error, nfound=kmedoids(matrix, nclusters=10, npass=20)
+
+For large ensembles, the matrix can be written to a NumPy .npy file
+row by row (open it again with numpy.load(filename, mmap_mode='r')):
+
+    >>> matrix=rmsd_matrix(coords, filename="rmsd.npy")
+"""
+
+
+def get_coord_stack(atom_lists):
+    """
+    Return the coordinates of a list of atom lists as a MxNx3 array.
+
+    @param atom_lists: M lists of N atoms (e.g. the CA atoms of each
+    model, in the same order)
+    @type atom_lists: [[L{Atom}, L{Atom},...], ...]
+    """
+    n=None
+    coord_list=[]
+    for atom_list in atom_lists:
+        if n is None:
+            n=len(atom_list)
+        elif len(atom_list)!=n:
+            raise PDBException("Atom lists differ in size")
+        coord_list.append([atom.get_coord() for atom in atom_list])
+    if n is None:
+        return numpy.zeros((0, 0, 3), "d")
+    return numpy.array(coord_list, "d").reshape((len(coord_list), n, 3))
+
+
+# Private
+
+def _center(coords):
+    # Center each structure on its centroid. Return the centered
+    # coordinates and the inner products (sum of squared coordinates).
+    coords=numpy.asarray(coords, "d")
+    if len(coords.shape)!=3 or coords.shape[2]!=3:
+        raise PDBException("Expected a MxNx3 NumPy array")
+    if coords.shape[1]==0:
+        raise PDBException("No atoms")
+    coords=coords-coords.mean(1)[:,numpy.newaxis,:]
+    inner=numpy.sum(numpy.sum(coords*coords, 2), 1)
+    return coords, inner
+
+def _qcp_rmsd(reference, reference_inner, coords, inner):
+    # RMSDs of one centered Nx3 reference with a centered KxNx3 stack.
+    k, n=coords.shape[0], coords.shape[1]
+    if k==0:
+        return numpy.zeros(0, "d")
+    # correlation matrices: s[:,i,j]=sum of reference[:,i]*coords[k,:,j]
+    s=numpy.dot(reference.T, coords.transpose(1, 0, 2).reshape((n, 3*k)))
+    s=s.reshape((3, k, 3)).transpose(1, 0, 2)
+    sxx, sxy, sxz=s[:,0,0], s[:,0,1], s[:,0,2]
+    syx, syy, syz=s[:,1,0], s[:,1,1], s[:,1,2]
+    szx, szy, szz=s[:,2,0], s[:,2,1], s[:,2,2]
+    # coefficients of the characteristic polynomial of the key matrix
+    # (x**4+c2*x**2+c1*x+c0)
+    c2=-2.0*numpy.sum(numpy.sum(s*s, 2), 1)
+    c1=8.0*(sxx*syz*szy+syy*szx*sxz+szz*sxy*syx
+            -sxx*syy*szz-syz*szx*sxy-szy*syx*sxz)
+    # c0 is the determinant of the (symmetric) key matrix
+    k00, k01, k02, k03=sxx+syy+szz, syz-szy, szx-sxz, sxy-syx
+    k11, k12, k13=sxx-syy-szz, sxy+syx, szx+sxz
+    k22, k23=-sxx+syy-szz, syz+szy
+    k33=-sxx-syy+szz
+    c0=((k00*k11-k01*k01)*(k22*k33-k23*k23)
+        -(k00*k12-k01*k02)*(k12*k33-k13*k23)
+        +(k00*k13-k01*k03)*(k12*k23-k13*k22)
+        +(k01*k12-k11*k02)*(k02*k33-k03*k23)
+        -(k01*k13-k11*k03)*(k02*k23-k03*k22)
+        +(k02*k13-k12*k03)*(k02*k13-k03*k12))
+    # largest eigenvalue by Newton-Raphson, starting from its upper bound
+    e0=(reference_inner+inner)/2.0
+    eigenvalue=e0.copy()
+    for i in range(0, 50):
+        x2=eigenvalue*eigenvalue
+        b=(x2+c2)*eigenvalue
+        a=b+c1
+        denominator=2.0*x2*eigenvalue+b+a
+        # converged pairs (e.g. identical structures) can have a zero
+        # derivative
+        delta=numpy.where(denominator!=0,
+                          (a*eigenvalue+c0)/numpy.where(denominator!=0,
+                                                        denominator, 1), 0)
+        eigenvalue=eigenvalue-delta
+        if numpy.all(abs(delta)<=1e-11*abs(eigenvalue)):
+            break
+    return numpy.sqrt(abs(2.0*(e0-eigenvalue)/n))
+
+def _row_blocks(m, nr_blocks):
+    # Split the rows 1..m-1 of the lower triangle in blocks with
+    # about the same number of pairs.
+    pairs=numpy.arange(m)
+    cumulative=numpy.cumsum(pairs)
+    bounds=numpy.searchsorted(cumulative,
+        numpy.arange(1, nr_blocks)*cumulative[-1]/float(nr_blocks))
+    bounds=numpy.unique(numpy.concatenate(([1], bounds, [m])))
+    return [(bounds[i], bounds[i+1]) for i in range(0, len(bounds)-1)]
+
+# the centered coordinates in the worker processes
+_worker_data=None
+
+def _init_worker(coords, inner):
+    global _worker_data
+    _worker_data=(coords, inner)
+
+def _rows(block):
+    # lower triangle rows start..end-1 from the worker data
+    coords, inner=_worker_data
+    start, end=block
+    rows=[]
+    for i in range(start, end):
+        rows.append(_qcp_rmsd(coords[i], inner[i], coords[:i], inner[:i]))
+    return rows
+
+
+# Public
+
+def rmsd_to_reference(reference, coords):
+    """
+    Return the RMSDs (after superposition) of a structure with many others.
+
+    @param reference: Nx3 array
+    @param coords: MxNx3 array
+    """
+    reference=numpy.asarray(reference, "d")
+    coords=numpy.asarray(coords, "d")
+    if len(reference.shape)!=2 or reference.shape!=coords.shape[1:]:
+        raise PDBException("Coordinate number/dimension mismatch")
+    reference, reference_inner=_center(reference[numpy.newaxis])
+    coords, inner=_center(coords)
+    return _qcp_rmsd(reference[0], reference_inner[0], coords, inner)
+
+def rmsd_rows(coords, num_processes=1, block_size=None):
+    """
+    Generate the rows of the lower triangle of the RMSD matrix.
+
+    Row i is an array with the RMSDs (after superposition) of structure i
+    with structures 0..i-1, so the first row is empty. The rows are
+    generated in order. A list of these rows is a valid distance matrix
+    for Bio.Cluster.
+
+    @param coords: MxNx3 array (see L{get_coord_stack})
+
+    @param num_processes: number of processes used for the calculation
+    (this needs the multiprocessing module, Python 2.6 or later)
+    @type num_processes: int
+
+    @param block_size: number of rows per task for the processes. By
+    default the work is split in 4 tasks per process.
+    @type block_size: int
+    """
+    coords, inner=_center(coords)
+    m=len(coords)
+    if m==0:
+        return
+    yield numpy.zeros(0, "d")
+    if m==1:
+        return
+    if num_processes>1 and multiprocessing is not None:
+        if block_size is None:
+            blocks=_row_blocks(m, 4*num_processes)
+        else:
+            blocks=[(i, min(i+block_size, m)) for i in range(1, m, block_size)]
+        pool=multiprocessing.Pool(num_processes, _init_worker, (coords, inner))
+        # Not try/finally, which can't contain a yield before Python 2.5
+        try:
+            for rows in pool.imap(_rows, blocks):
+                for row in rows:
+                    yield row
+        except:
+            # An error, or the generator was closed (GeneratorExit):
+            # stop the worker processes
+            pool.terminate()
+            raise
+        pool.close()
+        pool.join()
+    else:
+        for i in range(1, m):
+            yield _qcp_rmsd(coords[i], inner[i], coords[:i], inner[:i])
+
+def rmsd_matrix(coords, num_processes=1, filename=None):
+    """
+    Return the symmetric MxM matrix with the RMSDs (after superposition)
+    of all structures in an ensemble.
+
+    @param coords: MxNx3 array (see L{get_coord_stack})
+
+    @param num_processes: number of processes used for the calculation
+    @type num_processes: int
+
+    @param filename: if given, the matrix is written to this NumPy .npy
+    file as the rows are calculated, and a memory mapped array is returned
+    @type filename: string
+    """
+    coords=numpy.asarray(coords, "d")
+    m=len(coords)
+    if filename is None:
+        matrix=numpy.zeros((m, m), "d")
+    else:
+        from numpy.lib.format import open_memmap
+        matrix=open_memmap(filename, mode="w+", dtype="d", shape=(m, m))
+    i=0
+    for row in rmsd_rows(coords, num_processes):
+        matrix[i,:i]=row
+        matrix[i,i]=0.0
+        i=i+1
+    # fill the upper triangle
+    for i in range(0, m):
+        matrix[i,i+1:]=matrix[i+1:,i]
+    if filename is not None:
+        matrix.flush()
+    return matrix
+
+
+if __name__=="__main__":
+
+    import time
+    from numpy.random import random
+
+    # 500 random walk "structures" of 100 atoms
+    coords=numpy.cumsum(random((500, 100, 3))-0.5, 1)
+    t=time.time()
+    matrix=rmsd_matrix(coords)
+    print "%i RMSDs in %.2f s" % (len(coords)*(len(coords)-1)/2, time.time()-t)
@@ -6,13 +6,71 @@
 from math import pi
 import warnings
 
+import numpy
+
 from Bio.PDB import *
 from AbstractPropertyMap import AbstractPropertyMap
+from CellList import CellList
 
 
 __doc__="Half sphere exposure and coordination number calculation."
 
 
+def _get_ca_arrays(ppl):
+    """
+    Return the CA atoms of all amino acids in a list of polypeptides
+    as arrays (PRIVATE).
+
+    Returns a tuple (coordinates, polypeptide index, position in the 
+    polypeptide).
+    """
+    coord_list=[]
+    pp_list=[]
+    pos_list=[]
+    for k in range(0, len(ppl)):
+        pp=ppl[k]
+        for j in range(0, len(pp)):
+            ro=pp[j]
+            if not is_aa(ro) or not ro.has_id('CA'):
+                continue
+            coord_list.append(ro['CA'].get_coord())
+            pp_list.append(k)
+            pos_list.append(j)
+    return (numpy.array(coord_list, 'f').reshape((-1, 3)),
+            numpy.array(pp_list, 'l'), numpy.array(pos_list, 'l'))
+
+def _get_neighbor_pairs(centers, center_pp, center_pos, ca_arrays, radius,
+                        offset):
+    """
+    Find all CA atoms closer than radius to each center in one batch
+    query (PRIVATE). 
+    
+    CA atoms within offset positions of the center in the same 
+    polypeptide are ignored.
+
+    Returns a tuple (center index, CA index, center to CA vectors).
+    """
+    coords, pp_index, pos_index=ca_arrays
+    if len(centers)==0 or len(coords)==0:
+        empty=numpy.zeros(0, 'l')
+        return empty, empty, numpy.zeros((0, 3), centers.dtype)
+    indptr, ca_index=CellList(coords, radius).search_batch(centers, radius)
+    center_index=numpy.repeat(numpy.arange(len(centers)), 
+                              indptr[1:]-indptr[:-1])
+    d=coords[ca_index].astype(centers.dtype)-centers[center_index]
+    keep=numpy.sqrt(numpy.sum(d*d, 1))<radius
+    # neighboring residues in the chain are ignored 
+    flanking=numpy.logical_and(center_pp[center_index]==pp_index[ca_index],
+        abs(center_pos[center_index]-pos_index[ca_index])<=offset)
+    keep=numpy.logical_and(keep, numpy.logical_not(flanking))
+    return center_index[keep], ca_index[keep], d[keep]
+
+def _count(index, n):
+    # Number of occurrences of 0..n-1 in an index array (PRIVATE)
+    bounds=numpy.searchsorted(numpy.sort(index), numpy.arange(n+1))
+    return bounds[1:]-bounds[:-1]
+
+
 class _AbstractHSExposure(AbstractPropertyMap):
     """
     Abstract class to calculate Half-Sphere Exposure (HSE).
@@ -52,7 +110,10 @@ class _AbstractHSExposure(AbstractPropertyMap):
         hse_map={}
         hse_list=[]
         hse_keys=[]
-        for pp1 in ppl:
+        # First get the pseudo CB vectors of all residues
+        center_list=[]
+        for k in range(0, len(ppl)):
+            pp1=ppl[k]
             for i in range(0, len(pp1)):
                 if i==0:
                     r1=None
@@ -69,35 +130,37 @@ class _AbstractHSExposure(AbstractPropertyMap):
                     # Missing atoms, or i==0, or i==len(pp1)-1
                     continue
                 pcb, angle=result
-                hse_u=0
-                hse_d=0
-                ca2=r2['CA'].get_vector()
-                for pp2 in ppl:
-                    for j in range(0, len(pp2)):
-                        if pp1 is pp2 and abs(i-j)<=offset:
-                            # neighboring residues in the chain are ignored 
-                            continue
-                        ro=pp2[j]
-                        if not is_aa(ro) or not ro.has_id('CA'):
-                            continue
-                        cao=ro['CA'].get_vector()
-                        d=(cao-ca2)
-                        if d.norm()<radius:
-                            if d.angle(pcb)<(pi/2):
-                                hse_u+=1
-                            else:
-                                hse_d+=1
-                res_id=r2.get_id()
-                chain_id=r2.get_parent().get_id()
-                # Fill the 3 data structures
-                hse_map[(chain_id, res_id)]=(hse_u, hse_d, angle)
-                hse_list.append((r2, (hse_u, hse_d, angle)))
-                hse_keys.append((chain_id, res_id))
-                # Add to xtra
-                r2.xtra[hse_up_key]=hse_u
-                r2.xtra[hse_down_key]=hse_d
-                if angle_key:
-                    r2.xtra[angle_key]=angle
+                center_list.append((r2, k, i, pcb, angle))
+        # Then count the CA atoms in the upper and lower half spheres
+        # of all residues at once
+        centers=numpy.array([r2['CA'].get_coord() for r2, k, i, pcb, angle
+                             in center_list], 'd').reshape((-1, 3))
+        pcbs=numpy.array([pcb.get_array() for r2, k, i, pcb, angle 
+                          in center_list], 'd').reshape((-1, 3))
+        center_pp=numpy.array([k for r2, k, i, pcb, angle in center_list], 'l')
+        center_pos=numpy.array([i for r2, k, i, pcb, angle in center_list], 'l')
+        center_index, ca_index, d=_get_neighbor_pairs(centers, center_pp,
+            center_pos, _get_ca_arrays(ppl), radius, offset)
+        # the angle between d and pcb is smaller than pi/2
+        up=numpy.sum(d*pcbs[center_index], 1)>0
+        hse_u_array=_count(center_index[up], len(center_list))
+        hse_d_array=_count(center_index[numpy.logical_not(up)], 
+                           len(center_list))
+        for n in range(0, len(center_list)):
+            r2, k, i, pcb, angle=center_list[n]
+            hse_u=int(hse_u_array[n])
+            hse_d=int(hse_d_array[n])
+            res_id=r2.get_id()
+            chain_id=r2.get_parent().get_id()
+            # Fill the 3 data structures
+            hse_map[(chain_id, res_id)]=(hse_u, hse_d, angle)
+            hse_list.append((r2, (hse_u, hse_d, angle)))
+            hse_keys.append((chain_id, res_id))
+            # Add to xtra
+            r2.xtra[hse_up_key]=hse_u
+            r2.xtra[hse_down_key]=hse_d
+            if angle_key:
+                r2.xtra[angle_key]=angle
         AbstractPropertyMap.__init__(self, hse_map, hse_keys, hse_list)
 
     def _get_gly_cb_vector(self, residue):
@@ -277,24 +340,21 @@ class ExposureCN(AbstractPropertyMap):
         fs_map={}
         fs_list=[]
         fs_keys=[]
+        # The centers are the CA atoms themselves, count all
+        # neighbors at once
+        ca_arrays=_get_ca_arrays(ppl)
+        coords, pp_index, pos_index=ca_arrays
+        center_index, ca_index, d=_get_neighbor_pairs(coords, pp_index,
+            pos_index, ca_arrays, radius, offset)
+        fs_array=_count(center_index, len(coords))
+        n=0
         for pp1 in ppl:
             for i in range(0, len(pp1)):
-                fs=0
                 r1=pp1[i]
                 if not is_aa(r1) or not r1.has_id('CA'):
                     continue
-                ca1=r1['CA']
-                for pp2 in ppl:
-                    for j in range(0, len(pp2)):
-                        if pp1 is pp2 and abs(i-j)<=offset:
-                            continue
-                        r2=pp2[j]
-                        if not is_aa(r2) or not r2.has_id('CA'):
-                            continue
-                        ca2=r2['CA']
-                        d=(ca2-ca1)
-                        if d<radius:
-                            fs+=1
+                fs=int(fs_array[n])
+                n+=1
                 res_id=r1.get_id()
                 chain_id=r1.get_parent().get_id()
                 # Fill the 3 data structures
@@ -4,13 +4,118 @@
 # as part of this package.
 
 import os.path
+import re
 import warnings
-import Bio.PDB.mmCIF.MMCIFlex
 from UserDict import UserDict
 
+import numpy
+
 __doc__="Turn an mmCIF file into a dictionary."
 
 
+# One token on a line: a comment, a quoted value or a whitespace
+# delimited value (which may turn out to be a name, loop_ or data_).
+# A quoted value only ends at a quote followed by white space.
+_token_re=re.compile(r"""(#.*)"""
+                     r"""|('.*?')(?=[ \t\r\n]|$)"""
+                     r"""|(".*?")(?=[ \t\r\n]|$)"""
+                     r"""|([^ \t\r\n]+)""")
+
+
+class MMCIFTokenizer:
+    """
+    Split an mmCIF file into (token, value) pairs.
+
+    This is a pure Python replacement for the flex based 
+    Bio.PDB.mmCIF.MMCIFlex module, and returns the same token
+    numbers and values (quotes and semicolons are kept). All state
+    is kept in the tokenizer object, so several files can be 
+    tokenized at the same time (e.g. in different threads).
+
+    Example:
+
+    >>> tokenizer=MMCIFTokenizer(open("1FAT.cif"))
+    >>> for token, value in tokenizer:
+    ...     print token, value
+    """
+    # The token identifiers
+    NAME=1
+    LOOP=2
+    DATA=3
+    SEMICOLONS=4    
+    DOUBLEQUOTED=5
+    QUOTED=6
+    SIMPLE=7
+
+    def __init__(self, handle):
+        """
+        o handle - file handle of an mmCIF file, opened for reading
+        """
+        self._handle=handle
+        self._tokens=self._tokenize()
+
+    def __iter__(self):
+        return self._tokens
+
+    def get_token(self):
+        """Return the next (token, value) pair, or (0, "") at EOF."""
+        try:
+            return self._tokens.next()
+        except StopIteration:
+            return 0, ""
+
+    # Private
+
+    def _tokenize(self):
+        # local copies
+        NAME=self.NAME
+        LOOP=self.LOOP
+        DATA=self.DATA
+        SEMICOLONS=self.SEMICOLONS
+        DOUBLEQUOTED=self.DOUBLEQUOTED
+        QUOTED=self.QUOTED
+        SIMPLE=self.SIMPLE
+        finditer=_token_re.finditer
+        lines=iter(self._handle)
+        for line in lines:
+            if line[:1]==";":
+                # semicolon delimited value, ends at the next line
+                # starting with a semicolon
+                value_lines=[line.rstrip("\r\n")]
+                for line in lines:
+                    if line[:1]==";":
+                        break
+                    value_lines.append(line.rstrip("\r\n"))
+                else:
+                    warnings.warn("ERROR: unterminated semicolon "
+                                  "value!", RuntimeWarning)
+                    line=""
+                value_lines.append(";")
+                yield SEMICOLONS, "\n".join(value_lines)
+                # the rest of the closing line is tokenized as usual
+                line=line[1:]
+            for match in finditer(line):
+                comment, quoted, doublequoted, value=match.groups()
+                if value is not None:
+                    if value[0]=="_":
+                        yield NAME, value
+                    else:
+                        lower=value[:5].lower()
+                        if lower=="loop_" and len(value)==5:
+                            yield LOOP, value
+                        elif lower=="data_" and len(value)>5:
+                            yield DATA, value
+                        else:
+                            yield SIMPLE, value
+                elif quoted is not None:
+                    yield QUOTED, quoted
+                elif doublequoted is not None:
+                    yield DOUBLEQUOTED, doublequoted
+                else:
+                    # comment, ignore rest of line
+                    break
+
+
 class MMCIF2Dict(UserDict):
     # The token identifiers
     NAME=1
@@ -21,18 +126,39 @@ class MMCIF2Dict(UserDict):
     QUOTED=6
     SIMPLE=7
 
-    def __init__(self, filename):
+    def __init__(self, filename, categories=None):
+        """
+        o filename - name of the mmCIF file, or a file handle
+        o categories - optional list of category names (e.g. 
+        ["_atom_site", "_cell"]). If given, only the data items
+        of these categories are stored, everything else is skipped.
+        """
         # this dict will contain the name/data pairs 
         self.data={}
         # entry for garbage
         self.data[None]=[]
-        if not os.path.isfile(filename):
-            raise IOError("File not found.")
-        Bio.PDB.mmCIF.MMCIFlex.open_file(filename)
-        self._make_mmcif_dict()
-        Bio.PDB.mmCIF.MMCIFlex.close_file()
+        if categories is None:
+            self._categories=None
+        else:
+            self._categories=dict.fromkeys(categories)
+        if isinstance(filename, basestring):
+            if not os.path.isfile(filename):
+                raise IOError("File not found.")
+            handle=open(filename)
+            try:
+                self._make_mmcif_dict(MMCIFTokenizer(handle))
+            finally:
+                handle.close()
+        else:
+            self._make_mmcif_dict(MMCIFTokenizer(filename))
 
-    def _make_mmcif_dict(self): 
+    def _wanted(self, name):
+        # Return true if the data item should be stored
+        if self._categories is None:
+            return 1
+        return self._categories.has_key(name.split(".", 1)[0])
+
+    def _make_mmcif_dict(self, tokenizer): 
         # local copies
         NAME=self.NAME
         LOOP=self.LOOP
@@ -41,7 +167,8 @@ class MMCIF2Dict(UserDict):
         DOUBLEQUOTED=self.DOUBLEQUOTED
         QUOTED=self.QUOTED
         SIMPLE=self.SIMPLE
-        get_token=Bio.PDB.mmCIF.MMCIFlex.get_token
+        get_token=tokenizer.get_token
+        wanted=self._wanted
         # are we looping?
         loop_flag=0
         # list of names in loop
@@ -56,10 +183,15 @@ class MMCIF2Dict(UserDict):
         while token:
             if token==NAME:
                 if loop_flag:
+                    # Skip the loop if its category was not asked for
+                    # (a loop only contains names of one category)
+                    store_loop=wanted(value)
                     # Make lists for all the names in the loop
                     while token==NAME:
                         # create  a list for each name encountered in loop
-                        new_list=mmcif_dict[value]=[]
+                        new_list=[]
+                        if store_loop:
+                            mmcif_dict[value]=new_list
                         temp_list.append(new_list)
                         token, value=get_token()  
                         # print token, value
@@ -70,12 +202,19 @@ class MMCIF2Dict(UserDict):
                     pos=0
                     nr_fields=len(temp_list)
                     # Now fill all lists with the data
-                    while token>3:
-                        pos=data_counter%nr_fields
-                        data_counter=data_counter+1
-                        temp_list[pos].append(value)
-                        token, value=get_token()  
-                        # print token, value
+                    if store_loop:
+                        while token>3:
+                            pos=data_counter%nr_fields
+                            data_counter=data_counter+1
+                            temp_list[pos].append(value)
+                            token, value=get_token()  
+                            # print token, value
+                    else:
+                        while token>3:
+                            data_counter=data_counter+1
+                            token, value=get_token()  
+                        if data_counter:
+                            pos=(data_counter-1)%nr_fields
                     if pos!=nr_fields-1:
                         warnings.warn("ERROR: broken name-data pair "
                                       "(data missing)!", RuntimeWarning)
@@ -87,7 +226,8 @@ class MMCIF2Dict(UserDict):
                     # so next token should be the data
                     next_token, data=get_token()  
                     # print token, value
-                    mmcif_dict[value]=data
+                    if wanted(value):
+                        mmcif_dict[value]=data
                     if next_token<4:
                         warnings.warn("ERROR: broken name-data pair "
                                       "(name-non data pair)!", RuntimeWarning)
@@ -119,6 +259,98 @@ class MMCIF2Dict(UserDict):
         return self.data[key]
 
 
+# NumPy types of the numerical _atom_site columns
+ATOM_SITE_DTYPES={
+    "_atom_site.Cartn_x" : "d",
+    "_atom_site.Cartn_y" : "d",
+    "_atom_site.Cartn_z" : "d",
+    "_atom_site.occupancy" : "d",
+    "_atom_site.B_iso_or_equiv" : "d",
+    "_atom_site.id" : "i",
+    "_atom_site.pdbx_PDB_model_num" : "i"}
+
+
+def get_loop_arrays(filename, category="_atom_site", dtypes=ATOM_SITE_DTYPES):
+    """
+    Return the columns of an mmCIF loop as NumPy arrays.
+
+    Only the loop of the given category is read (the file is not 
+    read beyond it), and its values are kept in one flat list instead
+    of a list per data name. Columns with a type in dtypes are 
+    converted to that type, all other columns are returned as 
+    NumPy string arrays. Unknown (?) and inapplicable (.) values
+    in floating point columns become NaN, in other columns with a 
+    type they raise a ValueError naming the column.
+
+    Example:
+
+    >>> arrays=get_loop_arrays("1FAT.cif")
+    >>> coords=numpy.column_stack((arrays["_atom_site.Cartn_x"],
+    ...                            arrays["_atom_site.Cartn_y"],
+    ...                            arrays["_atom_site.Cartn_z"]))
+
+    o filename - name of the mmCIF file, or a file handle
+    o category - category of the loop, e.g. "_atom_site"
+    o dtypes - dictionary that maps data names to NumPy types
+    """
+    if isinstance(filename, basestring):
+        handle=open(filename)
+    else:
+        handle=filename
+    try:
+        get_token=MMCIFTokenizer(handle).get_token
+        prefix=category+"."
+        names=[]
+        values=[]
+        token, value=get_token()
+        while token:
+            if token==MMCIFTokenizer.LOOP:
+                token, value=get_token()
+                if token==MMCIFTokenizer.NAME and value.startswith(prefix):
+                    while token==MMCIFTokenizer.NAME:
+                        names.append(value)
+                        token, value=get_token()
+                    append=values.append
+                    while token>3:
+                        append(value)
+                        token, value=get_token()
+                    break
+            else:
+                token, value=get_token()
+    finally:
+        if handle is not filename:
+            handle.close()
+    if not names:
+        raise KeyError("No loop found for category %s" % category)
+    nr_fields=len(names)
+    if len(values)%nr_fields:
+        warnings.warn("ERROR: broken name-data pair "
+                      "(data missing)!", RuntimeWarning)
+    arrays={}
+    for i in range(0, nr_fields):
+        name=names[i]
+        column=numpy.array(values[i::nr_fields])
+        if dtypes.has_key(name):
+            dtype=numpy.dtype(dtypes[name])
+            missing=numpy.logical_or(column=="?", column==".")
+            if missing.any():
+                if dtype.kind!="f":
+                    raise ValueError("Column %s has unknown (?) or "
+                        "inapplicable (.) values, which can't be converted "
+                        "to %s (use a floating point type, which stores "
+                        "them as NaN)" % (name, dtype.name))
+                # not column[missing]="nan", which would be truncated
+                # if the strings in the column are shorter
+                column=numpy.where(missing, "nan", column)
+            try:
+                column=column.astype(dtype)
+            except ValueError, e:
+                raise ValueError("Can't convert column %s to %s: %s" 
+                                 % (name, dtype.name, e))
+        arrays[name]=column
+    return arrays
+
+
 if __name__=="__main__":
 
     import sys
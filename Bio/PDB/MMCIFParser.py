@@ -13,12 +13,15 @@ from MMCIF2Dict import MMCIF2Dict
 from StructureBuilder import StructureBuilder
 
 
-__doc__="mmCIF parser (partly implemented in C)." 
+__doc__="mmCIF parser." 
 
 
 class MMCIFParser:
+    # Only these categories are needed to build the structure
+    _categories=("_atom_site", "_cell", "_symmetry")
+
     def get_structure(self, structure_id, filename):
-        self._mmcif_dict=MMCIF2Dict(filename)
+        self._mmcif_dict=MMCIF2Dict(filename, self._categories)
         self._structure_builder=StructureBuilder()
         self._build_structure(structure_id)
         return self._structure_builder.get_structure()
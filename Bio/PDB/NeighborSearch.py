@@ -7,10 +7,10 @@ import numpy
 
 from Bio.KDTree import *
 from PDBExceptions import PDBException
-from Selection import unfold_entities, get_unique_parents, entity_levels, \
-     uniqueify
+from CellList import CellList
+from Selection import unfold_entities, entity_levels
 
-__doc__="Fast atom neighbor lookup using a KD tree (implemented in C++)."
+__doc__="Fast atom neighbor lookup using a KD tree (implemented in C++) or a grid."
 
 class NeighborSearch:
     """
@@ -23,13 +23,22 @@ class NeighborSearch:
     a fixed radius of each other.
 
     NeighborSearch makes use of the Bio.KDTree C++ module, so it's fast.
+    Alternatively, a grid of cells (see Bio.PDB.CellList) can be used,
+    which is also fast for data with a uniform density (like proteins)
+    and supports periodic boundary conditions.
+
+    Many query positions can be handled at once with search_batch.
     """
-    def __init__(self, atom_list, bucket_size=10):
+    def __init__(self, atom_list, bucket_size=10, cell_size=None, box=None):
         """
         o atom_list - list of atoms. This list is used in the queries.
         It can contain atoms from different structures.
         o bucket_size - bucket size of KD tree. You can play around 
         with this to optimize speed if you feel like it.
+        o cell_size - if given, a grid of cells with this edge length
+        is used instead of a KD tree. Use about the search radius.
+        o box - sequence of 3 box edge lengths for periodic boundary
+        conditions (needs cell_size), or None
         """
         self.atom_list=atom_list
         # get the coordinates
@@ -38,28 +47,63 @@ class NeighborSearch:
         self.coords=numpy.array(coord_list).astype("f")
         assert(bucket_size>1)
         assert(self.coords.shape[1]==3)
-        self.kdt=KDTree(3, bucket_size)
-        self.kdt.set_coords(self.coords)
+        # (entity list, parent index array) for each level
+        self._parent_cache={}
+        if cell_size is None:
+            if box is not None:
+                raise PDBException("Periodic boundary conditions need a cell size")
+            self.cell_list=None
+            self.kdt=KDTree(3, bucket_size)
+            self.kdt.set_coords(self.coords)
+        else:
+            self.kdt=None
+            self.cell_list=CellList(self.coords, cell_size, box)
     
     # Private
 
-    def _get_unique_parent_pairs(self, pair_list):
-        # translate a list of (entity, entity) tuples to 
-        # a list of (parent entity, parent entity) tuples,
-        # thereby removing duplicate (parent entity, parent entity)
-        # pairs.
-        # o pair_list - a list of (entity, entity) tuples
-        parent_pair_list=[]
-        for (e1, e2) in pair_list:
-            p1=e1.get_parent()
-            p2=e2.get_parent()
-            if p1==p2:
-                continue
-            elif p1<p2:
-                parent_pair_list.append((p1, p2))
-            else:
-                parent_pair_list.append((p2, p1))
-        return uniqueify(parent_pair_list)
+    def _get_parents(self, entity_list, level):
+        # Return the unique parents of the entities in entity_list,
+        # and an array with the index of each entity's parent (64 bit,
+        # see _get_unique_parent_pairs). The result is cached per level.
+        if self._parent_cache.has_key(level):
+            return self._parent_cache[level]
+        parent_list=[]
+        parent_dict={}
+        parent_index=numpy.zeros(len(entity_list), "q")
+        for i in xrange(0, len(entity_list)):
+            parent=entity_list[i].get_parent()
+            if not parent_dict.has_key(parent):
+                parent_dict[parent]=len(parent_list)
+                parent_list.append(parent)
+            parent_index[i]=parent_dict[parent]
+        self._parent_cache[level]=(parent_list, parent_index)
+        return parent_list, parent_index
+
+    def _get_unique_parent_pairs(self, entity_list, index1, index2, level):
+        # translate index pairs of entities in entity_list to
+        # unique index pairs of their parents, thereby removing 
+        # pairs with the same parent and duplicate pairs.
+        # o entity_list - list of entities
+        # o index1, index2 - index arrays of the entity pairs
+        # o level - level of the parents
+        parent_list, parent_index=self._get_parents(entity_list, level)
+        index1=parent_index[index1]
+        index2=parent_index[index2]
+        keep=(index1!=index2)
+        low=numpy.minimum(index1, index2)[keep]
+        high=numpy.maximum(index1, index2)[keep]
+        n=len(parent_list)
+        # the keys go up to n*n, so they need 64 bit integers ("l" is 
+        # 32 bit on Windows)
+        pairs=numpy.unique(low.astype("q")*n+high)
+        return parent_list, pairs//n, pairs%n
+
+    def _search_indices(self, center, radius):
+        # indices of the atoms within radius of center
+        if self.cell_list is not None:
+            return self.cell_list.search(center, radius)
+        self.kdt.search(center, radius)
+        return self.kdt.get_indices()
 
     # Public
 
@@ -78,8 +122,7 @@ class NeighborSearch:
         """
         if not level in entity_levels:
             raise PDBException("%s: Unknown level" % level)
-        self.kdt.search(center, radius)
-        indices=self.kdt.get_indices()
+        indices=self._search_indices(center, radius)
         n_atom_list=[]
         atom_list=self.atom_list
         for i in indices:
@@ -89,6 +132,28 @@ class NeighborSearch:
             return n_atom_list
         else:
             return unfold_entities(n_atom_list, level)
+
+    def search_batch(self, centers, radius):
+        """Neighbor search for many centers at once.
+
+        Return a tuple (indptr, indices) of NumPy arrays in compressed
+        sparse row layout: the atoms within radius of centers[i] are
+        the atoms in the atom list with indices 
+        indices[indptr[i]:indptr[i+1]].
+
+        o centers - Mx3 Numeric array 
+        o radius - float
+        """
+        centers=numpy.asarray(centers)
+        if len(centers.shape)!=2 or centers.shape[1]!=3:
+            raise PDBException("Expected a Mx3 NumPy array")
+        if self.cell_list is not None:
+            return self.cell_list.search_batch(centers, radius)
+        indptr, indices, radii=self.kdt.search_batch(centers, radius)
+        # sort the indices of each center
+        rows=numpy.repeat(numpy.arange(len(centers)), numpy.diff(indptr))
+        indices=indices[numpy.lexsort((indices, rows))]
+        return indptr, indices
             
     def search_all(self, radius, level="A"):
         """All neighbor search.
@@ -101,22 +166,26 @@ class NeighborSearch:
         """
         if not level in entity_levels:
             raise PDBException("%s: Unknown level" % level)
-        self.kdt.all_search(radius)
-        indices=self.kdt.all_get_indices()
-        atom_list=self.atom_list
-        atom_pair_list=[]
-        for i1, i2 in indices:
-            a1=atom_list[i1]
-            a2=atom_list[i2]
-            atom_pair_list.append((a1, a2))
-        if level=="A":
-            # return atoms
-            return atom_pair_list
-        next_level_pair_list=atom_pair_list
-        for l in ["R", "C", "M", "S"]:
-            next_level_pair_list=self._get_unique_parent_pairs(next_level_pair_list)
+        if self.cell_list is not None:
+            indices=self.cell_list.all_search(radius)
+        else:
+            self.kdt.all_search(radius)
+            indices=self.kdt.all_get_indices()
+        entity_list=self.atom_list
+        if len(indices)==0:
+            return []
+        index1=indices[:,0]
+        index2=indices[:,1]
+        for l in entity_levels:
+            if l!="A":
+                entity_list, index1, index2=self._get_unique_parent_pairs(
+                    entity_list, index1, index2, l)
             if level==l:
-                return next_level_pair_list 
+                pair_list=[]
+                for i in xrange(0, len(index1)):
+                    pair_list.append((entity_list[index1[i]],
+                                      entity_list[index2[i]]))
+                return pair_list
 
 if __name__=="__main__":
 
@@ -37,6 +37,165 @@ __doc__="Access the PDB over the internet (for example to download structures)."
 
 import urllib, re, os
 import shutil
+import ftplib, httplib, urlparse, rfc822, calendar, time, socket
+import threading, Queue
+
+
+class _FTPConnection:
+    """Reusable connection to an FTP server (PRIVATE).
+
+    Used by PDBList.retrieve_pdb_files, each worker thread keeps its
+    own connection open for all its downloads.
+    """
+    def __init__(self, host, port):
+        self.ftp=ftplib.FTP()
+        self.ftp.connect(host, port or ftplib.FTP_PORT)
+        self.ftp.login()
+        self.ftp.voidcmd("TYPE I")
+
+    def get_info(self, path):
+        """Return (size, modification time) of a remote file.
+
+        Either can be None if the server does not tell.
+        """
+        try:
+            size=self.ftp.size(path)
+        except ftplib.error_perm:
+            size=None
+        try:
+            answer=self.ftp.sendcmd("MDTM %s" % path)
+            mtime=calendar.timegm(time.strptime(answer.split()[1][:14],
+                                                "%Y%m%d%H%M%S"))
+        except (ftplib.error_perm, ValueError, IndexError):
+            mtime=None
+        return size, mtime
+
+    def retrieve(self, path, filename, offset=0):
+        """Write the remote file to filename, starting at offset.
+
+        If offset>0, the data is appended to the existing (partial)
+        local file. Returns the number of bytes written.
+        """
+        if offset:
+            handle=open(filename, "ab")
+        else:
+            handle=open(filename, "wb")
+        written=[0]
+        def write(data):
+            handle.write(data)
+            written[0]+=len(data)
+        try:
+            self.ftp.retrbinary("RETR %s" % path, write, 65536,
+                                offset or None)
+        finally:
+            handle.close()
+        return written[0]
+
+    def close(self):
+        try:
+            self.ftp.quit()
+        except Exception:
+            self.ftp.close()
+
+
+class _HTTPConnection:
+    """Reusable (keep-alive) connection to an HTTP server (PRIVATE).
+
+    Used by PDBList.retrieve_pdb_files, each worker thread keeps its
+    own connection open for all its downloads.
+    """
+    def __init__(self, host, port):
+        self.conn=httplib.HTTPConnection(host, port)
+
+    def _request(self, method, path, headers={}):
+        try:
+            self.conn.request(method, path, headers=headers)
+            return self.conn.getresponse()
+        except (httplib.HTTPException, socket.error):
+            # the server may have closed the kept-alive connection
+            self.conn.close()
+            self.conn.request(method, path, headers=headers)
+            return self.conn.getresponse()
+
+    def get_info(self, path):
+        """Return (size, modification time) of a remote file.
+
+        Either can be None if the server does not tell.
+        """
+        response=self._request("HEAD", path)
+        response.read()
+        if response.status!=200:
+            raise IOError("HTTP error %i for %s" % (response.status, path))
+        size=response.getheader("content-length")
+        if size is not None:
+            size=int(size)
+        mtime=response.getheader("last-modified")
+        if mtime is not None:
+            mtime=rfc822.parsedate_tz(mtime)
+            if mtime is not None:
+                mtime=rfc822.mktime_tz(mtime)
+        return size, mtime
+
+    def retrieve(self, path, filename, offset=0):
+        """Write the remote file to filename, starting at offset.
+
+        If offset>0 and the server supports ranges, the data is 
+        appended to the existing (partial) local file, otherwise the
+        whole file is written again. Returns the number of bytes
+        written.
+        """
+        headers={}
+        if offset:
+            headers["Range"]="bytes=%i-" % offset
+        response=self._request("GET", path, headers)
+        if response.status==206:
+            handle=open(filename, "ab")
+        elif response.status==200:
+            # no range support, start from scratch
+            handle=open(filename, "wb")
+        else:
+            response.read()
+            raise IOError("HTTP error %i for %s" % (response.status, path))
+        written=0
+        try:
+            while 1:
+                data=response.read(65536)
+                if not data:
+                    break
+                handle.write(data)
+                written+=len(data)
+        finally:
+            handle.close()
+        return written
+
+    def close(self):
+        self.conn.close()
+
+
+class _TransferError(IOError):
+    """A download ended before the whole file was received (PRIVATE)."""
+    pass
+
+
+# Errors after which a download is retried over a new connection
+_RETRY_ERRORS=(_TransferError, socket.error, EOFError, httplib.HTTPException,
+               ftplib.error_temp, ftplib.error_reply)
+
+
+def _open_connection(server):
+    # Return a new connection to the given ftp:// or http:// server
+    scheme, netloc=urlparse.urlparse(server)[:2]
+    if ":" in netloc:
+        host, port=netloc.split(":")
+        port=int(port)
+    else:
+        host, port=netloc, None
+    if scheme=="ftp":
+        return _FTPConnection(host, port)
+    elif scheme=="http":
+        return _HTTPConnection(host, port)
+    raise ValueError("Unsupported server URL %s" % server)
+
 
 class PDBList:
     """
@@ -86,6 +245,8 @@ class PDBList:
         # variables for command-line options
         self.overwrite = 0
         self.flat_tree = 0
+        # number of parallel downloads used for mirroring
+        self.num_workers = 4
 
 
     def get_status_list(self,url):
@@ -189,6 +350,34 @@ class PDBList:
 
 
 
+    def _get_remote_path(self, code, obsolete, compression):
+        # path of a structure file on the server
+        if not obsolete:
+            return ('/pub/pdb/data/structures/divided/pdb/%s/pdb%s.ent%s'
+                    % (code[1:3],code,compression))
+        else:
+            return ('/pub/pdb/data/structures/obsolete/pdb/%s/pdb%s.ent%s'
+                    % (code[1:3],code,compression))
+
+    def _get_local_dir(self, code, obsolete, pdir):
+        # in which dir to put the pdb file?
+        if pdir is None:
+            if self.flat_tree:
+                if not obsolete:
+                    path=self.local_pdb
+                else:
+                    path=self.obsolete_pdb
+            else:
+                # Put in PDB style directory tree
+                if not obsolete:
+                    path=os.path.join(self.local_pdb, code[1:3])
+                else:
+                    path=os.path.join(self.obsolete_pdb,code[1:3])
+        else:
+            # Put in specified directory
+            path=pdir
+        return path
+
     def retrieve_pdb_file(self,pdb_code, obsolete=0, compression='.gz', 
             uncompress="gunzip", pdir=None):
         """Retrieves a PDB structure file from the PDB server and
@@ -207,31 +396,10 @@ class PDBList:
         # get the structure
         code=pdb_code.lower()
         filename="pdb%s.ent%s"%(code,compression)
-        if not obsolete:
-            url=(self.pdb_server+
-                 '/pub/pdb/data/structures/divided/pdb/%s/pdb%s.ent%s'
-                 % (code[1:3],code,compression))
-        else:
-            url=(self.pdb_server+
-                 '/pub/pdb/data/structures/obsolete/pdb/%s/pdb%s.ent%s'
-                 % (code[1:3],code,compression))
+        url=self.pdb_server+self._get_remote_path(code, obsolete, compression)
             
         # in which dir to put the pdb file?
-        if pdir is None:
-            if self.flat_tree:
-                if not obsolete:
-                    path=self.local_pdb
-                else:
-                    path=self.obsolete_pdb
-            else:
-                # Put in PDB style directory tree
-                if not obsolete:
-                    path=os.path.join(self.local_pdb, code[1:3])
-                else:
-                    path=os.path.join(self.obsolete_pdb,code[1:3])
-        else:
-            # Put in specified directory
-            path=pdir
+        path=self._get_local_dir(code, obsolete, pdir)
             
         if not os.access(path,os.F_OK):
             os.makedirs(path)
@@ -254,6 +422,157 @@ class PDBList:
         os.system("%s %s" % (uncompress, filename))
 
         return final_file
+
+    def _mirror_file(self, connection, code, obsolete, compression,
+                     uncompress, pdir):
+        # Download one structure file over an open connection, used by
+        # retrieve_pdb_files. Returns a tuple (final file, number of
+        # bytes downloaded, downloaded flag).
+        remote_path=self._get_remote_path(code, obsolete, compression)
+        path=self._get_local_dir(code, obsolete, pdir)
+        if not os.access(path,os.F_OK):
+            try:
+                os.makedirs(path)
+            except OSError:
+                # another worker may have made it
+                if not os.path.isdir(path):
+                    raise
+        filename=os.path.join(path, "pdb%s.ent%s" % (code, compression))
+        partial_file=filename+".part"
+        final_file=os.path.join(path, "pdb%s.ent" % code)
+        size, mtime=connection.get_info(remote_path)
+        # skip unchanged files (the modification time of our files
+        # is set to that of the server copy)
+        if not self.overwrite and os.path.exists(final_file):
+            if mtime is None or os.path.getmtime(final_file)>=mtime:
+                return final_file, 0, 0
+        # resume an interrupted transfer, unless the file may have
+        # been revised on the server since (the partial file is
+        # modified whenever data is written to it)
+        offset=0
+        if os.path.exists(partial_file):
+            offset=os.path.getsize(partial_file)
+            if size is None or offset>size or mtime is None \
+               or mtime>os.path.getmtime(partial_file):
+                offset=0
+        written=0
+        if size is None or offset<size:
+            written=connection.retrieve(remote_path, partial_file, offset)
+        done=os.path.getsize(partial_file)
+        if size is not None and done!=size:
+            raise _TransferError("Incomplete download of %s (%i of %i bytes)"
+                          % (remote_path, done, size))
+        os.rename(partial_file, filename)
+        if os.path.exists(final_file):
+            os.remove(final_file)
+        # uncompress the file
+        os.system("%s %s" % (uncompress, filename))
+        if mtime is not None and os.path.exists(final_file):
+            os.utime(final_file, (mtime, mtime))
+        return final_file, written, 1
+
+    def _mirror_worker(self, queue, results, stats, lock, obsolete,
+                       compression, uncompress, pdir):
+        # Worker thread of retrieve_pdb_files: takes (index, PDB code)
+        # tuples from the queue until it is empty, reusing one
+        # connection to the server.
+        connection=None
+        while 1:
+            try:
+                index, code=queue.get_nowait()
+            except Queue.Empty:
+                break
+            for attempt in range(0, 3):
+                try:
+                    if connection is None:
+                        connection=_open_connection(self.pdb_server)
+                    final_file, nbytes, downloaded=self._mirror_file(
+                        connection, code, obsolete, compression, 
+                        uncompress, pdir)
+                except _RETRY_ERRORS, e:
+                    # drop the connection and try again, partial
+                    # downloads are resumed
+                    if connection is not None:
+                        connection.close()
+                        connection=None
+                    error=e
+                except Exception, e:
+                    # e.g. the file is not on the server
+                    error=e
+                    break
+                else:
+                    error=None
+                    break
+            lock.acquire()
+            try:
+                if error is not None:
+                    stats["failed"]+=1
+                    print 'error %s: %s' % (code, error)
+                elif downloaded:
+                    results[index]=final_file
+                    stats["retrieved"]+=1
+                    stats["bytes"]+=nbytes
+                    done=stats["retrieved"]+stats["skipped"]+stats["failed"]
+                    elapsed=max(time.time()-stats["start"], 1e-6)
+                    print 'retrieved %s (%i/%i, %.1f kB/s)' % (code, done,
+                        stats["total"], stats["bytes"]/1024.0/elapsed)
+                else:
+                    results[index]=final_file
+                    stats["skipped"]+=1
+            finally:
+                lock.release()
+        if connection is not None:
+            connection.close()
+
+    def retrieve_pdb_files(self, pdb_codes, obsolete=0, compression='.gz',
+            uncompress="gunzip", pdir=None, num_workers=None):
+        """Retrieves many PDB structure files using parallel downloads.
+
+        The files are stored as with retrieve_pdb_file. Each of the
+        worker threads keeps its connection to the server open. Files
+        that are already present locally and unchanged on the server
+        (judged by their modification date) are skipped, and interrupted 
+        transfers (left as .part files) are resumed, unless the server
+        copy is newer than the .part file. Progress and the download
+        rate are printed.
+
+        The server can be an ftp:// or http:// URL.
+
+        @param pdb_codes: list of PDB codes
+        @type pdb_codes: list of strings
+
+        @param num_workers: number of parallel downloads (default: the
+        num_workers attribute)
+        @type num_workers: int
+
+        @return: list of filenames (None for failed downloads)
+        @rtype: list
+        """
+        if num_workers is None:
+            num_workers=self.num_workers
+        queue=Queue.Queue()
+        for index in range(0, len(pdb_codes)):
+            queue.put((index, pdb_codes[index].lower()))
+        results=[None]*len(pdb_codes)
+        stats={"total" : len(pdb_codes), "retrieved" : 0, "skipped" : 0,
+               "failed" : 0, "bytes" : 0, "start" : time.time()}
+        lock=threading.Lock()
+        args=(queue, results, stats, lock, obsolete, compression, 
+              uncompress, pdir)
+        workers=[]
+        for i in range(0, max(1, min(num_workers, len(pdb_codes)))):
+            worker=threading.Thread(target=self._mirror_worker, args=args)
+            worker.setDaemon(1)
+            worker.start()
+            workers.append(worker)
+        for worker in workers:
+            worker.join()
+        elapsed=max(time.time()-stats["start"], 1e-6)
+        print "%i retrieved (%.1f MB, %.1f kB/s), %i unchanged, %i failed" \
+              % (stats["retrieved"], stats["bytes"]/1048576.0, 
+                 stats["bytes"]/1024.0/elapsed, stats["skipped"], 
+                 stats["failed"])
+        return results
             
 
     def update_pdb(self):
@@ -268,14 +587,8 @@ class PDBList:
         
         new, modified, obsolete = self.get_recent_changes()
         
-        for pdb_code in new+modified:
-            try:
-                #print 'retrieving %s' % pdb_code
-                self.retrieve_pdb_file(pdb_code)
-            except Exception:
-                print 'error %s\n' % pdb_code
-                # you can insert here some more log notes that
-                # something has gone wrong.            
+        # failed downloads are reported by retrieve_pdb_files
+        self.retrieve_pdb_files(new+modified)
 
         # move the obsolete files to a special folder
         for pdb_code in obsolete:
@@ -306,7 +619,7 @@ class PDBList:
         Writes a list file containing all PDB codes (optional, if listfile is given).
         """ 
         entries = self.get_all_entries()
-        for pdb_code in entries: self.retrieve_pdb_file(pdb_code)
+        self.retrieve_pdb_files(entries)
 
         # write the list
         if listfile:
@@ -319,7 +632,7 @@ class PDBList:
         Writes a list file containing all PDB codes (optional, if listfile is given).
         """ 
         entries = self.get_all_obsolete()
-        for pdb_code in entries: self.retrieve_pdb_file(pdb_code,obsolete=1)
+        self.retrieve_pdb_files(entries,obsolete=1)
 
         # write the list
         if listfile:
@@ -360,6 +673,7 @@ if __name__ == '__main__':
     Options:
        -d   A single directory will be used as <pdb_path>, not a tree.
        -o   Overwrite existing structure files.
+       -jN  Use N parallel downloads (default 4).
     """
     print doc
 
@@ -370,6 +684,12 @@ if __name__ == '__main__':
             for option in sys.argv[3:]:
                 if option == '-d': pl.flat_tree = 1
                 elif option == '-o': pl.overwrite = 1
+                elif option.startswith('-j'):
+                    try:
+                        pl.num_workers = int(option[2:])
+                    except ValueError:
+                        print "Option -j needs a number, e.g. -j8"
+                        sys.exit(1)
 
     else:
         pdb_path = os.getcwd()
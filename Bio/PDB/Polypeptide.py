@@ -5,12 +5,14 @@
 
 from types import StringType
 
+import numpy
+
 from Bio.Alphabet import generic_protein
 from Bio.Seq import Seq
 from Bio.SCOP.Raf import to_one_letter_code
 from Bio.PDB.PDBExceptions import PDBException
 from Bio.PDB.Residue import Residue, DisorderedResidue
-from Vector import calc_dihedral, calc_angle
+from Vector import calc_dihedrals, calc_angles
 
 __doc__="""
 Polypeptide related classes (construction and representation).
@@ -122,46 +124,53 @@ class Polypeptide(list):
             ca_list.append(ca)
         return ca_list
 
+    def _get_atom_coords(self, name):
+        # Nx3 array with the coordinates of the atom with the given
+        # name in each residue (NaN if the atom is missing)
+        coords=numpy.empty((len(self), 3), 'd')
+        coords.fill(numpy.nan)
+        for i in range(0, len(self)):
+            res=self[i]
+            if res.has_id(name):
+                coords[i]=res[name].get_coord()
+        return coords
+
+    def get_phi_psi_array(self):
+        """
+        Return an array with the phi/psi dihedral angles.
+
+        All angles are computed at once from coordinate arrays.
+        Missing angles (e.g. phi of the first residue, or because
+        of missing atoms) are NaN.
+
+        @return: phi and psi angles of each residue
+        @rtype: Nx2 Numeric array
+        """
+        lng=len(self)
+        n=self._get_atom_coords('N')
+        ca=self._get_atom_coords('CA')
+        c=self._get_atom_coords('C')
+        phi_psi=numpy.empty((lng, 2), 'd')
+        phi_psi.fill(numpy.nan)
+        if lng>1:
+            # No phi for residue 0!
+            phi_psi[1:,0]=calc_dihedrals(c[:-1], n[1:], ca[1:], c[1:])
+            # No psi for last residue!
+            phi_psi[:-1,1]=calc_dihedrals(n[:-1], ca[:-1], c[:-1], n[1:])
+        return phi_psi
+
     def get_phi_psi_list(self):
         """
         Return the list of phi/psi dihedral angles
         """
         ppl=[]
-        lng=len(self)
-        for i in range(0, lng):
+        phi_psi=self.get_phi_psi_array()
+        for i in range(0, len(self)):
             res=self[i]
-            try:
-                n=res['N'].get_vector()
-                ca=res['CA'].get_vector()
-                c=res['C'].get_vector()
-            except:
-                # Some atoms are missing
-                # Phi/Psi cannot be calculated for this residue
-                ppl.append((None, None))
-                res.xtra["PHI"]=None
-                res.xtra["PSI"]=None
-                continue
-            # Phi
-            if i>0:
-                rp=self[i-1]
-                try:
-                    cp=rp['C'].get_vector()
-                    phi=calc_dihedral(cp, n, ca, c)
-                except:
-                    phi=None
-            else:
-                # No phi for residue 0!
+            phi, psi=phi_psi[i]
+            if numpy.isnan(phi):
                 phi=None
-            # Psi
-            if i<(lng-1):
-                rn=self[i+1]
-                try:
-                    nn=rn['N'].get_vector()
-                    psi=calc_dihedral(n, ca, c, nn)
-                except:
-                    psi=None
-            else:
-                # No psi for last residue!
+            if numpy.isnan(psi):
                 psi=None
             ppl.append((phi, psi))
             # Add Phi/Psi to xtra dict of residue
@@ -169,40 +178,46 @@ class Polypeptide(list):
             res.xtra["PSI"]=psi
         return ppl
 
+    def get_tau_array(self):
+        """
+        Return an array of tau torsions angles for all 4 consecutive
+        Calpha atoms (NaN if a Calpha atom is missing).
+        """
+        ca=self._get_atom_coords('CA')
+        return calc_dihedrals(ca[:-3], ca[1:-2], ca[2:-1], ca[3:])
+
     def get_tau_list(self):
         """
         Return list of tau torsions angles for all 4 consecutive
         Calpha atoms.
         """
         ca_list=self.get_ca_list()
-        tau_list=[]
-        for i in range(0, len(ca_list)-3):
-            atom_list=[ca_list[i], ca_list[i+1], ca_list[i+2], ca_list[i+3]]
-            vector_list=map(lambda a: a.get_vector(), atom_list)
-            v1, v2, v3, v4=vector_list
-            tau=calc_dihedral(v1, v2, v3, v4)
-            tau_list.append(tau)
+        tau_list=list(self.get_tau_array())
+        for i in range(0, len(tau_list)):
             # Put tau in xtra dict of residue
             res=ca_list[i+2].get_parent()
-            res.xtra["TAU"]=tau
+            res.xtra["TAU"]=tau_list[i]
         return tau_list
 
+    def get_theta_array(self):
+        """
+        Return an array of theta angles for all 3 consecutive
+        Calpha atoms (NaN if a Calpha atom is missing).
+        """
+        ca=self._get_atom_coords('CA')
+        return calc_angles(ca[:-2], ca[1:-1], ca[2:])
+
     def get_theta_list(self):
         """
         Return list of theta angles for all 3 consecutive
         Calpha atoms.
         """
-        theta_list=[]
         ca_list=self.get_ca_list()
-        for i in range(0, len(ca_list)-2):
-            atom_list=[ca_list[i], ca_list[i+1], ca_list[i+2]]
-            vector_list=map(lambda a: a.get_vector(), atom_list)
-            v1, v2, v3=vector_list
-            theta=calc_angle(v1, v2, v3)
-            theta_list.append(theta)
+        theta_list=list(self.get_theta_array())
+        for i in range(0, len(theta_list)):
             # Put tau in xtra dict of residue
             res=ca_list[i+1].get_parent()
-            res.xtra["THETA"]=theta
+            res.xtra["THETA"]=theta_list[i]
         return theta_list
 
     def get_sequence(self):
@@ -10,6 +10,7 @@ import sys
 
 from Bio.PDB import *
 from AbstractPropertyMap import AbstractPropertyMap
+from CellList import CellList
 
 __doc__="""
 Calculation of residue depth (using Michel Sanner's MSMS program for the
@@ -44,6 +45,13 @@ Direct MSMS interface:
     of the atoms in a residue):
 
     rd=residue_depth(residue, surface)
+
+    For many atoms or residues at once (much faster than 
+    calling the functions above for each of them):
+
+    dist_array=min_dists(coord_array, surface)
+
+    rd_array, ca_rd_array=residue_depths(residue_list, surface)
 """
 
 def _read_vertex_array(filename):
@@ -97,8 +105,103 @@ def min_dist(coord, surface):
     and surface.
     """
     d=surface-coord
-    d2=sum(d*d, 1)
-    return numpy.sqrt(min(d2))
+    d2=numpy.sum(d*d, 1)
+    return numpy.sqrt(numpy.min(d2))
+
+def min_dists(coords, surface, cell_size=2.0, chunk=1000):
+    """
+    Return the minimum distances between many coords
+    and the surface, as an array.
+
+    The surface vertices are put in a grid (see L{CellList}).
+    An upper bound of the distance of each coord is first found 
+    using a sample of the vertices, then each coord is only 
+    compared with the vertices within that distance.
+
+    @param coords: coordinates
+    @type coords: Nx3 Numeric array
+
+    @param surface: surface vertices
+    @type surface: Mx3 Numeric array
+
+    @param cell_size: edge length of the grid cells
+    @type cell_size: float
+
+    @param chunk: number of coords that are handled at once
+    @type chunk: int
+    """
+    coords=numpy.asarray(coords, 'd').reshape((-1, 3))
+    surface=numpy.asarray(surface, 'd')
+    dists=numpy.empty(len(coords), 'd')
+    dists.fill(numpy.inf)
+    if len(coords)==0 or len(surface)==0:
+        return dists
+    # Upper bounds from every step-th vertex (growing the search
+    # radius until all coords are done)
+    step=max(1, len(surface)//1000)
+    sample=surface[::step]
+    bounds=numpy.empty(len(coords), 'd')
+    bounds.fill(numpy.inf)
+    todo=numpy.arange(len(coords))
+    radius=4*cell_size
+    while len(todo):
+        cell_list=CellList(sample, radius)
+        bounds[todo]=cell_list.nearest(coords[todo], radius)[0]
+        todo=todo[numpy.isinf(bounds[todo])]
+        radius=radius*2
+    if step==1:
+        return bounds
+    # Exact distances, grouping the coords by upper bound
+    cell_list=CellList(surface, cell_size)
+    group=numpy.ceil(bounds/cell_size).astype('l')
+    order=numpy.argsort(group, kind="mergesort")
+    group=group[order]
+    starts=numpy.nonzero(numpy.concatenate(([1], group[1:]!=group[:-1])))[0]
+    ends=numpy.concatenate((starts[1:], [len(group)]))
+    for start, end in zip(starts, ends):
+        radius=group[start]*cell_size
+        for i in range(start, end, chunk):
+            index=order[i:min(i+chunk, end)]
+            dists[index]=cell_list.nearest(coords[index], radius)[0]
+    return dists
+
+def residue_depths(residue_list, surface):
+    """
+    Return the residue depths and CA depths of a list of residues
+    as two arrays. The CA depth is NaN for residues without CA atom.
+
+    All atoms are handled in one call to min_dists.
+    """
+    coord_list=[]
+    index_list=[]
+    ca_index=numpy.zeros(len(residue_list), 'l')
+    ca_index.fill(-1)
+    for i in range(0, len(residue_list)):
+        residue=residue_list[i]
+        for atom in residue.get_unpacked_list():
+            coord_list.append(atom.get_coord())
+            index_list.append(i)
+        if residue.has_id("CA"):
+            ca_index[i]=len(coord_list)
+            coord_list.append(residue["CA"].get_coord())
+            index_list.append(-1)
+    dists=min_dists(numpy.array(coord_list, 'd'), surface)
+    index=numpy.array(index_list, 'l')
+    atom_dists=dists[index>=0]
+    index=index[index>=0]
+    # average atom depth per residue
+    sums=numpy.zeros(len(residue_list), 'd')
+    counts=numpy.zeros(len(residue_list), 'd')
+    if len(index):
+        n=index[-1]+1
+        sums[:n]=numpy.bincount(index, atom_dists)
+        counts[:n]=numpy.bincount(index)
+    rd=sums/counts
+    ca_rd=numpy.empty(len(residue_list), 'd')
+    ca_rd.fill(numpy.nan)
+    has_ca=ca_index>=0
+    ca_rd[has_ca]=dists[ca_index[has_ca]]
+    return rd, ca_rd
 
 def residue_depth(residue, surface):
     """
@@ -132,12 +235,15 @@ class ResidueDepth(AbstractPropertyMap):
         residue_list=Selection.unfold_entities(model, 'R')
         # make surface from PDB file
         surface=get_surface(pdb_file)
-        # calculate rdepth for each residue
-        for residue in residue_list:
-            if not is_aa(residue):
-                continue
-            rd=residue_depth(residue, surface)
-            ca_rd=ca_depth(residue, surface)
+        residue_list=[residue for residue in residue_list if is_aa(residue)]
+        # calculate rdepth for all residues at once
+        rd_array, ca_rd_array=residue_depths(residue_list, surface)
+        for i in range(0, len(residue_list)):
+            residue=residue_list[i]
+            rd=rd_array[i]
+            ca_rd=ca_rd_array[i]
+            if numpy.isnan(ca_rd):
+                ca_rd=None
             # Get the key
             res_id=residue.get_id()
             chain_id=residue.get_parent().get_id()
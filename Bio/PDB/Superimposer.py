@@ -31,11 +31,10 @@ class Superimposer:
         if not (len(fixed)==len(moving)):
             raise PDBException("Fixed and moving atom lists differ in size")
         l=len(fixed)
-        fixed_coord=numpy.zeros((l, 3))
-        moving_coord=numpy.zeros((l, 3))
-        for i in range(0, len(fixed)):
-            fixed_coord[i]=fixed[i].get_coord()
-            moving_coord[i]=moving[i].get_coord()
+        fixed_coord=numpy.array([a.get_coord() for a in fixed], "d")
+        moving_coord=numpy.array([a.get_coord() for a in moving], "d")
+        fixed_coord=fixed_coord.reshape((l, 3))
+        moving_coord=moving_coord.reshape((l, 3))
         sup=SVDSuperimposer()
         sup.set(fixed_coord, moving_coord)
         sup.run()
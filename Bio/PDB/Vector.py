@@ -196,6 +196,65 @@ def calc_dihedral(v1, v2, v3, v4):
         pass
     return angle
 
+def _norm_rows(a):
+    # length of each row of a Nx3 array
+    return numpy.sqrt(numpy.sum(a*a, 1))
+
+def _angle_rows(a, b):
+    # angle between the rows of two Nx3 arrays
+    c=numpy.sum(a*b, 1)/(_norm_rows(a)*_norm_rows(b))
+    # Take care of roundoff errors
+    return numpy.arccos(numpy.clip(c, -1, 1))
+
+def calc_angles(a1, a2, a3):
+    """
+    Calculate the angles for many triplets of connected points at
+    once. This is the array version of calc_angle.
+
+    @param a1, a2, a3: coordinates of the points, the angle for row i
+    is defined by a1[i], a2[i] and a3[i] 
+    @type a1, a2, a3: Nx3 Numeric arrays
+
+    @return: angles (NaN if coordinates are NaN)
+    @rtype: N Numeric array
+    """
+    a1=numpy.asarray(a1, 'd')
+    a2=numpy.asarray(a2, 'd')
+    a3=numpy.asarray(a3, 'd')
+    return _angle_rows(a1-a2, a3-a2)
+
+def calc_dihedrals(a1, a2, a3, a4):
+    """
+    Calculate the dihedral angles for many quadruplets of connected
+    points at once. This is the array version of calc_dihedral, the
+    angles are in ]-pi, pi].
+
+    @param a1, a2, a3, a4: coordinates of the points, the dihedral 
+    angle for row i is defined by a1[i], a2[i], a3[i] and a4[i]
+    @type a1, a2, a3, a4: Nx3 Numeric arrays
+
+    @return: dihedral angles (NaN if coordinates are NaN)
+    @rtype: N Numeric array
+    """
+    a1=numpy.asarray(a1, 'd')
+    a2=numpy.asarray(a2, 'd')
+    a3=numpy.asarray(a3, 'd')
+    a4=numpy.asarray(a4, 'd')
+    ab=a1-a2
+    cb=a3-a2
+    db=a4-a3
+    u=numpy.cross(ab, cb)
+    v=numpy.cross(db, cb)
+    w=numpy.cross(u, v)
+    old=numpy.seterr(invalid="ignore")
+    try:
+        angle=_angle_rows(u, v)
+        # Determine sign of angle
+        sign=numpy.where(numpy.sum(cb*w, 1)<0, -1.0, 1.0)
+    finally:
+        numpy.seterr(**old)
+    return sign*angle
+
 class Vector:
     "3D vector"
 
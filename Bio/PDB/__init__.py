@@ -43,7 +43,8 @@ import Selection
 from Superimposer import Superimposer
 
 # 3D vector class
-from Vector import Vector, calc_angle, calc_dihedral, refmat, rotmat, rotaxis,\
+from Vector import Vector, calc_angle, calc_dihedral, calc_angles, \
+        calc_dihedrals, refmat, rotmat, rotaxis,\
         vector_to_axis, m2rotaxis, rotaxis2m
 
 # Alignment module
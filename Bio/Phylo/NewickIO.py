@@ -11,6 +11,8 @@ See: U{ http://evolution.genetics.washington.edu/phylip/newick_doc.html }
 """
 __docformat__ = "epytext en"
 
+import re
+import gc
 from cStringIO import StringIO
 
 from Bio.Phylo import Newick
@@ -19,6 +21,11 @@ from Bio.Phylo import Newick
 NODECOMMENT_START = '[&'
 NODECOMMENT_END = ']'
 
+# Newick tokens: a comment, a quoted label, a delimiter, or the text of a
+# node's tag (name, support and branch length). A lone '[' or quote starts a
+# comment or label which is continued on the next line.
+_tokenizer = re.compile(r"\[[^\]]*\]|'[^']*'|[(),;]|[^(),;\[\]']+|[\[\]']")
+
 
 class NewickError(Exception):
     """Exception raised when Newick object construction cannot continue."""
@@ -61,52 +68,103 @@ class Parser(object):
         return cls(handle)
 
     def parse(self, values_are_support=False, rooted=False):
-        """Parse the text stream this object was initialized with."""
+        """Parse the text stream this object was initialized with.
+
+        The text is read line by line and split into tokens with a regular
+        expression, and each tree is built with a stack of open clades as
+        soon as its terminating ';' is read. So very large or deep trees
+        don't hit the recursion limit, and the trees of a multi-tree file
+        are returned one at a time.
+        """
         self.values_are_support = values_are_support
         self.rooted = rooted
-        buf = ''
+        # Children of the currently open parentheses, innermost last
+        self._stack = []
+        # Children of the clade just closed by ')', waiting for its tag
+        self._children = None
+        # Pieces of the tag (name, values, comment) of the current clade
+        self._tag = []
+        # Text of a comment or quoted label continued on the next line
+        self._carry = ''
         for line in self.handle:
-            buf += line.rstrip()
-            if buf.endswith(';'):
-                yield self._parse_tree(buf)
-                buf = ''
-        if buf:
+            for tree in self._parse_line(self._carry + line.rstrip()):
+                yield tree
+        if self._carry.startswith(NODECOMMENT_START):
+            raise NewickError('Error in tree description: '
+                              'Found %s without matching %s'
+                              % (NODECOMMENT_START, NODECOMMENT_END))
+        elif self._carry:
+            raise NewickError("Unterminated comment or quoted label: "
+                              + self._carry)
+        if self._stack:
+            raise NewickError("Parentheses do not match in last tree")
+        if self._children is not None or ''.join(self._tag).strip():
             # Last tree is missing a terminal ';' character -- that's OK
-            yield self._parse_tree(buf)
-
-    def _parse_tree(self, text):
-        """Parses the text representation into an Tree object."""
+            yield self._make_tree(self._tag, self._children)
+
+    def _parse_line(self, text):
+        """Read the tokens in a line of text, return the trees completed."""
+        # A large tree is many new objects, which would otherwise start the
+        # garbage collector again and again (taking longer as the tree grows,
+        # for nothing as there is no garbage to find in it).
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            trees = []
+            stack = self._stack
+            children = self._children
+            tag = self._tag
+            self._carry = ''
+            for match in _tokenizer.finditer(text):
+                token = match.group()
+                if token == ',':
+                    if not stack:
+                        raise NewickError("Comma outside parentheses: " + text)
+                    stack[-1].append(self._make_clade(tag, children))
+                    tag = []
+                    children = None
+                elif token == '(':
+                    if children is not None or ''.join(tag).strip():
+                        raise NewickError("Unexpected '(' after a node: "
+                                          + text)
+                    stack.append([])
+                elif token == ')':
+                    if not stack:
+                        raise NewickError("Parentheses do not match in "
+                                          "tree: " + text)
+                    stack[-1].append(self._make_clade(tag, children))
+                    tag = []
+                    children = stack.pop()
+                elif token == ';':
+                    if stack:
+                        raise NewickError("Parentheses do not match in "
+                                          "tree: " + text)
+                    trees.append(self._make_tree(tag, children))
+                    tag = []
+                    children = None
+                elif token in ('[', "'"):
+                    # Comment or quoted label ending on a later line
+                    self._carry = text[match.start():]
+                    break
+                else:
+                    tag.append(token)
+            self._children = children
+            self._tag = tag
+            return trees
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def _make_tree(self, tag, children):
+        """Make a tree from the root's tag pieces and children."""
         # XXX what global info do we have here? Any? Use **kwargs?
-        return Newick.Tree(root=self._parse_subtree(text))
-
-    def _parse_subtree(self, text):
-        """Parse (a,b,c...)[[[xx]:]yy] into subcomponents, recursively."""
-        text = text.strip().rstrip(';')
-        if text.count('(')!=text.count(')'):
-            raise NewickError("Parentheses do not match in (sub)tree: " + text)
-        # Text is now "(...)..." (balanced parens) or "..." (leaf node)
-        if text.count('(') == 0:
-            # Leaf/terminal node -- recursion stops here
-            return self._parse_tag(text)
-        # Handle one layer of the nested subtree
-        # XXX what if there's a paren in a comment or other string?
-        close_posn = text.rfind(')')
-        subtrees = []
-        # Locate subtrees by counting nesting levels of parens
-        plevel = 0
-        prev = 1
-        for posn in range(1, close_posn):
-            if text[posn] == '(':
-                plevel += 1
-            elif text[posn] == ')':
-                plevel -= 1
-            elif text[posn] == ',' and plevel == 0:
-                subtrees.append(text[prev:posn])
-                prev = posn + 1
-        subtrees.append(text[prev:close_posn])
-        # Construct a new clade from trailing text, then attach subclades
-        clade = self._parse_tag(text[close_posn+1:])
-        clade.clades = [self._parse_subtree(st) for st in subtrees]
+        return Newick.Tree(root=self._make_clade(tag, children))
+
+    def _make_clade(self, tag, children):
+        """Make a clade from its tag pieces and its children (or None)."""
+        clade = self._parse_tag(''.join(tag))
+        if children is not None:
+            clade.clades = children
         return clade
 
     def _parse_tag(self, text):
@@ -130,13 +188,15 @@ class Parser(object):
         # Extract name (taxon), and optionally support, branch length
         # Float values are support and branch length, the string is name/taxon
         values = []
-        for part in (t.strip() for t in text.split(':')):
-            if part:
-                try:
-                    values.append(float(part))
-                except ValueError:
-                    assert clade.name is None, "Two string taxonomies?"
-                    clade.name = part
+        for part in text.split(':'):
+            part = part.strip()
+            if not part:
+                continue
+            try:
+                values.append(float(part))
+            except ValueError:
+                assert clade.name is None, "Two string taxonomies?"
+                clade.name = part
         if len(values) == 1:
             # Real branch length, or support as branch length
             if self.values_are_support:
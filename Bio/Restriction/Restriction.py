@@ -79,7 +79,14 @@
         """
 
 import re
+import array
 import itertools
+import threading
+try:
+    import multiprocessing
+except ImportError:
+    # Python 2.5 and older
+    multiprocessing = None
 
 from Bio.Seq import Seq, MutableSeq
 from Bio.Alphabet import IUPAC
@@ -229,6 +236,199 @@ class FormattedSeq(object):
         return self.klass(self.data[i], self.alphabet)
     
 
+#   Groups of the compsite of an enzyme, and the bases of a site pattern.
+_compsite_groups = re.compile(r'\(\?P<(\w+)>([^()]*)\)')
+_site_atoms = re.compile(r'\[[A-Z]+\]|[A-Z.]')
+
+def _site_pattern(enzyme):
+    """_site_pattern(enzyme) -> str.
+
+    for internal use only.
+
+    the pattern of enzyme.compsite, without compiling it if it has not been
+    used yet (see RestrictionType._compsite)."""
+    compiled = enzyme.__dict__.get('_compiled_site')
+    if compiled is not None:
+        return compiled.pattern
+    return enzyme.__dict__['compsite']
+
+class SiteScanner(object):
+    """SiteScanner(enzymes) -> new SiteScanner.
+
+    Find the recognition sites of many enzymes in one pass over a sequence.
+
+    Searching with each enzyme in turn means one full pass of a regular
+    expression over the sequence per enzyme. Instead, the sites of all the
+    enzymes (both strands) are merged into a single trie, written as one
+    regular expression which is run once over the sequence to find every
+    position where at least one site starts. At each of these positions the
+    next few bases select the sites which can start there, and only these
+    are checked.
+
+    The sites found are the same as with each enzyme's own compsite
+    pattern (and FormattedSeq.finditer), including sites spanning the
+    origin of circular sequences."""
+
+    #   Number of bases used to select the candidate sites at a position.
+    key_size = 5
+
+    def __init__(self, enzymes):
+        """SiteScanner(enzymes) -> new SiteScanner.
+
+        enzymes is an iterable of RestrictionType (e.g. a RestrictionBatch)."""
+        self.enzymes = list(enzymes)
+        #   enzyme -> (forward pattern, reverse pattern) for the enzymes
+        #   in the trie, the others are searched with their compsite.
+        self.strands = {}
+        self.others = []
+        patterns = {}
+        for enzyme in self.enzymes:
+            strands = self._strands(enzyme)
+            if strands:
+                self.strands[enzyme] = strands
+                for pattern in strands:
+                    patterns[pattern] = _site_atoms.findall(pattern)
+            else:
+                self.others.append(enzyme)
+        self.patterns = patterns.keys()
+        self.patterns.sort()
+        self.sizes = [len(patterns[p]) for p in self.patterns]
+        self.compiled = [re.compile(p) for p in self.patterns]
+        self.prefixes = [re.compile(''.join(patterns[p][:self.key_size]))
+                         for p in self.patterns]
+        self.maxsize = max([e.size for e in self.enzymes] + [1])
+        trie = {}
+        for pattern in self.patterns:
+            node = trie
+            for atom in patterns[pattern]:
+                node = node.setdefault(atom, {})
+            node[None] = pattern
+        if trie:
+            self.finder = re.compile('(?=%s)' % self._trie_pattern(trie))
+        else:
+            self.finder = None
+        #   key (the bases at a position) -> (index of the sites matching
+        #   the key in full, index of the sites to check)
+        self._table = {}
+
+    def _strands(self, enzyme):
+        """SS._strands(enzyme) -> tuple or None.
+
+        for internal use only.
+
+        return the patterns of the site on each strand (forward first), or
+        None if the enzyme's compsite can not be handled by the scanner."""
+        found = _compsite_groups.findall(_site_pattern(enzyme))
+        if len(found) != 2 or found[0][0] != str(enzyme) \
+        or found[1][0] != str(enzyme) + '_as':
+            return None
+        strands = found[0][1], found[1][1]
+        for pattern in strands:
+            atoms = _site_atoms.findall(pattern)
+            if ''.join(atoms) != pattern or len(atoms) != enzyme.size:
+                return None
+        return strands
+
+    def _trie_pattern(self, node):
+        """SS._trie_pattern(node) -> str.
+
+        for internal use only.
+
+        regular expression for the sites in the trie below node."""
+        branches = [atom + self._trie_pattern(child)
+                    for atom, child in node.iteritems() if atom is not None]
+        branches.sort()
+        if None in node:
+            branches.append('')
+        if len(branches) == 1:
+            return branches[0]
+        return '(?:%s)' % '|'.join(branches)
+
+    def _candidates(self, key):
+        """SS._candidates(key) -> tuple.
+
+        for internal use only.
+
+        return the index of the sites matched in full by key, and the index
+        of the longer sites whose beginning matches key."""
+        full = []
+        check = []
+        for index, prefix in enumerate(self.prefixes):
+            if prefix.match(key):
+                if self.sizes[index] <= self.key_size:
+                    full.append(index)
+                else:
+                    check.append(index)
+        return full, check
+
+    def positions(self, data):
+        """SS.positions(data) -> list.
+
+        return a list with, for each site pattern, the (sorted) positions
+        in data where the pattern matches, overlapping matches included."""
+        found = [[] for pattern in self.patterns]
+        if self.finder is None:
+            return found
+        table = self._table
+        compiled = self.compiled
+        size = self.key_size
+        for match in self.finder.finditer(data):
+            start = match.start()
+            key = data[start:start+size]
+            try:
+                full, check = table[key]
+            except KeyError:
+                full, check = table[key] = self._candidates(key)
+            for index in full:
+                found[index].append(start)
+            for index in check:
+                if compiled[index].match(data, start):
+                    found[index].append(start)
+        return found
+
+    def scan(self, dna):
+        """SS.scan(dna) -> dict.
+
+        dna is a FormattedSeq.
+
+        return a dictionary, for each enzyme a list of the (location,
+        forward) tuples of its sites, as used by RE._search_sites.
+        location is the position of the start of the site and forward is
+        True if the site is on the forward strand."""
+        length = len(dna)
+        if dna.is_linear():
+            data = dna.data
+        else:
+            data = dna.data + dna.data[1:self.maxsize]
+        found = dict(zip(self.patterns, self.positions(data)))
+        sites = {}
+        for enzyme, (forward, reverse) in self.strands.iteritems():
+            if dna.is_linear():
+                last = length - enzyme.size + 1
+            else:
+                last = length
+            #   strand is 0 for the forward strand, 1 for the reverse, so
+            #   on the same position the forward site comes first (like
+            #   the alternatives of the compsite).
+            candidates = [(p, 0) for p in found[forward]]
+            if forward != reverse:
+                candidates += [(p, 1) for p in found[reverse]]
+                candidates.sort()
+            #   Like re.finditer, only keep the non overlapping sites.
+            result = []
+            end = 0
+            for start, strand in candidates:
+                if start >= end and start <= last:
+                    result.append((start, not strand))
+                    end = start + enzyme.size
+            sites[enzyme] = result
+        for enzyme in self.others:
+            s = str(enzyme)
+            sites[enzyme] = [(start, group(s) is not None) for start, group
+                             in dna.finditer(enzyme.compsite, enzyme.size)]
+        return sites
+
+
 class RestrictionType(type):
     """RestrictionType. Type from which derives all enzyme classes.
 
@@ -245,12 +445,45 @@ class RestrictionType(type):
             raise ValueError("Problem with hyphen in %s as enzyme name" \
                              % repr(name))
         super(RestrictionType, cls).__init__(cls, name, bases, dct)
-        try :
-            cls.compsite = re.compile(cls.compsite)
-        except Exception, err :
-            raise ValueError("Problem with regular expression, re.compiled(%s)" \
-                             % repr(cls.compsite))
+        #
+        #   The regular expression of the site is only compiled when it is
+        #   first used (see _compsite below). Compiling the regular
+        #   expressions of all the enzymes was most of the time needed to
+        #   import the module.
+        #
         
+    def _compsite(cls):
+        """RE.compsite -> compiled regular expression of the site.
+
+        for internal use only.
+
+        compile the site pattern given when the class was created the first
+        time it is used."""
+        try:
+            return cls.__dict__['_compiled_site']
+        except KeyError:
+            pass
+        try:
+            pattern = cls.__dict__['compsite']
+        except KeyError:
+            raise AttributeError("%s has no attribute 'compsite'" % cls)
+        RestrictionType._set_compsite(cls, pattern)
+        return cls.__dict__['_compiled_site']
+
+    def _set_compsite(cls, pattern):
+        """RE.compsite = pattern (a string or a compiled regular expression).
+
+        for internal use only."""
+        if isinstance(pattern, basestring):
+            try :
+                pattern = re.compile(pattern)
+            except Exception, err :
+                raise ValueError("Problem with regular expression, "\
+                                 "re.compiled(%s)" % repr(pattern))
+        type.__setattr__(cls, '_compiled_site', pattern)
+
+    compsite = property(_compsite, _set_compsite)
+
     def __add__(cls, other):
         """RE.__add__(other) -> RestrictionBatch().
 
@@ -450,12 +683,13 @@ class AbstractCut(RestrictionType):
         #   the batch instead of being tested by each enzyme single.
         #   see RestrictionBatch.search() for example.
         #
-        if isinstance(dna, FormattedSeq):
-            cls.dna = dna
-            return cls._search()
-        else :  
-            cls.dna = FormattedSeq(dna, linear)
-            return cls._search()
+        #   The sequence and the results are passed around rather than kept
+        #   on the enzyme class, so several threads can search at once with
+        #   the same enzyme.
+        #
+        if not isinstance(dna, FormattedSeq):
+            dna = FormattedSeq(dna, linear)
+        return cls._search(dna)
     search = classmethod(search)
 
     def all_suppliers(self):
@@ -807,19 +1041,30 @@ class Palindromic(AbstractCut):
 
     Internal use only. Not meant to be instantiated."""
 
-    def _search(self):
-        """RE._search() -> list.
+    def _search(self, dna):
+        """RE._search(dna) -> list.
 
         for internal use only.
 
         implement the search method for palindromic and non palindromic enzyme.
+        dna is a FormattedSeq.
         """
-        siteloc = self.dna.finditer(self.compsite,self.size)
-        self.results = [r for s,g in siteloc for r in self._modify(s)]
-        if self.results : self._drop()
-        return self.results
+        siteloc = dna.finditer(self.compsite,self.size)
+        return self._search_sites(dna, [(s, True) for s, g in siteloc])
     _search = classmethod(_search)
 
+    def _search_sites(self, dna, siteloc):
+        """RE._search_sites(dna, siteloc) -> list.
+
+        for internal use only.
+
+        return the cuts for the sites found in dna (a FormattedSeq). siteloc
+        is a list of (location, forward) tuples (see SiteScanner.scan)."""
+        results = [r for s,f in siteloc for r in self._modify(s)]
+        if results : results = self._drop(dna, results)
+        return results
+    _search_sites = classmethod(_search_sites)
+
     def is_palindromic(self):
         """RE.is_palindromic() -> bool.
 
@@ -836,30 +1081,42 @@ class NonPalindromic(AbstractCut):
 
     Internal use only. Not meant to be instantiated."""
 
-    def _search(self):
-        """RE._search() -> list.
+    def _search(self, dna):
+        """RE._search(dna) -> list.
 
         for internal use only.
 
         implement the search method for palindromic and non palindromic enzyme.
+        dna is a FormattedSeq.
         """
-        iterator = self.dna.finditer(self.compsite, self.size)
-        self.results = []
+        iterator = dna.finditer(self.compsite, self.size)
+        s = str(self)
+        return self._search_sites(dna, [(start, group(s) is not None)
+                                        for start, group in iterator])
+    _search = classmethod(_search)
+
+    def _search_sites(self, dna, siteloc):
+        """RE._search_sites(dna, siteloc) -> list.
+
+        for internal use only.
+
+        return the cuts for the sites found in dna (a FormattedSeq). siteloc
+        is a list of (location, forward) tuples (see SiteScanner.scan)."""
+        results = []
         modif = self._modify
         revmodif = self._rev_modify
-        s = str(self)
-        self.on_minus = []
-        for start, group in iterator:
-            if group(s):
-                self.results += [r for r in modif(start)]
+        on_minus = []
+        for start, forward in siteloc:
+            if forward:
+                results += [r for r in modif(start)]
             else:
-                self.on_minus += [r for r in revmodif(start)]
-        self.results += self.on_minus   
-        if self.results:
-            self.results.sort()
-            self._drop()
-        return self.results
-    _search = classmethod(_search)
+                on_minus += [r for r in revmodif(start)]
+        results += on_minus   
+        if results:
+            results.sort()
+            results = self._drop(dna, results)
+        return results
+    _search_sites = classmethod(_search_sites)
 
     def is_palindromic(self):
         """RE.is_palindromic() -> bool.
@@ -970,8 +1227,8 @@ class Blunt(AbstractCut):
         
         if linear is False, the sequence is considered to be circular and the
         output will be modified accordingly."""
-        r = self.search(dna, linear)
-        d = self.dna
+        d = FormattedSeq(dna, linear)
+        r = self.search(d)
         if not r : return d[1:],
         fragments = []
         length = len(r)-1
@@ -1088,8 +1345,8 @@ class Ov5(AbstractCut):
         
         if linear is False, the sequence is considered to be circular and the
         output will be modified accordingly."""
-        r = self.search(dna, linear)
-        d = self.dna
+        d = FormattedSeq(dna, linear)
+        r = self.search(d)
         if not r : return d[1:],
         length = len(r)-1
         fragments = []
@@ -1207,8 +1464,8 @@ class Ov3(AbstractCut):
         
         if linear is False, the sequence is considered to be circular and the
         output will be modified accordingly."""
-        r = self.search(dna, linear)
-        d = self.dna
+        d = FormattedSeq(dna, linear)
+        r = self.search(d)
         if not r : return d[1:],    
         fragments = []
         length = len(r)-1
@@ -1322,8 +1579,8 @@ class Defined(AbstractCut):
     
     Internal use only. Not meant to be instantiated."""
     
-    def _drop(self):
-        """RE._drop() -> list.
+    def _drop(self, dna, results):
+        """RE._drop(dna, results) -> list.
 
         for internal use only.
 
@@ -1337,24 +1594,24 @@ class Defined(AbstractCut):
         #   For circular sequence, we modify the result rather than _drop it
         #   since the site is in the sequence.
         # 
-        length = len(self.dna)
+        length = len(dna)
         drop = itertools.dropwhile
         take = itertools.takewhile
-        if self.dna.is_linear():
-            self.results = [x for x in drop(lambda x:x<1, self.results)]
-            self.results = [x for x in take(lambda x:x<length, self.results)]
+        if dna.is_linear():
+            results = [x for x in drop(lambda x:x<1, results)]
+            results = [x for x in take(lambda x:x<length, results)]
         else:
-            for index, location in enumerate(self.results):
+            for index, location in enumerate(results):
                 if location < 1:
-                    self.results[index] += length
+                    results[index] += length
                 else:
                     break
-            for index, location in enumerate(self.results[::-1]):
+            for index, location in enumerate(results[::-1]):
                 if location > length:
-                    self.results[-(index+1)] -= length
+                    results[-(index+1)] -= length
                 else:
                     break
-        return
+        return results
     _drop = classmethod(_drop)  
     
     def is_defined(self):
@@ -1457,31 +1714,31 @@ class Ambiguous(AbstractCut):
     
     Internal use only. Not meant to be instantiated."""
     
-    def _drop(self):
-        """RE._drop() -> list.
+    def _drop(self, dna, results):
+        """RE._drop(dna, results) -> list.
 
         for internal use only.
 
         drop the site that are situated outside the sequence in linear sequence.
         modify the index for site in circular sequences."""
-        length = len(self.dna)
+        length = len(dna)
         drop = itertools.dropwhile
         take = itertools.takewhile
-        if self.dna.is_linear():
-            self.results = [x for x in drop(lambda x : x < 1, self.results)]
-            self.results = [x for x in take(lambda x : x <length, self.results)]
+        if dna.is_linear():
+            results = [x for x in drop(lambda x : x < 1, results)]
+            results = [x for x in take(lambda x : x <length, results)]
         else:
-            for index, location in enumerate(self.results):
+            for index, location in enumerate(results):
                 if location < 1:
-                    self.results[index] += length
+                    results[index] += length
                 else:
                     break
-            for index, location in enumerate(self.results[::-1]):
+            for index, location in enumerate(results[::-1]):
                 if location > length:
-                    self.results[-(index+1)] -= length
+                    results[-(index+1)] -= length
                 else:
                     break
-        return 
+        return results
     _drop = classmethod(_drop)  
     
     def is_defined(self):
@@ -1622,28 +1879,28 @@ class NotDefined(AbstractCut):
     
     Internal use only. Not meant to be instantiated."""
     
-    def _drop(self):
-        """RE._drop() -> list.
+    def _drop(self, dna, results):
+        """RE._drop(dna, results) -> list.
 
         for internal use only.
 
         drop the site that are situated outside the sequence in linear sequence.
         modify the index for site in circular sequences."""
-        if self.dna.is_linear():
-            return
+        if dna.is_linear():
+            return results
         else:
-            length = len(self.dna)
-            for index, location in enumerate(self.results):
+            length = len(dna)
+            for index, location in enumerate(results):
                 if location < 1:
-                    self.results[index] += length
+                    results[index] += length
                 else:
                     break
-            for index, location in enumerate(self.results[:-1]):
+            for index, location in enumerate(results[:-1]):
                 if location > length:
-                    self.results[-(index+1)] -= length
+                    results[-(index+1)] -= length
                 else:
                     break
-        return        
+        return results
     _drop = classmethod(_drop)  
     
     def is_defined(self):
@@ -1802,6 +2059,77 @@ class Not_available(AbstractCut):
 ###############################################################################
 
 
+def _formatted(dna, linear):
+    """_formatted(dna, linear) -> FormattedSeq.
+
+    for internal use only.
+
+    dna is a Seq, a MutableSeq or a FormattedSeq (returned unchanged)."""
+    if isinstance(dna, FormattedSeq):
+        return dna
+    return FormattedSeq(dna, linear)
+
+def _init_worker(names):
+    """_init_worker(names).
+
+    for internal use only.
+
+    set up the RestrictionBatch used by _search_worker in a process of
+    RestrictionBatch.search_many."""
+    global _worker_data
+    batch = RestrictionBatch(names)
+    _worker_data = batch, [batch.format(n) for n in names]
+
+def _search_worker(dna):
+    """_search_worker(dna) -> list.
+
+    for internal use only.
+
+    the results for each enzyme of the worker's batch (in the order of the
+    names given to _init_worker)."""
+    batch, enzymes = _worker_data
+    mapping = batch._search_all(dna)
+    return [mapping[enzyme] for enzyme in enzymes]
+
+def _fragments(mapping, length, linear):
+    """_fragments(mapping, length, linear) -> (array, array).
+
+    for internal use only.
+
+    combine the results of the enzymes (a dict as returned by B.search) in
+    one digest of a sequence of the given length. Return the positions of
+    the cuts and the lengths of the fragments."""
+    positions = {}
+    for cuts in mapping.itervalues():
+        for position in cuts:
+            positions[position] = None
+    if linear:
+        #   a cut before the first base does not cut the sequence.
+        cuts = [c for c in positions if 1 < c <= length]
+    else:
+        cuts = [c for c in positions if 1 <= c <= length]
+    cuts.sort()
+    if not cuts:
+        return array.array('l'), array.array('l', [length])
+    sizes = [b - a for a, b in zip(cuts[:-1], cuts[1:])]
+    if linear:
+        sizes = [cuts[0] - 1] + sizes + [length + 1 - cuts[-1]]
+    else:
+        #   as with RE.catalyse, the fragment spanning the origin is first.
+        sizes = [length - cuts[-1] + cuts[0]] + sizes
+    return array.array('l', cuts), array.array('l', sizes)
+
+def _digest_worker(sequences, linear):
+    """_digest_worker(sequences, linear) -> list.
+
+    for internal use only.
+
+    the (cuts, sizes) digests of a list of sequences with the worker's batch
+    (see _init_worker)."""
+    batch, enzymes = _worker_data
+    return [batch._digest(dna, linear) for dna in sequences]
+
+
 class RestrictionBatch(set):
 
     def __init__(self, first=[], suppliers=[]):
@@ -2002,31 +2330,194 @@ class RestrictionBatch(set):
         #   here we replace the search method of the individual enzymes
         #   with one unique testing method.
         #
-        if not hasattr(self, "already_mapped") :
-            #TODO - Why does this happen!
-            #Try the "doctest" at the start of PrintFormat.py
-            self.already_mapped = None
+        # For the searching, we just care about the sequence as a string,
+        # if that is the same we can use the cached search results.
+        # At the time of writing, Seq == method isn't implemented,
+        # and therefore does object identity which is stricter.
         if isinstance(dna, DNA):
-            # For the searching, we just care about the sequence as a string,
-            # if that is the same we can use the cached search results.
-            # At the time of writing, Seq == method isn't implemented,
-            # and therefore does object identity which is stricter.
-            if (str(dna), linear) == self.already_mapped:
-                return self.mapping
-            else:
-                self.already_mapped = str(dna), linear
-                fseq = FormattedSeq(dna, linear)
-                self.mapping = dict([(x, x.search(fseq)) for x in self])
-                return self.mapping
+            key = str(dna), linear
         elif isinstance(dna, FormattedSeq):
-            if (str(dna), dna.linear) == self.already_mapped:
-                return self.mapping
-            else:
-                self.already_mapped = str(dna), dna.linear
-                self.mapping = dict([(x, x.search(dna)) for x in self])
-                return self.mapping
-        raise TypeError("Expected Seq or MutableSeq instance, got %s instead"\
-                        %type(dna))
+            key = str(dna), dna.linear
+        else:
+            raise TypeError("Expected Seq or MutableSeq instance, got %s "\
+                            "instead" % type(dna))
+        #
+        #   The sequence and its results are cached as a single tuple, so a
+        #   thread never sees the results of another thread's sequence.
+        #   (_last may be missing, e.g. the "doctest" at the start of
+        #   PrintFormat.py doesn't call __init__)
+        #
+        last = getattr(self, '_last', None)
+        if last is not None and last[0] == key:
+            return last[1]
+        if isinstance(dna, DNA):
+            dna = FormattedSeq(dna, linear)
+        mapping = self._search_all(dna)
+        self._last = key, mapping
+        #   kept for backward compatibility, e.g. used by Analysis.
+        self.already_mapped, self.mapping = key, mapping
+        return mapping
+
+    def digest(self, records, linear=True, num_processes=1, chunk_size=100):
+        """B.digest(records, linear=True) -> iterator.
+
+        virtual digest of many sequences with all the enzymes of B together.
+        records is an iterable of SeqRecord objects (e.g. from
+        Bio.SeqIO.parse), which are all linear or all circular.
+
+        For each record, yield a tuple (record, cuts, sizes). cuts is an
+        array with the positions of the cuts (the first base after the cut,
+        as in B.search) in order, each position once even if several
+        enzymes cut there. sizes is an array with the length of the
+        fragments, in the order of the sequence (for a circular sequence,
+        the fragment which spans the origin is first, as in RE.catalyse).
+
+        With num_processes above 1 (this needs the multiprocessing module,
+        Python 2.6 or later), the records are read chunk_size at a time
+        and the chunks are digested in several processes, still yielding
+        the records in order. Otherwise the records are read and digested
+        one at a time, and chunk_size is not used."""
+        if num_processes > 1 and multiprocessing is not None:
+            return self._digest_pool(records, linear, num_processes,
+                                     chunk_size)
+        return self._digest_serial(records, linear)
+
+    def _digest(self, dna, linear, scanner=None):
+        """B._digest(dna, linear) -> (array, array).
+
+        for internal use only.
+
+        the cuts and the fragment sizes of a sequence (a Seq or MutableSeq)."""
+        dna = FormattedSeq(dna, linear)
+        return _fragments(self._search_all(dna, scanner), len(dna), linear)
+
+    def _digest_serial(self, records, linear):
+        """B._digest_serial(records, linear) -> iterator.
+
+        for internal use only, see B.digest."""
+        scanner = self.scanner()
+        for record in records:
+            cuts, sizes = self._digest(record.seq, linear, scanner)
+            yield record, cuts, sizes
+
+    def _digest_pool(self, records, linear, num_processes, chunk_size):
+        """B._digest_pool(records, linear, num_processes, chunk_size) -> iterator.
+
+        for internal use only, see B.digest."""
+        pool = multiprocessing.Pool(num_processes, _init_worker,
+                                    ([str(e) for e in self],))
+        #   Only a few chunks are given to the pool at a time, so the
+        #   records are not all read into memory at once.
+        pending = []
+        records = iter(records)
+        #   Not try/finally, which can't contain a yield before Python 2.5.
+        try:
+            while True:
+                chunk = list(itertools.islice(records, chunk_size))
+                if chunk:
+                    seqs = [record.seq for record in chunk]
+                    pending.append((chunk, pool.apply_async(_digest_worker,
+                                                            (seqs, linear))))
+                if pending and (not chunk or len(pending) > 2*num_processes):
+                    done, result = pending.pop(0)
+                    for record, (cuts, sizes) in zip(done, result.get()):
+                        yield record, cuts, sizes
+                elif not chunk:
+                    break
+        except:
+            #   An error, or the iterator was closed (GeneratorExit):
+            #   stop the worker processes.
+            pool.terminate()
+            raise
+        pool.close()
+        pool.join()
+
+    def search_many(self, sequences, linear=True, num_threads=1,
+                    num_processes=1):
+        """B.search_many(sequences, linear=True) -> list of dict.
+
+        search each sequence (Seq, MutableSeq or FormattedSeq) with all the
+        enzymes of B, return a list with the result of B.search() for each
+        sequence, in the same order.
+
+        The searches can run in several threads (num_threads) or, as they
+        mostly use the processor, in several processes (num_processes, this
+        needs the multiprocessing module, Python 2.6 or later). The results
+        are not cached, unlike B.search()."""
+        sequences = [_formatted(dna, linear) for dna in sequences]
+        enzymes = list(self)
+        if num_processes > 1 and multiprocessing is not None:
+            pool = multiprocessing.Pool(num_processes, _init_worker,
+                                        ([str(e) for e in enzymes],))
+            try:
+                found = pool.map(_search_worker, sequences)
+            except:
+                #   stop the worker processes before raising the error.
+                pool.terminate()
+                raise
+            pool.close()
+            pool.join()
+            return [dict(zip(enzymes, results)) for results in found]
+        if num_threads < 2 or len(sequences) < 2:
+            return [self._search_all(dna) for dna in sequences]
+        mappings = [None] * len(sequences)
+        errors = []
+        #   The index of the next sequence to search, as a one element list
+        counter = [0]
+        lock = threading.Lock()
+        scanner = self.scanner()
+
+        def work():
+            while True:
+                lock.acquire()
+                index = counter[0]
+                counter[0] += 1
+                lock.release()
+                if index >= len(sequences):
+                    return
+                try:
+                    mappings[index] = self._search_all(sequences[index],
+                                                       scanner)
+                except Exception, err:
+                    errors.append(err)
+
+        threads = []
+        for i in range(min(num_threads, len(sequences))):
+            thread = threading.Thread(target=work)
+            thread.setDaemon(True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return mappings
+
+    def _search_all(self, dna, scanner=None):
+        """B._search_all(dna) -> dict.
+
+        for internal use only.
+
+        search dna (a FormattedSeq) with all the enzymes of B at once, using
+        a SiteScanner rather than one pass over the sequence per enzyme."""
+        if scanner is None:
+            scanner = self.scanner()
+        sites = scanner.scan(dna)
+        mapping = {}
+        for enzyme in scanner.enzymes:
+            mapping[enzyme] = enzyme._search_sites(dna, sites[enzyme])
+        return mapping
+
+    def scanner(self):
+        """B.scanner() -> SiteScanner.
+
+        return a SiteScanner for the enzymes of B. It is kept until the
+        enzymes in B change."""
+        enzymes = frozenset(self)
+        cached = getattr(self, '_scanner', None)
+        if cached is None or cached[0] != enzymes:
+            cached = self._scanner = enzymes, SiteScanner(enzymes)
+        return cached[1]
 
 ###############################################################################  
 #                                                                             #
@@ -2355,7 +2846,8 @@ class Analysis(RestrictionBatch, PrintFormat):
 #   However Restriction is still a very inefficient module at import. But
 #   remember that around 660 classes (which is more or less the size of Rebase)
 #   have to be created dynamically. However, this processing take place only
-#   once.
+#   once, and the regular expressions of the sites (which took most of this
+#   time) are only compiled for the enzymes which are used.
 #   This inefficiency is however largely compensated by the use of metaclass
 #   which provide a very efficient layout for the class themselves mostly
 #   alleviating the need of if/else loops in the class methods.
@@ -21,18 +21,101 @@ from Bio.Seq import Seq, UnknownSeq
 from Bio.SeqRecord import SeqRecord, _RestrictedDict
 from Bio import SeqFeature
 
+class DBSeqCache:
+    """Cache of the sequence of a BioSQL entry, in fixed size chunks.
+
+    Each slice of a DBSeq needs a query, so taking many small windows of
+    a long sequence (or looping over its letters) would mean thousands of
+    trips to the database. Instead the sequence is read in chunks (by
+    default of 64 kb), which are kept in memory for later slices, up to
+    max_chunks of them (the least recently used chunks are dropped first).
+    Reads longer than this (e.g. the whole of a chromosome) are passed
+    straight to the database. Setting max_chunks to zero turns the cache
+    off.
+
+    The attributes hits and misses count the chunks found and not found
+    in the cache (a read which bypasses the cache counts as one miss), and
+    evictions counts the chunks dropped.
+    """
+    def __init__(self, adaptor, primary_id, chunk_size=65536, max_chunks=64):
+        self.adaptor = adaptor
+        self.primary_id = primary_id
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._chunks = {}
+        #When each chunk was last used, for finding the oldest
+        self._used = {}
+        self._clock = 0
+
+    def __len__(self):
+        """Number of chunks in the cache."""
+        return len(self._chunks)
+
+    def get(self, start, end):
+        """Return the sequence from start to end (Python counting)."""
+        if end <= start:
+            return ""
+        size = self.chunk_size
+        first = start // size
+        last = (end - 1) // size
+        if last - first + 1 > self.max_chunks:
+            self.misses += 1
+            return self.adaptor.get_subseq_as_string(self.primary_id,
+                                                     start, end)
+        missing = [i for i in range(first, last + 1) \
+                   if i not in self._chunks]
+        self.hits += last - first + 1 - len(missing)
+        self.misses += len(missing)
+        if missing:
+            #Read all the missing chunks with one query
+            offset = missing[0] * size
+            text = self.adaptor.get_subseq_as_string(self.primary_id, offset,
+                                                     (missing[-1] + 1) * size)
+            for i in missing:
+                self._chunks[i] = text[i * size - offset:
+                                       (i + 1) * size - offset]
+        for i in range(first, last + 1):
+            self._clock += 1
+            self._used[i] = self._clock
+        while len(self._chunks) > self.max_chunks:
+            #The chunks just used are the most recent, so are kept
+            oldest = min([(used, i) for (i, used) in self._used.items()])[1]
+            del self._chunks[oldest]
+            del self._used[oldest]
+            self.evictions += 1
+        offset = first * size
+        if first == last:
+            return self._chunks[first][start - offset:end - offset]
+        text = "".join([self._chunks[i] for i in range(first, last + 1)])
+        return text[start - offset:end - offset]
+
+    def clear(self):
+        """Remove all the chunks (the counters are kept)."""
+        self._chunks = {}
+        self._used = {}
+
 class DBSeq(Seq):  # This implements the biopython Seq interface
-    def __init__(self, primary_id, adaptor, alphabet, start, length):
+    def __init__(self, primary_id, adaptor, alphabet, start, length,
+                 cache=None):
         """Create a new DBSeq object referring to a BioSQL entry.
 
         You wouldn't normally create a DBSeq object yourself, this is done
         for you when retreiving a DBSeqRecord object from the database.
+
+        cache is an optional DBSeqCache object, by default a new one is
+        used (slices of this DBSeq share its cache).
         """
         self.primary_id = primary_id
         self.adaptor = adaptor
         self.alphabet = alphabet
         self._length = length
         self.start = start
+        if cache is None:
+            cache = DBSeqCache(adaptor, primary_id)
+        self.cache = cache
 
     def __len__(self):
         return self._length
@@ -50,9 +133,7 @@ class DBSeq(Seq):  # This implements the biopython Seq interface
                 i = i + self._length
             elif i >= self._length:
                 raise IndexError(i)            
-            return self.adaptor.get_subseq_as_string(self.primary_id,
-                                                     self.start + i,
-                                                     self.start + i + 1)
+            return self.cache.get(self.start + i, self.start + i + 1)
         if not isinstance(index, slice):
             raise ValueError("Unexpected index type")
 
@@ -89,12 +170,10 @@ class DBSeq(Seq):  # This implements the biopython Seq interface
         elif index.step is None or index.step == 1:
             #Easy case - can return a DBSeq with the start and end adjusted
             return self.__class__(self.primary_id, self.adaptor, self.alphabet,
-                                  self.start + i, j - i)
+                                  self.start + i, j - i, self.cache)
         else:
             #Tricky.  Will have to create a Seq object because of the stride
-            full = self.adaptor.get_subseq_as_string(self.primary_id,
-                                                     self.start + i,
-                                                     self.start + j)
+            full = self.cache.get(self.start + i, self.start + j)
             return Seq(full[::index.step], self.alphabet)
         
     def tostring(self):
@@ -102,14 +181,10 @@ class DBSeq(Seq):  # This implements the biopython Seq interface
 
         Although not formally deprecated, you are now encouraged to use
         str(my_seq) instead of my_seq.tostring()."""
-        return self.adaptor.get_subseq_as_string(self.primary_id,
-                                                 self.start,
-                                                 self.start + self._length)
+        return self.cache.get(self.start, self.start + self._length)
     def __str__(self):
         """Returns the full sequence as a python string."""
-        return self.adaptor.get_subseq_as_string(self.primary_id,
-                                                 self.start,
-                                                 self.start + self._length)
+        return self.cache.get(self.start, self.start + self._length)
 
     data = property(tostring, doc="Sequence as string (DEPRECATED)")
 
@@ -197,139 +272,189 @@ def _retrieve_dbxrefs(adaptor, primary_id):
     return _dbxrefs
 
 def _retrieve_features(adaptor, primary_id):
-    sql = "SELECT seqfeature_id, type.name, rank" \
-          " FROM seqfeature join term type on (type_term_id = type.term_id)" \
-          " WHERE bioentry_id = %s" \
-          " ORDER BY rank"
-    results = adaptor.execute_and_fetchall(sql, (primary_id,))
-    seq_feature_list = []
-    for seqfeature_id, seqfeature_type, seqfeature_rank in results:
-        # Get qualifiers [except for db_xref which is stored separately]
-        qvs = adaptor.execute_and_fetchall(
-            "SELECT name, value" \
-            " FROM seqfeature_qualifier_value  join term using (term_id)" \
-            " WHERE seqfeature_id = %s" \
-            " ORDER BY rank", (seqfeature_id,))
-        qualifiers = {}
-        for qv_name, qv_value in qvs:
-            qualifiers.setdefault(qv_name, []).append(qv_value)
-        # Get db_xrefs [special case of qualifiers]
-        qvs = adaptor.execute_and_fetchall(
-            "SELECT dbxref.dbname, dbxref.accession" \
-            " FROM dbxref join seqfeature_dbxref using (dbxref_id)" \
-            " WHERE seqfeature_dbxref.seqfeature_id = %s" \
-            " ORDER BY rank", (seqfeature_id,))
-        for qv_name, qv_value in qvs:
-            value = "%s:%s" % (qv_name, qv_value)
-            qualifiers.setdefault("db_xref", []).append(value)
-        # Get locations
-        results = adaptor.execute_and_fetchall(
-            "SELECT location_id, start_pos, end_pos, strand" \
-            " FROM location" \
-            " WHERE seqfeature_id = %s" \
-            " ORDER BY rank", (seqfeature_id,))
-        locations = []
-        # convert to Python standard form
-        # Convert strand = 0 to strand = None
-        # re: comment in Loader.py:
-        # Biopython uses None when we don't know strand information but
-        # BioSQL requires something (non null) and sets this as zero
-        # So we'll use the strand or 0 if Biopython spits out None
-        for location_id, start, end, strand in results:
-            if start:
-                start -= 1
-            if strand == 0:
-                strand = None
-            if strand not in (+1, -1, None):
-                raise ValueError("Invalid strand %s found in database for " \
-                                 "seqfeature_id %s" % (strand, seqfeature_id))
-            if end < start:
-                import warnings
-                warnings.warn("Inverted location start/end (%i and %i) for " \
-                              "seqfeature_id %s" % (start, end, seqfeature_id))
-            locations.append( (location_id, start, end, strand) )
-        # Get possible remote reference information
-        remote_results = adaptor.execute_and_fetchall(
-            "SELECT location_id, dbname, accession, version" \
-            " FROM location join dbxref using (dbxref_id)" \
-            " WHERE seqfeature_id = %s", (seqfeature_id,))
-        lookup = {}
-        for location_id, dbname, accession, version in remote_results:
+    return _retrieve_features_batch(adaptor, [primary_id])[primary_id]
+
+def _retrieve_features_batch(adaptor, primary_ids):
+    """Retrieve the features of several sequences (PRIVATE).
+
+    Returns a dictionary of feature lists keyed by the primary ids.
+    Rather than querying the qualifiers, db_xrefs and locations of each
+    feature in turn, this fetches them for all the given bioentries with
+    one query per table, and then builds the SeqFeature objects.
+    """
+    features = {}
+    #The ids might have been given as strings
+    lists = {}
+    for primary_id in primary_ids:
+        features[primary_id] = lists.setdefault(str(primary_id), [])
+    if not primary_ids:
+        return features
+    where = " WHERE seqfeature.bioentry_id IN (%s)" \
+            % ", ".join(["%s"] * len(primary_ids))
+    args = tuple(primary_ids)
+    # Get qualifiers [except for db_xref which is stored separately]
+    qualifiers = {}
+    qvs = adaptor.execute_and_fetchall(
+        "SELECT seqfeature_qualifier_value.seqfeature_id, term.name," \
+        " seqfeature_qualifier_value.value" \
+        " FROM seqfeature_qualifier_value" \
+        " JOIN term ON (seqfeature_qualifier_value.term_id = term.term_id)" \
+        " JOIN seqfeature ON (seqfeature_qualifier_value.seqfeature_id" \
+        " = seqfeature.seqfeature_id)" + where + \
+        " ORDER BY seqfeature_qualifier_value.seqfeature_id," \
+        " seqfeature_qualifier_value.rank", args)
+    for seqfeature_id, qv_name, qv_value in qvs:
+        qualifiers.setdefault(seqfeature_id, {}) \
+                  .setdefault(qv_name, []).append(qv_value)
+    # Get db_xrefs [special case of qualifiers]
+    qvs = adaptor.execute_and_fetchall(
+        "SELECT seqfeature_dbxref.seqfeature_id, dbxref.dbname," \
+        " dbxref.accession" \
+        " FROM seqfeature_dbxref" \
+        " JOIN dbxref ON (seqfeature_dbxref.dbxref_id = dbxref.dbxref_id)" \
+        " JOIN seqfeature ON (seqfeature_dbxref.seqfeature_id" \
+        " = seqfeature.seqfeature_id)" + where + \
+        " ORDER BY seqfeature_dbxref.seqfeature_id, seqfeature_dbxref.rank",
+        args)
+    for seqfeature_id, qv_name, qv_value in qvs:
+        value = "%s:%s" % (qv_name, qv_value)
+        qualifiers.setdefault(seqfeature_id, {}) \
+                  .setdefault("db_xref", []).append(value)
+    # Get locations, with any remote reference information
+    locations = {}
+    results = adaptor.execute_and_fetchall(
+        "SELECT location.seqfeature_id, location.location_id," \
+        " location.start_pos, location.end_pos, location.strand," \
+        " dbxref.dbxref_id, dbxref.dbname, dbxref.accession, dbxref.version" \
+        " FROM location" \
+        " JOIN seqfeature ON (location.seqfeature_id" \
+        " = seqfeature.seqfeature_id)" \
+        " LEFT JOIN dbxref ON (location.dbxref_id = dbxref.dbxref_id)" \
+        + where + " ORDER BY location.seqfeature_id, location.rank", args)
+    # convert to Python standard form
+    # Convert strand = 0 to strand = None
+    # re: comment in Loader.py:
+    # Biopython uses None when we don't know strand information but
+    # BioSQL requires something (non null) and sets this as zero
+    # So we'll use the strand or 0 if Biopython spits out None
+    for (seqfeature_id, location_id, start, end, strand,
+         dbxref_id, dbname, accession, version) in results:
+        if start:
+            start -= 1
+        if strand == 0:
+            strand = None
+        if strand not in (+1, -1, None):
+            raise ValueError("Invalid strand %s found in database for " \
+                             "seqfeature_id %s" % (strand, seqfeature_id))
+        if end < start:
+            import warnings
+            warnings.warn("Inverted location start/end (%i and %i) for " \
+                          "seqfeature_id %s" % (start, end, seqfeature_id))
+        if dbxref_id is None:
+            dbname, v = None, None
+        else:
             if version and version != "0":
                 v = "%s.%s" % (accession, version)
             else:
                 v = accession
-            # subfeature remote location db_ref are stored as a empty string when
-            # not present
+            # subfeature remote location db_ref are stored as a empty
+            # string when not present
             if dbname == "":
                 dbname = None
-            lookup[location_id] = (dbname, v)
-        
-        feature = SeqFeature.SeqFeature(type = seqfeature_type)
-        feature._seqfeature_id = seqfeature_id #Store the key as a private property
-        feature.qualifiers = qualifiers
-        if len(locations) == 0:
-            pass
-        elif len(locations) == 1:
-            location_id, start, end, strand = locations[0]
-            #See Bug 2677, we currently don't record the location_operator
-            #For consistency with older versions Biopython, default to "".
-            feature.location_operator = \
-                _retrieve_location_qualifier_value(adaptor, location_id)
-            dbname, version = lookup.get(location_id, (None, None))
-            feature.location = SeqFeature.FeatureLocation(start, end)
-            feature.strand = strand
-            feature.ref_db = dbname
-            feature.ref = version
+        locations.setdefault(seqfeature_id, []).append( \
+            (location_id, start, end, strand, dbname, v))
+    # Get the location operators (see Bug 2677)
+    operators = {}
+    results = adaptor.execute_and_fetchall(
+        "SELECT location_qualifier_value.location_id," \
+        " location_qualifier_value.value" \
+        " FROM location_qualifier_value" \
+        " JOIN location ON (location_qualifier_value.location_id" \
+        " = location.location_id)" \
+        " JOIN seqfeature ON (location.seqfeature_id" \
+        " = seqfeature.seqfeature_id)" + where, args)
+    for location_id, value in results:
+        operators.setdefault(location_id, value)
+
+    results = adaptor.execute_and_fetchall(
+        "SELECT seqfeature.bioentry_id, seqfeature.seqfeature_id, type.name" \
+        " FROM seqfeature" \
+        " JOIN term type ON (seqfeature.type_term_id = type.term_id)" \
+        + where + " ORDER BY seqfeature.bioentry_id, seqfeature.rank", args)
+    for primary_id, seqfeature_id, seqfeature_type in results:
+        feature = _make_feature(seqfeature_id, seqfeature_type,
+                                qualifiers.get(seqfeature_id, {}),
+                                locations.get(seqfeature_id, []), operators)
+        lists[str(primary_id)].append(feature)
+    return features
+
+def _make_feature(seqfeature_id, seqfeature_type, qualifiers, locations,
+                  operators):
+    """Build a SeqFeature from the rows retrieved for it (PRIVATE)."""
+    feature = SeqFeature.SeqFeature(type = seqfeature_type)
+    feature._seqfeature_id = seqfeature_id #Store the key as a private property
+    feature.qualifiers = qualifiers
+    if len(locations) == 0:
+        pass
+    elif len(locations) == 1:
+        location_id, start, end, strand, dbname, version = locations[0]
+        #See Bug 2677, we currently don't record the location_operator
+        #For consistency with older versions Biopython, default to "".
+        feature.location_operator = operators.get(location_id, "")
+        feature.location = SeqFeature.FeatureLocation(start, end)
+        feature.strand = strand
+        feature.ref_db = dbname
+        feature.ref = version
+    else:
+        assert feature.sub_features == []
+        for location in locations:
+            location_id, start, end, strand, dbname, version = location
+            subfeature = SeqFeature.SeqFeature()
+            subfeature.type = seqfeature_type
+            subfeature.location_operator = operators.get(location_id, "")
+            #TODO - See Bug 2677 - we don't yet record location_operator,
+            #so for consistency with older versions of Biopython default
+            #to assuming its a join.
+            if not subfeature.location_operator:
+                subfeature.location_operator="join"
+            subfeature.location = SeqFeature.FeatureLocation(start, end)
+            subfeature.strand = strand
+            subfeature.ref_db = dbname
+            subfeature.ref = version
+            feature.sub_features.append(subfeature)
+        # Assuming that the feature loc.op is the same as the sub_feature
+        # loc.op:
+        feature.location_operator = \
+            feature.sub_features[0].location_operator
+        # Locations are in order, but because of remote locations for
+        # sub-features they are not necessarily in numerical order:
+        start = locations[0][1]
+        end = locations[-1][2]
+        feature.location = SeqFeature.FeatureLocation(start, end)
+        # To get the parent strand (as done when parsing GenBank files),
+        # need to consider evil mixed strand examples like this,
+        # join(complement(69611..69724),139856..140087,140625..140650)
+        strands = set(sf.strand for sf in feature.sub_features)
+        if len(strands)==1:
+            feature.strand = feature.sub_features[0].strand
         else:
-            assert feature.sub_features == []
-            for location in locations:
-                location_id, start, end, strand = location
-                dbname, version = lookup.get(location_id, (None, None))
-                subfeature = SeqFeature.SeqFeature()
-                subfeature.type = seqfeature_type
-                subfeature.location_operator = \
-                    _retrieve_location_qualifier_value(adaptor, location_id)
-                #TODO - See Bug 2677 - we don't yet record location_operator,
-                #so for consistency with older versions of Biopython default
-                #to assuming its a join.
-                if not subfeature.location_operator:
-                    subfeature.location_operator="join"
-                subfeature.location = SeqFeature.FeatureLocation(start, end)
-                subfeature.strand = strand
-                subfeature.ref_db = dbname
-                subfeature.ref = version
-                feature.sub_features.append(subfeature)
-            # Assuming that the feature loc.op is the same as the sub_feature
-            # loc.op:
-            feature.location_operator = \
-                feature.sub_features[0].location_operator
-            # Locations are in order, but because of remote locations for
-            # sub-features they are not necessarily in numerical order:
-            start = locations[0][1]
-            end = locations[-1][2]
-            feature.location = SeqFeature.FeatureLocation(start, end)
-            # To get the parent strand (as done when parsing GenBank files),
-            # need to consider evil mixed strand examples like this,
-            # join(complement(69611..69724),139856..140087,140625..140650)
-            strands = set(sf.strand for sf in feature.sub_features)
-            if len(strands)==1:
-                feature.strand = feature.sub_features[0].strand
-            else:
-                feature.strand = None # i.e. mixed strands
-
-        seq_feature_list.append(feature)
+            feature.strand = None # i.e. mixed strands
+    return feature
 
-    return seq_feature_list
+def _prefetch_features(records, chunk_size=100):
+    """Retrieve the features of several DBSeqRecords at once (PRIVATE).
 
-def _retrieve_location_qualifier_value(adaptor, location_id):
-    value = adaptor.execute_and_fetch_col0(
-        "SELECT value FROM location_qualifier_value" \
-        " WHERE location_id = %s", (location_id,))
-    try:
-        return value[0] 
-    except IndexError:
-        return ""
+    Records which already have their features are left alone. The
+    bioentries are queried chunk_size at a time.
+    """
+    todo = [record for record in records if not hasattr(record, "_features")]
+    for i in range(0, len(todo), chunk_size):
+        chunk = todo[i:i + chunk_size]
+        #All the records should share an adaptor
+        features = _retrieve_features_batch(chunk[0]._adaptor,
+                                            [r._primary_id for r in chunk])
+        for record in chunk:
+            record._features = features[record._primary_id]
 
 def _retrieve_annotations(adaptor, primary_id, taxon_id):
     annotations = {}
@@ -12,13 +12,17 @@
 This provides interfaces for loading biological objects from a relational
 database, and is compatible with the BioSQL standards.
 """
+import time
+import threading
+
 import BioSeq
 import Loader
 import DBUtils
 
 _POSTGRES_RULES_PRESENT = False # Hack for BioSQL Bug 2839
 
-def open_database(driver = "MySQLdb", **kwargs):
+def open_database(driver = "MySQLdb", pool_size = None, pool_timeout = None,
+                  pool_recycle = 3600, **kwargs):
     """Main interface for loading a existing BioSQL-style database.
 
     This function is the easiest way to retrieve a connection to a
@@ -35,6 +39,14 @@ def open_database(driver = "MySQLdb", **kwargs):
     password, passwd -> the password to connect with
     host -> the hostname of the database
     database or db -> the name of the database
+
+    To share the server between threads (e.g. in a web service), give a
+    pool_size. This returns a PooledDBServer, where each thread uses its
+    own connection, taken from a pool of at most pool_size connections:
+    pool_timeout -> how long to wait in seconds for a free connection
+    (default None, meaning wait for ever)
+    pool_recycle -> how long in seconds to keep a connection before
+    replacing it with a new one (default one hour)
     """
     module = __import__(driver)
     connect = getattr(module, "connect")
@@ -58,25 +70,35 @@ def open_database(driver = "MySQLdb", **kwargs):
             del kw["passwd"]
     if driver in ["psycopg", "psycopg2", "pgdb"] and not kw.get("database"):
         kw["database"] = "template1"
-    # SQLite connect takes the database name as input
-    if driver in ["sqlite3"]:
-        conn = connect(kw["database"])
-    else:
+
+    def new_connection():
+        # SQLite connect takes the database name as input
+        if driver in ["sqlite3"]:
+            if pool_size:
+                # Pooled connections are passed between threads
+                return connect(kw["database"], check_same_thread=False)
+            return connect(kw["database"])
         try:
-            conn = connect(**kw)
+            return connect(**kw)
         except module.InterfaceError:
             # Ok, so let's try building a DSN
             # (older releases of psycopg need this)
-            if "database" in kw:
-                kw["dbname"] = kw["database"]
-                del kw["database"]
-            elif "db" in kw:
-                kw["dbname"] = kw["db"]
-                del kw["db"]
-            dsn = ' '.join(['='.join(i) for i in kw.items()])
-            conn = connect(dsn)
-
-    server = DBServer(conn, module)
+            dsn_kw = kw.copy()
+            if "database" in dsn_kw:
+                dsn_kw["dbname"] = dsn_kw["database"]
+                del dsn_kw["database"]
+            elif "db" in dsn_kw:
+                dsn_kw["dbname"] = dsn_kw["db"]
+                del dsn_kw["db"]
+            dsn = ' '.join(['='.join(i) for i in dsn_kw.items()])
+            return connect(dsn)
+
+    if pool_size:
+        pool = ConnectionPool(new_connection, pool_size, pool_timeout,
+                              pool_recycle, DBUtils.get_dbutils(driver).ping)
+        server = PooledDBServer(pool, module)
+    else:
+        server = DBServer(new_connection(), module)
 
     if driver == "psycopg":
         import warnings
@@ -104,6 +126,8 @@ def open_database(driver = "MySQLdb", **kwargs):
                           "new records.")
             global _POSTGRES_RULES_PRESENT
             _POSTGRES_RULES_PRESENT = True
+        # Return the connection to the pool (if any)
+        server.release()
 
     return server
 
@@ -193,6 +217,46 @@ class DBServer:
         """Close the connection. No further activity possible."""
         return self.adaptor.close()
 
+    def release(self):
+        """Does nothing (there is only one connection, see PooledDBServer)."""
+        pass
+
+class PooledDBServer(DBServer):
+    """A DBServer which can be shared by several threads.
+
+    Each thread uses its own connection (and cursor), which it takes from
+    a ConnectionPool the first time it needs one. A thread should call the
+    release method when it has finished with the database (e.g. at the end
+    of each web request), which returns its connection to the pool. Note
+    commit and rollback apply to the calling thread's connection only.
+
+    You would normally get one of these from open_database, e.g.
+
+        >>> server = BioSeqDatabase.open_database(driver="MySQLdb",
+        ...                  user="root", db="minidb", pool_size=10)
+    """
+    def __init__(self, pool, module, module_name=None):
+        self.module = module
+        if module_name is None:
+            module_name = module.__name__
+        self.pool = pool
+        self.adaptor = PooledAdaptor(pool, DBUtils.get_dbutils(module_name))
+        self.module_name = module_name
+
+    def __repr__(self):
+        return self.__class__.__name__ + "(%r)" % self.pool
+
+    def release(self):
+        """Return this thread's connection to the pool.
+
+        Any changes not yet committed are rolled back.
+        """
+        self.adaptor.release()
+
+    def close(self):
+        """Close all the connections. No further activity possible."""
+        self.adaptor.close()
+
 class Adaptor:
     def __init__(self, conn, dbutils):
         self.conn = conn
@@ -335,6 +399,11 @@ class Adaptor:
         """
         self.dbutils.execute(self.cursor, sql, args)
 
+    def executemany(self, sql, seq):
+        """Execute an sql command once for each argument tuple in seq.
+        """
+        self.dbutils.executemany(self.cursor, sql, seq)
+
     def get_subseq_as_string(self, seqid, start, end):
         length = end - start
         # XXX Check this on MySQL and PostgreSQL. substr should be general,
@@ -359,6 +428,205 @@ class Adaptor:
         self.execute(sql, args or ())
         return self.cursor.fetchall()
 
+class PooledAdaptor(Adaptor):
+    """Adaptor giving each thread its own connection from a pool.
+
+    The conn and cursor attributes are those of the calling thread, so
+    all the usual Adaptor methods can be used from several threads.
+    """
+    def __init__(self, pool, dbutils):
+        self.pool = pool
+        self.dbutils = dbutils
+        self._local = threading.local()
+
+    def _get_conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self.pool.checkout()
+            self._local.conn = conn
+            self._local.cursor = conn.cursor()
+        return conn
+    conn = property(_get_conn, doc="This thread's connection")
+
+    def _get_cursor(self):
+        self._get_conn()
+        return self._local.cursor
+    cursor = property(_get_cursor, doc="This thread's cursor")
+
+    def release(self):
+        """Return this thread's connection (if any) to the pool."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            try:
+                self._local.cursor.close()
+            except Exception:
+                pass
+            self._local.conn = None
+            self._local.cursor = None
+            self.pool.checkin(conn)
+
+    def close(self):
+        """Close all the connections. No further activity possible."""
+        self.release()
+        self.pool.close()
+
+class ConnectionPool:
+    """Bounded pool of database connections shared by several threads.
+
+    new_connection is a function returning a new DB-API connection. At
+    most size connections are open at once; when they are all in use,
+    checkout waits up to timeout seconds (or for ever if timeout is None)
+    for one to be returned, and then raises a RuntimeError.
+
+    Connections older than recycle seconds are closed and replaced. An
+    idle connection which was last used more than ping_after seconds ago
+    is checked with the ping function (which takes a connection and
+    returns a boolean) before being handed out, and replaced if it no
+    longer works (e.g. after the database server closed it). Connections
+    held by threads which have finished are reclaimed.
+
+    The attributes created and replaced count the connections opened and
+    the connections closed because they were too old or broken.
+    """
+    def __init__(self, new_connection, size=5, timeout=None, recycle=3600,
+                 ping=None, ping_after=60):
+        if size < 1:
+            raise ValueError("The pool size must be at least one")
+        self.new_connection = new_connection
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping = ping
+        self.ping_after = ping_after
+        self.created = 0
+        self.replaced = 0
+        self.closed = False
+        self._condition = threading.Condition(threading.Lock())
+        #Idle connections as [connection, created, last used] lists
+        self._idle = []
+        #Connections in use, by id, as (connection, created, thread)
+        self._in_use = {}
+        #Number of connections being checked or opened on the way out,
+        #or rolled back on the way in (not in either of the above)
+        self._pending = 0
+
+    def __repr__(self):
+        return "%s(size=%i)" % (self.__class__.__name__, self.size)
+
+    def _reclaim(self):
+        """Forget connections held by finished threads (PRIVATE)."""
+        for key, (conn, created, thread) in self._in_use.items():
+            if not thread.isAlive():
+                del self._in_use[key]
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+    def checkout(self):
+        """Return a connection for the calling thread."""
+        if self.timeout is not None:
+            deadline = time.time() + self.timeout
+        self._condition.acquire()
+        try:
+            while True:
+                if self.closed:
+                    raise RuntimeError("The connection pool has been closed")
+                if self._idle:
+                    conn, created, used = self._idle.pop()
+                    self._pending += 1
+                    break
+                if len(self._in_use) + self._pending < self.size:
+                    conn = None
+                    self._pending += 1
+                    break
+                self._reclaim()
+                if len(self._in_use) + self._pending < self.size:
+                    continue
+                if self.timeout is None:
+                    self._condition.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise RuntimeError("No database connection free " \
+                                           "after %s seconds" % self.timeout)
+                    self._condition.wait(remaining)
+        finally:
+            self._condition.release()
+        #Check or open the connection without holding the lock
+        if conn is not None:
+            now = time.time()
+            if now - created > self.recycle or (self.ping and \
+               now - used > self.ping_after and not self.ping(conn)):
+                self._discard(conn)
+                conn = None
+        if conn is None:
+            try:
+                conn = self.new_connection()
+            except:
+                self._condition.acquire()
+                self._pending -= 1
+                self._condition.notify()
+                self._condition.release()
+                raise
+            created = time.time()
+            self._condition.acquire()
+            self.created += 1
+            self._condition.release()
+        self._condition.acquire()
+        self._pending -= 1
+        self._in_use[id(conn)] = (conn, created, threading.currentThread())
+        self._condition.release()
+        return conn
+
+    def _discard(self, conn):
+        """Close a connection which is too old or broken (PRIVATE)."""
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._condition.acquire()
+        self.replaced += 1
+        self._condition.release()
+
+    def checkin(self, conn):
+        """Take back a connection, rolling back any uncommitted changes."""
+        self._condition.acquire()
+        try:
+            conn, created, thread = self._in_use.pop(id(conn))
+            self._pending += 1
+        finally:
+            self._condition.release()
+        try:
+            conn.rollback()
+            broken = False
+        except Exception:
+            #Can't reuse it, a new one will be opened if needed
+            broken = True
+            self._discard(conn)
+        self._condition.acquire()
+        try:
+            self._pending -= 1
+            if not broken and self.closed:
+                conn.close()
+            elif not broken:
+                self._idle.append([conn, created, time.time()])
+            self._condition.notify()
+        finally:
+            self._condition.release()
+
+    def close(self):
+        """Close the idle connections, and the others when returned."""
+        self._condition.acquire()
+        try:
+            self.closed = True
+            for conn, created, used in self._idle:
+                conn.close()
+            self._idle = []
+            self._condition.notifyAll()
+        finally:
+            self._condition.release()
+
 _allowed_lookups = {
     # Lookup name / function name to get id, function to list all ids
     'primary_id': "fetch_seqid_by_identifier",
@@ -434,12 +702,31 @@ class BioSeqDatabase:
         return BioSeq.DBSeqRecord(self.adaptor, key)
     def keys(self):
         return self.get_all_primary_ids()
-    def values(self):
-        return [self[key] for key in self.keys()]
+    def values(self, prefetch=False):
+        """List of all the records (DBSeqRecord objects) in the database.
+
+        prefetch is a boolean flag, if true the features of all the records
+        are retrieved up front with a few queries per hundred records
+        (rather than as each record's features are first used).
+        """
+        records = [self[key] for key in self.keys()]
+        if prefetch:
+            BioSeq._prefetch_features(records)
+        return records
     def items(self):
         return [(key, self[key]) for key in self.keys()]
 
     def lookup(self, **kwargs):
+        """Get a record (DBSeqRecord object) using one key/value pair.
+
+        Example: record = db.lookup(accession="X77802")
+
+        The key must be one of primary_id, gi, display_id, name, accession
+        or version. The optional prefetch argument (a boolean flag) means
+        the record's features are retrieved straight away with a few set
+        based queries.
+        """
+        prefetch = kwargs.pop("prefetch", False)
         if len(kwargs) != 1:
             raise TypeError("single key/value parameter expected")
         k, v = kwargs.items()[0]
@@ -449,7 +736,10 @@ class BioSeqDatabase:
         lookup_name = _allowed_lookups[k]
         lookup_func = getattr(self.adaptor, lookup_name)
         seqid = lookup_func(self.dbid, v)
-        return BioSeq.DBSeqRecord(self.adaptor, seqid)
+        record = BioSeq.DBSeqRecord(self.adaptor, seqid)
+        if prefetch:
+            BioSeq._prefetch_features([record])
+        return record
         
     def get_Seq_by_primary_id(self, seqid):
         """Gets a Bio::Seq object by the primary (internal) id.
@@ -460,7 +750,8 @@ class BioSeqDatabase:
         """
         return self[seqid]
 
-    def load(self, record_iterator, fetch_NCBI_taxonomy=False):
+    def load(self, record_iterator, fetch_NCBI_taxonomy=False,
+             batch_size=None, commit=False):
         """Load a set of SeqRecords into the BioSQL database.
 
         record_iterator is either a list of SeqRecord objects, or an
@@ -473,14 +764,27 @@ class BioSeqDatabase:
         (via Bio.Entrez) to fetch a detailed taxonomy for each
         SeqRecord.
 
+        batch_size is optional. If given, the records are loaded in bulk
+        (see Loader.BulkDatabaseLoader), which caches the ids of terms,
+        dbxrefs etc and inserts most rows together every batch_size
+        records. This is much faster for large numbers of records.
+
+        commit is a boolean flag, if true the transaction is committed
+        after each batch (or at the end, without a batch_size).
+
         Example:
         from Bio import SeqIO
         count = db.load(SeqIO.parse(open(filename), format))
 
         Returns the number of records loaded.
         """
-        db_loader = Loader.DatabaseLoader(self.adaptor, self.dbid, \
-                                          fetch_NCBI_taxonomy)
+        if batch_size:
+            db_loader = Loader.BulkDatabaseLoader(self.adaptor, self.dbid,
+                                                  fetch_NCBI_taxonomy,
+                                                  batch_size)
+        else:
+            db_loader = Loader.DatabaseLoader(self.adaptor, self.dbid, \
+                                              fetch_NCBI_taxonomy)
         num_records = 0
         global _POSTGRES_RULES_PRESENT
         for cur_record in record_iterator:
@@ -514,4 +818,11 @@ class BioSeqDatabase:
                         "detected: record has not been inserted")
             #End of hack
             db_loader.load_seqrecord(cur_record)
+            if commit and batch_size and num_records % batch_size == 0:
+                #The loader has just inserted this batch
+                self.adaptor.commit()
+        if batch_size:
+            db_loader.flush()
+        if commit:
+            self.adaptor.commit()
         return num_records
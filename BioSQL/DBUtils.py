@@ -32,10 +32,28 @@ class Generic_dbutils:
         """
         cursor.execute(sql, args or ())
 
+    def executemany(self, cursor, sql, seq):
+        """Execute an sql command for each of the argument tuples in seq.
+        """
+        cursor.executemany(sql, seq)
+
     def autocommit(self, conn, y = 1):
         # Let's hope it was not really needed
         pass
 
+    def ping(self, conn):
+        """Check a connection still works (returns True or False).
+        """
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+            conn.rollback()
+        except Exception:
+            return False
+        return True
+
 
 class Sqlite_dbutils(Generic_dbutils):
     """Custom database utilities for SQLite."""
@@ -44,6 +62,11 @@ class Sqlite_dbutils(Generic_dbutils):
         """
         cursor.execute(sql.replace("%s", "?"), args or ())
 
+    def executemany(self, cursor, sql, seq):
+        """Execute SQL command for each tuple in seq, replacing %s with ?.
+        """
+        cursor.executemany(sql.replace("%s", "?"), seq)
+
 _dbutils["sqlite3"] = Sqlite_dbutils
 
 
@@ -56,9 +56,15 @@ class DatabaseLoader:
         for reference, rank in zip(references, range(len(references))):
             self._load_reference(reference, rank, bioentry_id)
         self._load_annotations(record, bioentry_id)
-        for seq_feature_num in range(len(record.features)):
-            seq_feature = record.features[seq_feature_num]
-            self._load_seqfeature(seq_feature, seq_feature_num, bioentry_id)
+        self._load_seqfeatures(record.features, bioentry_id)
+
+    def _insert_row(self, sql, args):
+        """Insert a row whose id is not needed later (PRIVATE).
+
+        This is used for all the rows which no other row refers to, so
+        that BulkDatabaseLoader can collect them and insert them together.
+        """
+        self.adaptor.execute(sql, args)
 
     def _get_ontology_id(self, name, definition=None):
         """Returns the identifier for the named ontology (PRIVATE).
@@ -576,7 +582,7 @@ class DatabaseLoader:
         sql = r"INSERT INTO bioentry_qualifier_value" \
               r" (bioentry_id, term_id, value, rank)" \
               r" VALUES (%s, %s, %s, 1)" 
-        self.adaptor.execute(sql, (bioentry_id, date_id, date))
+        self._insert_row(sql, (bioentry_id, date_id, date))
 
     def _load_biosequence(self, record, bioentry_id):
         """Record a SeqRecord's sequence and alphabet in the database (PRIVATE).
@@ -607,10 +613,10 @@ class DatabaseLoader:
         sql = r"INSERT INTO biosequence (bioentry_id, version, " \
               r"length, seq, alphabet) " \
               r"VALUES (%s, 0, %s, %s, %s)"
-        self.adaptor.execute(sql, (bioentry_id,
-                                   len(record.seq),
-                                   seq_str,
-                                   alphabet))
+        self._insert_row(sql, (bioentry_id,
+                               len(record.seq),
+                               seq_str,
+                               alphabet))
 
     def _load_comment(self, record, bioentry_id):
         """Record a SeqRecord's annotated comment in the database (PRIVATE).
@@ -631,7 +637,7 @@ class DatabaseLoader:
             #the newlines, but we should check BioPerl etc to be consistent.
             sql = "INSERT INTO comment (bioentry_id, comment_text, rank)" \
                   " VALUES (%s, %s, %s)"
-            self.adaptor.execute(sql, (bioentry_id, comment, index+1))
+            self._insert_row(sql, (bioentry_id, comment, index+1))
         
     def _load_annotations(self, record, bioentry_id):
         """Record a SeqRecord's misc annotations in the database (PRIVATE).
@@ -661,7 +667,7 @@ class DatabaseLoader:
                     if isinstance(entry, str) or isinstance(entry, int):
                         #Easy case
                         rank += 1
-                        self.adaptor.execute(many_sql, \
+                        self._insert_row(many_sql, \
                                      (bioentry_id, term_id, str(entry), rank))
                     else:
                         pass
@@ -669,8 +675,8 @@ class DatabaseLoader:
                         #      % (key, str(type(entry)))
             elif isinstance(value, str) or isinstance(value, int):
                 #Have a simple single entry, leave rank as the DB default
-                self.adaptor.execute(mono_sql, \
-                                     (bioentry_id, term_id, str(value)))
+                self._insert_row(mono_sql, \
+                                 (bioentry_id, term_id, str(value)))
             else:
                 pass
                 #print "Ignoring annotation '%s' entry of type '%s'" \
@@ -683,7 +689,27 @@ class DatabaseLoader:
         record - a SeqRecord object with annotated references
         bioentry_id - corresponding database identifier
         """
+        reference_id = self._get_reference_id(reference)
 
+        if reference.location:
+            start = 1 + int(str(reference.location[0].start))
+            end = int(str(reference.location[0].end))
+        else:
+            start = None
+            end = None
+        
+        sql = "INSERT INTO bioentry_reference (bioentry_id, reference_id," \
+              " start_pos, end_pos, rank)" \
+              " VALUES (%s, %s, %s, %s, %s)"
+        self._insert_row(sql, (bioentry_id, reference_id,
+                               start, end, rank + 1))
+
+    def _get_reference_id(self, reference):
+        """Return the id of a reference, adding it if needed (PRIVATE).
+
+        Existing references are found by their MEDLINE or PubMed id, or
+        by a checksum of the authors, title and journal.
+        """
         refs = None
         if reference.medline_id:
             refs = self.adaptor.execute_and_fetch_col0(
@@ -728,19 +754,13 @@ class DatabaseLoader:
             reference_id = self.adaptor.last_id("reference")
         else:
             reference_id = refs[0]
+        return reference_id
 
-        if reference.location:
-            start = 1 + int(str(reference.location[0].start))
-            end = int(str(reference.location[0].end))
-        else:
-            start = None
-            end = None
-        
-        sql = "INSERT INTO bioentry_reference (bioentry_id, reference_id," \
-              " start_pos, end_pos, rank)" \
-              " VALUES (%s, %s, %s, %s, %s)"
-        self.adaptor.execute(sql, (bioentry_id, reference_id,
-                                   start, end, rank + 1))
+    def _load_seqfeatures(self, features, bioentry_id):
+        """Load all the SeqFeatures of a record (PRIVATE)."""
+        for seq_feature_num in range(len(features)):
+            seq_feature = features[seq_feature_num]
+            self._load_seqfeature(seq_feature, seq_feature_num, bioentry_id)
         
     def _load_seqfeature(self, feature, feature_rank, bioentry_id):
         """Load a biopython SeqFeature into the database (PRIVATE).
@@ -838,8 +858,8 @@ class DatabaseLoader:
         sql = r"INSERT INTO location (seqfeature_id, dbxref_id, term_id," \
               r"start_pos, end_pos, strand, rank) " \
               r"VALUES (%s, %s, %s, %s, %s, %s, %s)"
-        self.adaptor.execute(sql, (seqfeature_id, dbxref_id, loc_term_id,
-                                   start, end, strand, rank))
+        self._insert_row(sql, (seqfeature_id, dbxref_id, loc_term_id,
+                               start, end, strand, rank))
 
         """
         # See Bug 2677
@@ -887,10 +907,10 @@ class DatabaseLoader:
                     sql = r"INSERT INTO seqfeature_qualifier_value "\
                           r" (seqfeature_id, term_id, rank, value) VALUES"\
                           r" (%s, %s, %s, %s)"
-                    self.adaptor.execute(sql, (seqfeature_id,
-                                               qualifier_key_id,
-                                               qual_value_rank + 1,
-                                               qualifier_value))
+                    self._insert_row(sql, (seqfeature_id,
+                                           qualifier_key_id,
+                                           qual_value_rank + 1,
+                                           qualifier_value))
             else:
                 # The dbxref_id qualifier/value sets go into the dbxref table
                 # as dbname, accession, version tuples, with dbxref.dbxref_id
@@ -983,7 +1003,7 @@ class DatabaseLoader:
         sql = r'INSERT INTO seqfeature_dbxref ' \
               '(seqfeature_id, dbxref_id, rank) VALUES' \
               r'(%s, %s, %s)'
-        self.adaptor.execute(sql, (seqfeature_id, dbxref_id, rank))
+        self._insert_row(sql, (seqfeature_id, dbxref_id, rank))
         return (seqfeature_id, dbxref_id)
 
     def _load_dbxrefs(self, record, bioentry_id):
@@ -1034,9 +1054,173 @@ class DatabaseLoader:
         sql = r'INSERT INTO bioentry_dbxref ' \
               '(bioentry_id,dbxref_id,rank) VALUES ' \
               '(%s, %s, %s)'
-        self.adaptor.execute(sql, (bioentry_id, dbxref_id, rank))
+        self._insert_row(sql, (bioentry_id, dbxref_id, rank))
         return (bioentry_id, dbxref_id)
             
+class BulkDatabaseLoader(DatabaseLoader):
+    """Load many SeqRecord objects with fewer database round trips.
+
+    The ids of ontologies, terms, dbxrefs, references and NCBI taxa are
+    cached in memory, so each is only looked up once. The features of a
+    record are inserted together, and the rows nothing else refers to
+    (qualifiers, locations, sequences, etc) are collected per table and
+    inserted with executemany once batch_size records have been loaded,
+    or when flush is called.
+
+    Rows are only visible in the database after a flush, so don't read
+    the records back before then. Creating a BulkDatabaseLoader is
+    normally handled by the BioSeqDatabase load method (see its
+    batch_size argument).
+    """
+    def __init__(self, adaptor, dbid, fetch_NCBI_taxonomy=False,
+                 batch_size=100):
+        DatabaseLoader.__init__(self, adaptor, dbid, fetch_NCBI_taxonomy)
+        self.batch_size = batch_size
+        self._ontology_ids = {}
+        self._term_ids = {}
+        self._dbxref_ids = {}
+        self._reference_ids = {}
+        self._taxon_ids = {}
+        #The rows waiting to be inserted, by SQL statement (in order of
+        #first use), and the number of records loaded since the last flush
+        self._rows = {}
+        self._statements = []
+        self._pending = 0
+        #The (seqfeature or bioentry id, dbxref id) links already made
+        self._links = set()
+
+    def load_seqrecord(self, record):
+        """Load a Biopython SeqRecord into the database (flushing if due).
+        """
+        DatabaseLoader.load_seqrecord(self, record)
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Insert all the collected rows into the database."""
+        for sql in self._statements:
+            self.adaptor.executemany(sql, self._rows[sql])
+        self._rows = {}
+        self._statements = []
+        self._pending = 0
+        self._links = set()
+
+    def _insert_row(self, sql, args):
+        """Collect a row to insert with the next flush (PRIVATE)."""
+        try:
+            self._rows[sql].append(args)
+        except KeyError:
+            self._rows[sql] = [args]
+            self._statements.append(sql)
+
+    def _get_ontology_id(self, name, definition=None):
+        """Returns the identifier for the named ontology (PRIVATE, cached)."""
+        try:
+            return self._ontology_ids[name]
+        except KeyError:
+            oid = DatabaseLoader._get_ontology_id(self, name, definition)
+            self._ontology_ids[name] = oid
+            return oid
+
+    def _get_term_id(self, name, ontology_id=None, definition=None,
+                     identifier=None):
+        """Get the id that corresponds to a term (PRIVATE, cached)."""
+        key = (name, ontology_id)
+        try:
+            return self._term_ids[key]
+        except KeyError:
+            term_id = DatabaseLoader._get_term_id(self, name, ontology_id,
+                                                  definition, identifier)
+            self._term_ids[key] = term_id
+            return term_id
+
+    def _get_dbxref_id(self, db, accession):
+        """Finds or adds the dbxref_id for the passed data (PRIVATE, cached)."""
+        key = (db, accession)
+        try:
+            return self._dbxref_ids[key]
+        except KeyError:
+            dbxref_id = DatabaseLoader._get_dbxref_id(self, db, accession)
+            self._dbxref_ids[key] = dbxref_id
+            return dbxref_id
+
+    def _get_reference_id(self, reference):
+        """Return the id of a reference, adding it if needed (PRIVATE, cached)."""
+        key = (reference.medline_id, reference.pubmed_id, reference.authors,
+               reference.title, reference.journal)
+        try:
+            return self._reference_ids[key]
+        except KeyError:
+            reference_id = DatabaseLoader._get_reference_id(self, reference)
+            self._reference_ids[key] = reference_id
+            return reference_id
+
+    def _get_taxon_id_from_ncbi_taxon_id(self, ncbi_taxon_id,
+                                         scientific_name = None,
+                                         common_name = None):
+        """Get the taxon id for an NCBI taxon ID (PRIVATE, cached)."""
+        try:
+            return self._taxon_ids[ncbi_taxon_id]
+        except KeyError:
+            taxon_id = DatabaseLoader._get_taxon_id_from_ncbi_taxon_id(self,
+                                ncbi_taxon_id, scientific_name, common_name)
+            self._taxon_ids[ncbi_taxon_id] = taxon_id
+            return taxon_id
+
+    def _load_seqfeatures(self, features, bioentry_id):
+        """Load all the SeqFeatures of a record together (PRIVATE).
+
+        The seqfeature rows are inserted with one executemany call, and
+        their ids are then fetched with one query (using their ranks).
+        """
+        if not features:
+            return
+        key_ontology_id = self._get_ontology_id('SeqFeature Keys')
+        source_cat_id = self._get_ontology_id('SeqFeature Sources')
+        source_term_id = self._get_term_id('EMBL/GenBank/SwissProt',
+                                           ontology_id = source_cat_id)
+        rows = []
+        for rank, feature in enumerate(features):
+            seqfeature_key_id = self._get_term_id(feature.type,
+                                                  ontology_id = key_ontology_id)
+            rows.append((bioentry_id, seqfeature_key_id, source_term_id,
+                         rank + 1))
+        sql = r"INSERT INTO seqfeature (bioentry_id, type_term_id, " \
+              r"source_term_id, rank) VALUES (%s, %s, %s, %s)"
+        self.adaptor.executemany(sql, rows)
+        seqfeature_ids = dict(self.adaptor.execute_and_fetchall(
+            "SELECT rank, seqfeature_id FROM seqfeature" \
+            " WHERE bioentry_id = %s", (bioentry_id,)))
+        for rank, feature in enumerate(features):
+            seqfeature_id = seqfeature_ids[rank + 1]
+            self._load_seqfeature_locations(feature, seqfeature_id)
+            self._load_seqfeature_qualifiers(feature.qualifiers, seqfeature_id)
+
+    def _get_seqfeature_dbxref(self, seqfeature_id, dbxref_id, rank):
+        """Add a seqfeature_dbxref row unless already added (PRIVATE).
+
+        The seqfeature is new, so only rows collected since the last
+        flush need checking.
+        """
+        key = ("seqfeature", seqfeature_id, dbxref_id)
+        if key in self._links:
+            return (seqfeature_id, dbxref_id)
+        self._links.add(key)
+        return self._add_seqfeature_dbxref(seqfeature_id, dbxref_id, rank)
+
+    def _get_bioentry_dbxref(self, bioentry_id, dbxref_id, rank):
+        """Add a bioentry_dbxref row unless already added (PRIVATE).
+
+        The bioentry is new, so only rows collected since the last flush
+        need checking.
+        """
+        key = ("bioentry", bioentry_id, dbxref_id)
+        if key in self._links:
+            return (bioentry_id, dbxref_id)
+        self._links.add(key)
+        return self._add_bioentry_dbxref(bioentry_id, dbxref_id, rank)
+
 class DatabaseRemover:
     """Complement the Loader functionality by fully removing a database.
 
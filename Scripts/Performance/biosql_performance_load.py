@@ -1,33 +1,53 @@
 #/usr/bin/env python
 """Small script to test timing of loading records into a BioSQL database.
+
+Usage: biosql_performance_load.py [genbank_file] [batch_size]
+
+This loads the GenBank file into a new SQLite database, first one record
+at a time and then in bulk (in batches of batch_size records, default 100),
+and reports the records per second. The database schema is taken from the
+Tests/BioSQL directory.
 """
+import os
+import sys
 import time
+import tempfile
 # set up the connection
-from Bio import GenBank
+from Bio import SeqIO
 from BioSQL import BioSeqDatabase
-server = BioSeqDatabase.open_database (host = "192.168.0.192", user = "root", 
-                                       passwd = "", db = "pythonloadtest")
 
-# remove the database if it already exists
-db_name = "testload"
-try:
-    server[db_name]
-    server.remove_database(db_name)
-except KeyError:
-    pass
-db = server.new_database(db_name)
+script_dir = os.path.dirname(os.path.abspath(__file__))
+tests_dir = os.path.join(script_dir, "..", "..", "Tests")
+if len(sys.argv) > 1:
+    input_file = sys.argv[1]
+else:
+    input_file = os.path.join(tests_dir, "GenBank", "cor6_6.gb")
+if len(sys.argv) > 2:
+    batch_size = int(sys.argv[2])
+else:
+    batch_size = 100
+sql_file = os.path.join(tests_dir, "BioSQL", "biosqldb-sqlite.sql")
 
-input_file = "/home/hack/install/biopython/Tests/GenBank/cor6_6.gb"
-handle = open(input_file, "r")
-parser = GenBank.FeatureParser()
-iterator = GenBank.Iterator(handle, parser)
+records = list(SeqIO.parse(open(input_file, "rU"), "gb"))
+handle, db_file = tempfile.mkstemp(suffix=".db")
+os.close(handle)
+server = BioSeqDatabase.open_database(driver="sqlite3", db=db_file)
+server.load_database_sql(sql_file)
+server.commit()
 
-# -- do the timing part
-start_time = time.time()
-num_records = db.load(iterator)
-end_time = time.time()
-elapsed_time = end_time - start_time
-print "Loading"
-print "\tDid %s records in %s seconds for\n\t%f records per second" % \
-      (num_records, elapsed_time, float(num_records) / float(elapsed_time))
+for name, size in [("Loading one by one", None),
+                   ("Loading in batches of %i" % batch_size, batch_size)]:
+    # use a new namespace each time
+    db = server.new_database("testload%s" % size)
+    # -- do the timing part
+    start_time = time.time()
+    num_records = db.load(records, batch_size=size)
+    server.commit()
+    end_time = time.time()
+    elapsed_time = end_time - start_time
+    print name
+    print "\tDid %s records in %s seconds for\n\t%f records per second" % \
+          (num_records, elapsed_time, float(num_records) / float(elapsed_time))
 
+server.close()
+os.remove(db_file)
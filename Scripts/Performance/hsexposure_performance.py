@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+"""Small script to test timing of half sphere exposure on large assemblies.
+
+Usage: hsexposure_performance.py [number_of_residues]
+
+This builds an assembly of at least the given number of residues (default
+5000) from shifted copies of chain A of Tests/PDB/a_structure.pdb, one
+chain per copy, and reports how long HSExposureCA, HSExposureCB and
+ExposureCN take, compared with counting the neighbors pair by pair as
+Bio.PDB did before (and checks both give the same counts).
+
+Run this from the Scripts/Performance directory.
+"""
+import sys
+import time
+import string
+import warnings
+from math import pi
+
+import numpy
+
+from Bio.PDB import PDBParser, CaPPBuilder, is_aa
+from Bio.PDB import HSExposureCA, HSExposureCB, ExposureCN
+from Bio.PDB.PDBExceptions import PDBConstructionWarning
+
+if len(sys.argv) > 1:
+    num_residues = int(sys.argv[1])
+else:
+    num_residues = 5000
+
+pdb_filename = "../../Tests/PDB/a_structure.pdb"
+radius = 13.0
+
+
+def build_assembly(num_residues):
+    """Model with enough shifted copies of chain A on a 30A grid."""
+    warnings.simplefilter("ignore", PDBConstructionWarning)
+    parser = PDBParser(PERMISSIVE=True)
+    model = parser.get_structure("0", pdb_filename)[1]
+    for chain in list(model):
+        if chain.get_id() != "A":
+            model.detach_child(chain.get_id())
+    chain_ids = (string.ascii_letters + string.digits).replace("A", "")
+    n = 1
+    while n * len(model["A"]) < num_residues:
+        chain = parser.get_structure(str(n), pdb_filename)[1]["A"]
+        chain.detach_parent()
+        chain.id = chain_ids[n - 1]
+        shift = 30.0 * numpy.array((n % 4, (n // 4) % 4, n // 16))
+        for atom in chain.get_atoms():
+            atom.transform(numpy.identity(3), shift)
+        model.add(chain)
+        n += 1
+    return model
+
+
+def pairwise_exposure(model, radius, hse=None):
+    """Count the CA atoms around each residue pair by pair (old method)."""
+    ppl = CaPPBuilder().build_peptides(model)
+    values = {}
+    for pp1 in ppl:
+        for i in range(len(pp1)):
+            r2 = pp1[i]
+            if hse is None:
+                if not is_aa(r2) or not r2.has_id("CA"):
+                    continue
+                pcb = None
+            else:
+                r1 = r3 = None
+                if i > 0:
+                    r1 = pp1[i-1]
+                if i < len(pp1) - 1:
+                    r3 = pp1[i+1]
+                result = hse._get_cb(r1, r2, r3)
+                if result is None:
+                    continue
+                pcb = result[0]
+            up = down = 0
+            ca2 = r2["CA"].get_vector()
+            for pp2 in ppl:
+                for j in range(len(pp2)):
+                    if pp1 is pp2 and i == j:
+                        continue
+                    ro = pp2[j]
+                    if not is_aa(ro) or not ro.has_id("CA"):
+                        continue
+                    d = ro["CA"].get_vector() - ca2
+                    if d.norm() < radius:
+                        if pcb is not None and d.angle(pcb) >= pi/2:
+                            down += 1
+                        else:
+                            up += 1
+            key = (r2.get_parent().get_id(), r2.get_id())
+            if hse is None:
+                values[key] = up
+            else:
+                values[key] = (up, down)
+    return values
+
+
+model = build_assembly(num_residues)
+print "Assembly of %i residues in %i chains, radius %0.1f" \
+      % (len(list(model.get_residues())), len(model), radius)
+for name, exposure_class in [("HSExposureCA", HSExposureCA),
+                             ("HSExposureCB", HSExposureCB),
+                             ("ExposureCN", ExposureCN)]:
+    start_time = time.time()
+    exposure = exposure_class(model, radius)
+    new_time = time.time() - start_time
+    start_time = time.time()
+    if exposure_class is ExposureCN:
+        values = pairwise_exposure(model, radius)
+    else:
+        values = pairwise_exposure(model, radius, exposure)
+    old_time = time.time() - start_time
+    same = sorted(values.keys()) == sorted(exposure.keys())
+    for key in exposure.keys():
+        if exposure_class is ExposureCN:
+            same = same and values[key] == exposure[key]
+        else:
+            same = same and values[key] == exposure[key][:2]
+    print name
+    print "\tPair by pair %0.2f seconds, in one batch %0.2f seconds" \
+          % (old_time, new_time)
+    if not same:
+        print "\tWARNING - the counts differ"
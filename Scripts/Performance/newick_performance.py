@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""Small script to test timing of parsing very large Newick trees.
+
+Usage: newick_performance.py [number_of_tips]
+
+This writes two trees with the given number of tips (default 1000000) to
+a temporary file, a random bifurcating tree and a caterpillar tree (where
+each internal node has a tip as one child, so the tree is as deep as it
+has tips), and reports how long Bio.Phylo takes to parse them.
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+from Bio import Phylo
+
+if len(sys.argv) > 1:
+    num_tips = int(sys.argv[1])
+else:
+    num_tips = 1000000
+
+
+def random_tree(num_tips):
+    """Newick text of a random bifurcating tree (joining random pairs)."""
+    nodes = ["t%i:%0.3f" % (i, random.random()) for i in xrange(num_tips)]
+    while len(nodes) > 1:
+        random.shuffle(nodes)
+        joined = ["(%s,%s):%0.3f" % (nodes[i], nodes[i+1], random.random())
+                  for i in xrange(0, len(nodes) - 1, 2)]
+        if len(nodes) % 2:
+            joined.append(nodes[-1])
+        nodes = joined
+    return nodes[0] + ";"
+
+
+def caterpillar_tree(num_tips):
+    """Newick text of a caterpillar tree, without any recursion."""
+    return "(" * (num_tips - 1) + "t0:0.1" \
+           + "".join([",t%i:0.1):0.1" % i for i in xrange(1, num_tips)]) + ";"
+
+
+for name, make_tree in [("Random tree", random_tree),
+                        ("Caterpillar tree", caterpillar_tree)]:
+    handle, filename = tempfile.mkstemp(suffix=".nwk")
+    os.close(handle)
+    handle = open(filename, "w")
+    handle.write(make_tree(num_tips) + "\n")
+    handle.close()
+    start_time = time.time()
+    tree = Phylo.read(filename, "newick")
+    elapsed_time = time.time() - start_time
+    print name
+    print "\tParsed %i tips (%i bytes) in %0.2f seconds" \
+          % (num_tips, os.path.getsize(filename), elapsed_time)
+    del tree
+    os.remove(filename)
@@ -0,0 +1,69 @@
+"""Stand in for the BLAST+ tools, used by test_Blast_Parallel.py.
+
+Takes the options -query, -out, -db and -outfmt. For each query in the
+FASTA file a result without any hits is written, as XML (-outfmt 5) or
+as a table line giving the query and database (any other -outfmt).
+
+Special database names:
+fail - always fail (return code 1)
+fail_once - fail the first time for each query file
+"""
+import os
+import sys
+import time
+import random
+
+options = {}
+args = sys.argv[1:]
+while args:
+    options[args[0]] = args[1]
+    args = args[2:]
+
+query = options["-query"]
+database = options.get("-db", "nr")
+if database == "fail" \
+or (database == "fail_once" and not os.path.isfile(query + ".failed")):
+    open(query + ".failed", "w").close()
+    sys.stderr.write("Simulated failure on %s\n" % query)
+    sys.exit(1)
+
+#Finish in a random order
+time.sleep(0.05 * random.random())
+
+queries = []
+for line in open(query):
+    if line.startswith(">"):
+        words = line[1:].split(None, 1) + [""]
+        queries.append((words[0], words[1].strip()))
+
+handle = open(options["-out"], "w")
+if options.get("-outfmt") == "5":
+    handle.write('<?xml version="1.0"?>\n')
+    handle.write('<BlastOutput>\n')
+    handle.write('  <BlastOutput_program>blastp</BlastOutput_program>\n')
+    handle.write('  <BlastOutput_version>BLASTP 2.2.22+</BlastOutput_version>\n')
+    handle.write('  <BlastOutput_db>%s</BlastOutput_db>\n' % database)
+    handle.write('  <BlastOutput_param><Parameters>\n')
+    handle.write('    <Parameters_matrix>BLOSUM62</Parameters_matrix>\n')
+    handle.write('    <Parameters_expect>10</Parameters_expect>\n')
+    handle.write('    <Parameters_gap-open>11</Parameters_gap-open>\n')
+    handle.write('    <Parameters_gap-extend>1</Parameters_gap-extend>\n')
+    handle.write('    <Parameters_filter>F</Parameters_filter>\n')
+    handle.write('  </Parameters></BlastOutput_param>\n')
+    handle.write('  <BlastOutput_iterations>\n')
+    for i, (name, description) in enumerate(queries):
+        handle.write('    <Iteration>\n')
+        handle.write('      <Iteration_iter-num>%i</Iteration_iter-num>\n'
+                     % (i + 1))
+        handle.write('      <Iteration_query-ID>%s</Iteration_query-ID>\n'
+                     % name)
+        handle.write('      <Iteration_query-def>%s</Iteration_query-def>\n'
+                     % description)
+        handle.write('      <Iteration_hits></Iteration_hits>\n')
+        handle.write('    </Iteration>\n')
+    handle.write('  </BlastOutput_iterations>\n')
+    handle.write('</BlastOutput>\n')
+else:
+    for name, description in queries:
+        handle.write("%s\t%s\n" % (name, database))
+handle.close()
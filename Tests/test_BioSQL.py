@@ -45,7 +45,8 @@ except Exception, e:
               "if you plan to use BioSQL: %s" % str(e)
     raise MissingExternalDependencyError(message)
 
-from seq_tests_common import compare_record, compare_records
+from seq_tests_common import compare_record, compare_records, \
+     compare_features
 
 def _do_db_create():
     """Do the actual work of database creation. Relevant for MySQL and PostgreSQL
@@ -666,6 +667,262 @@ class InDepthLoadTest(unittest.TestCase):
         # mRNA, so really cDNA, so the strand should be 1 (not complemented)
         self.assertEqual(test_feature.strand, 1)
 
+class BulkLoadTest(unittest.TestCase):
+    """Load records in bulk, compared to loading them one by one."""
+
+    def setUp(self):
+        self.records = []
+        for name in ["cor6_6.gb", "NC_005816.gb", "arab1.gb"]:
+            filename = os.path.join(os.getcwd(), "GenBank", name)
+            self.records.extend(SeqIO.parse(open(filename, "rU"), "gb"))
+        self.server = BioSeqDatabase.open_database(driver = DBDRIVER,
+                                              user = DBUSER, passwd = DBPASSWD,
+                                              host = DBHOST, db = TESTDB)
+
+    def tearDown(self):
+        self.server.close()
+
+    def count_rows(self, db, table):
+        sql = "SELECT COUNT(*) FROM %s JOIN bioentry USING (bioentry_id)" \
+              " WHERE biodatabase_id = %%s" % table
+        return self.server.adaptor.execute_one(sql, (db.dbid,))[0]
+
+    def count_feature_rows(self, db, table):
+        sql = "SELECT COUNT(*) FROM %s JOIN seqfeature USING (seqfeature_id)" \
+              " JOIN bioentry USING (bioentry_id)" \
+              " WHERE biodatabase_id = %%s" % table
+        return self.server.adaptor.execute_one(sql, (db.dbid,))[0]
+
+    def test_bulk_load(self):
+        """Loading records in batches."""
+        db = self.server.new_database("test_bulk_single")
+        count = db.load(self.records)
+        bulk_db = self.server.new_database("test_bulk")
+        bulk_count = bulk_db.load(self.records, batch_size=4, commit=True)
+        self.assertEqual(count, len(self.records))
+        self.assertEqual(bulk_count, len(self.records))
+        #Now read them back...
+        biosql_records = [bulk_db.lookup(name=rec.name) \
+                          for rec in self.records]
+        self.assert_(compare_records(self.records, biosql_records))
+        #Same number of rows as loading one record at a time
+        for table in ["biosequence", "comment", "seqfeature",
+                      "bioentry_qualifier_value", "bioentry_reference",
+                      "bioentry_dbxref"]:
+            self.assertEqual(self.count_rows(db, table),
+                             self.count_rows(bulk_db, table))
+        for table in ["location", "seqfeature_qualifier_value",
+                      "seqfeature_dbxref"]:
+            self.assertEqual(self.count_feature_rows(db, table),
+                             self.count_feature_rows(bulk_db, table))
+        self.assert_(self.count_feature_rows(bulk_db, "location") > 100)
+
+    def test_bulk_duplicate(self):
+        """Loading an existing record in bulk fails."""
+        db = self.server.new_database("test_bulk_duplicate")
+        db.load(self.records[:2], batch_size=10)
+        try:
+            db.load(self.records[1:3], batch_size=10)
+        except Exception, err:
+            self.assertEqual("IntegrityError", err.__class__.__name__)
+            return
+        raise Exception("Should have failed!")
+
+class QueryCountingTest(unittest.TestCase):
+    """Base class for tests which count the SQL queries sent."""
+
+    def setUp(self):
+        self.server = BioSeqDatabase.open_database(driver = DBDRIVER,
+                                              user = DBUSER, passwd = DBPASSWD,
+                                              host = DBHOST, db = TESTDB)
+        self.queries = 0
+        self.execute = self.server.adaptor.execute
+        self.server.adaptor.execute = self.count_execute
+
+    def tearDown(self):
+        del self.server.adaptor.execute
+        self.server.close()
+
+    def count_execute(self, sql, args=None):
+        self.queries += 1
+        return self.execute(sql, args)
+
+class PrefetchTest(QueryCountingTest):
+    """Retrieve the features of many records at once."""
+
+    def setUp(self):
+        self.records = []
+        for name in ["cor6_6.gb", "NC_005816.gb", "NC_000932.gb"]:
+            filename = os.path.join(os.getcwd(), "GenBank", name)
+            self.records.extend(SeqIO.parse(open(filename, "rU"), "gb"))
+        QueryCountingTest.setUp(self)
+        self.db = self.server.new_database("test_prefetch")
+        self.db.load(self.records)
+        self.queries = 0
+
+    def test_lookup(self):
+        """Prefetching the features of one record."""
+        old = self.records[-1]
+        self.assert_(len(old.features) > 100)
+        record = self.db.lookup(name=old.name, prefetch=True)
+        queries = self.queries
+        self.assert_(queries < 10)
+        self.assert_(compare_features(old.features, record.features))
+        self.assertEqual(self.queries, queries)
+        #Same as retrieving the features when first used
+        record = self.db.lookup(name=old.name)
+        self.assert_(compare_features(record.features, old.features))
+
+    def test_values(self):
+        """Prefetching the features of all the records."""
+        records = self.db.values(prefetch=True)
+        queries = self.queries
+        self.assertEqual(len(records), len(self.records))
+        names = dict([(record.name, record) for record in records])
+        for old in self.records:
+            self.assert_(compare_features(old.features,
+                                          names[old.name].features))
+        self.assertEqual(self.queries, queries)
+        #Features of a record without any
+        record = BioSeq.DBSeqRecord(self.server.adaptor, records[0]._primary_id)
+        BioSeq._prefetch_features([record])
+        self.assertEqual(len(record.features), len(records[0].features))
+
+class SeqCacheTest(QueryCountingTest):
+    """Read slices of a sequence through the chunk cache."""
+
+    def setUp(self):
+        filename = os.path.join(os.getcwd(), "GenBank", "NC_005816.gb")
+        self.record = SeqIO.read(open(filename, "rU"), "gb")
+        QueryCountingTest.setUp(self)
+        db = self.server.new_database("test_seq_cache")
+        db.load([self.record])
+        self.seq = db.lookup(name=self.record.name).seq
+        self.queries = 0
+
+    def test_windows(self):
+        """Taking many small windows of a sequence."""
+        text = str(self.record.seq)
+        self.assertEqual(self.queries, 0)
+        windows = [str(self.seq[i:i+50]) for i in range(0, len(text), 25)]
+        self.assertEqual(windows, [text[i:i+50] \
+                                   for i in range(0, len(text), 25)])
+        #The sequence fits in one chunk
+        self.assertEqual(self.queries, 1)
+        self.assertEqual(self.seq.cache.misses, 1)
+        self.assertEqual(str(self.seq[5:-5:3]), text[5:-5:3])
+        self.assertEqual(self.seq[-1], text[-1])
+        self.assertEqual(self.queries, 1)
+        self.assertEqual(self.seq.cache.misses, 1)
+        self.assertEqual(self.seq.cache.hits, len(windows) - 1 + 2)
+
+    def test_eviction(self):
+        """Dropping the least recently used chunks."""
+        text = str(self.record.seq)
+        cache = BioSeq.DBSeqCache(self.seq.adaptor, self.seq.primary_id,
+                                  chunk_size=1000, max_chunks=3)
+        seq = BioSeq.DBSeq(self.seq.primary_id, self.seq.adaptor,
+                           self.seq.alphabet, 0, len(self.seq), cache)
+        self.assertEqual(str(seq[990:2010]), text[990:2010])
+        self.assertEqual((cache.misses, len(cache), self.queries), (3, 3, 1))
+        self.assertEqual(seq[1500], text[1500])
+        self.assertEqual(str(seq[3000:3500][100:200]), text[3100:3200])
+        self.assertEqual((cache.evictions, len(cache)), (1, 3))
+        self.assertEqual(sorted(cache._chunks.keys()), [1, 2, 3])
+        #Too long for the cache
+        self.assertEqual(str(seq), text)
+        self.assertEqual((cache.misses, len(cache), self.queries), (5, 3, 3))
+        self.assertEqual(str(seq[1000:4000]), text[1000:4000])
+        self.assertEqual(self.queries, 3)
+        #Reading several missing chunks takes one query
+        cache.clear()
+        self.assertEqual(str(seq[2500:5500]), text[2500:5500])
+        self.assertEqual(self.queries, 4)
+        self.assertEqual(str(seq[9000:]), text[9000:])
+
+class PoolTest(unittest.TestCase):
+    """Share a pooled server between several threads."""
+
+    def setUp(self):
+        filename = os.path.join(os.getcwd(), "GenBank", "cor6_6.gb")
+        self.records = list(SeqIO.parse(open(filename, "rU"), "gb"))
+        self.server = BioSeqDatabase.open_database(driver = DBDRIVER,
+                                              user = DBUSER, passwd = DBPASSWD,
+                                              host = DBHOST, db = TESTDB,
+                                              pool_size = 3)
+        #Committed, so each test needs its own namespace
+        self.db = self.server.new_database("test_pool_%s" % self.id())
+        self.db.load(self.records)
+        self.server.commit()
+        self.server.release()
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_threads(self):
+        """Looking up records from several threads."""
+        import threading
+        errors = []
+        def work():
+            try:
+                for i in range(3):
+                    for old in self.records:
+                        new = self.db.lookup(name=old.name)
+                        self.assertEqual(str(new.seq), str(old.seq))
+                        self.assertEqual(len(new.features), len(old.features))
+                    self.server.release()
+            except Exception, err:
+                errors.append(err)
+        threads = [threading.Thread(target=work) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assert_(self.server.pool.created <= 3)
+        self.assertEqual(self.server.pool._in_use, {})
+
+    def test_timeout(self):
+        """Waiting for a free connection."""
+        import threading
+        pool = self.server.pool
+        pool.size = 1
+        pool.timeout = 0.1
+        self.db.adaptor.conn
+        errors = []
+        def work():
+            try:
+                self.db.lookup(name=self.records[0].name)
+            except RuntimeError, err:
+                errors.append(err)
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+        self.assertEqual(len(errors), 1)
+        #Connections held by finished threads are reclaimed
+        self.server.release()
+        thread = threading.Thread(target=self.db.get_all_primary_ids)
+        thread.start()
+        thread.join()
+        self.assertEqual(len(pool._in_use), 1)
+        self.assertEqual(len(self.db.get_all_primary_ids()),
+                         len(self.records))
+
+    def test_replace(self):
+        """Replacing broken and old connections."""
+        pool = self.server.pool
+        created = pool.created
+        pool.ping_after = 0
+        #Break the idle connection
+        pool._idle[0][0].close()
+        self.assertEqual(len(self.db.get_all_primary_ids()),
+                         len(self.records))
+        self.server.release()
+        self.assertEqual((pool.created, pool.replaced), (created + 1, 1))
+        pool.recycle = 0
+        self.db.get_all_primary_ids()
+        self.assertEqual((pool.created, pool.replaced), (created + 2, 2))
+
 #Some of the unit tests don't create their own database,
 #so just in case there is no database already:
 create_database()
@@ -0,0 +1,147 @@
+# Copyright 2026 by the Biopython contributors.  All rights reserved.
+# This code is part of the Biopython distribution and governed by its
+# license.  Please see the LICENSE file that should have been included
+# as part of this package.
+"""Tests for Bio.Blast.Parallel, using a stand in for BLAST."""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+from Bio.Blast.Applications import NcbiblastpCommandline, \
+     BlastallCommandline
+from Bio.Blast.Parallel import ParallelBlast
+
+fake_blast = '"%s" "%s"' % (sys.executable,
+                            os.path.abspath(os.path.join("Blast",
+                                                         "fake_blast.py")))
+
+def parse_table(handle):
+    for line in handle:
+        yield line.split()
+
+
+class ParallelBlastTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.query_file = os.path.join(self.tmp_dir, "queries.fasta")
+        self.names = ["query%i" % i for i in range(23)]
+        handle = open(self.query_file, "w")
+        for name in self.names:
+            handle.write(">%s test sequence %s\nMKV\nLLA\n" % (name, name))
+        handle.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def check_clean(self):
+        self.assertEqual(os.listdir(self.tmp_dir), ["queries.fasta"])
+
+    def test_xml(self):
+        "Running in parallel and parsing the XML output"
+        cline = NcbiblastpCommandline(cmd=fake_blast, db="nr", outfmt=5)
+        records = list(ParallelBlast(cline, self.query_file, num_workers=3,
+                                     tmp_dir=self.tmp_dir))
+        self.assertEqual([record.query_id for record in records], self.names)
+        self.assertEqual(records[5].query, "test sequence query5")
+        self.assertEqual(records[5].database, "nr")
+        self.check_clean()
+
+    def test_chunks(self):
+        "Running with more chunks than queries, or a single chunk"
+        cline = NcbiblastpCommandline(cmd=fake_blast, db="nr")
+        for num_chunks, num_workers in [(50, 4), (1, 2), (5, 1)]:
+            rows = list(ParallelBlast(cline, self.query_file, num_chunks,
+                                      num_workers, parse_table,
+                                      tmp_dir=self.tmp_dir))
+            self.assertEqual(rows, [[name, "nr"] for name in self.names])
+            self.check_clean()
+
+    def test_retries(self):
+        "Running chunks again which failed"
+        cline = NcbiblastpCommandline(cmd=fake_blast, db="fail_once")
+        rows = list(ParallelBlast(cline, self.query_file, parser=parse_table,
+                                  tmp_dir=self.tmp_dir))
+        self.assertEqual([row[0] for row in rows], self.names)
+        self.check_clean()
+        runner = ParallelBlast(cline, self.query_file, parser=parse_table,
+                               retries=0, tmp_dir=self.tmp_dir)
+        self.assertRaises(RuntimeError, list, runner)
+        self.check_clean()
+
+    def test_failure(self):
+        "Giving up on a chunk which keeps failing"
+        cline = NcbiblastpCommandline(cmd=fake_blast, db="fail")
+        runner = ParallelBlast(cline, self.query_file, parser=parse_table,
+                               retries=2, tmp_dir=self.tmp_dir)
+        try:
+            list(runner)
+            self.fail("Expected a RuntimeError")
+        except RuntimeError, err:
+            self.assertTrue("Simulated failure" in str(err))
+            self.assertTrue("after 3 attempts" in str(err))
+        self.check_clean()
+        self.assertRaises(ValueError, list, runner)
+
+    def test_not_started(self):
+        "Failing when the command can't be started"
+        def no_popen(*args, **kwargs):
+            raise OSError(2, "No such file or directory")
+        cline = NcbiblastpCommandline(cmd=fake_blast, db="nr")
+        runner = ParallelBlast(cline, self.query_file, parser=parse_table,
+                               tmp_dir=self.tmp_dir)
+        popen = subprocess.Popen
+        subprocess.Popen = no_popen
+        try:
+            try:
+                list(runner)
+                self.fail("Expected a RuntimeError")
+            except RuntimeError, err:
+                self.assertTrue("No such file or directory" in str(err))
+        finally:
+            subprocess.Popen = popen
+        self.check_clean()
+        self.assertRaises(ValueError, ParallelBlast, cline, self.query_file,
+                          retries=-1)
+
+    def test_parser_error(self):
+        "Closing the output file when the parser fails"
+        handles = []
+        def bad_parser(handle):
+            handles.append(handle)
+            raise ValueError("Bad output")
+        cline = NcbiblastpCommandline(cmd=fake_blast, db="nr")
+        runner = ParallelBlast(cline, self.query_file, parser=bad_parser,
+                               tmp_dir=self.tmp_dir)
+        self.assertRaises(ValueError, list, runner)
+        self.assertTrue(handles[0].closed)
+        self.check_clean()
+
+    def test_close(self):
+        "Stopping early and removing the temporary files"
+        cline = NcbiblastpCommandline(cmd=fake_blast, db="nr")
+        runner = ParallelBlast(cline, self.query_file, parser=parse_table,
+                               tmp_dir=self.tmp_dir)
+        iterator = iter(runner)
+        self.assertEqual(iterator.next(), ["query0", "nr"])
+        runner.close()
+        self.check_clean()
+
+    def test_options(self):
+        "Checking the command line options"
+        cline = BlastallCommandline(cmd=fake_blast, database="nr",
+                                    program="blastp")
+        runner = ParallelBlast(cline, self.query_file)
+        self.assertEqual(runner._input_name, "infile")
+        self.assertEqual(runner._output_name, "outfile")
+        from Bio.Blast.Applications import FastacmdCommandline
+        self.assertRaises(ValueError, ParallelBlast, FastacmdCommandline(),
+                          self.query_file)
+
+
+if __name__ == "__main__":
+    runner = unittest.TextTestRunner(verbosity = 2)
+    unittest.main(testRunner=runner)
@@ -4156,6 +4156,78 @@ class EFetchTest(unittest.TestCase):
         handle.close()
 
 
+class StreamingTest(unittest.TestCase):
+    '''Tests for parsing records one by one, keeping selected elements
+    '''
+    def test_records_early(self):
+        '''Test that parse returns each record once it has been read
+        '''
+        from Bio.Entrez import Parser
+        text = open('Entrez/pubmed2.xml').read()
+        end_first = text.index("</PubmedArticle>")
+        class Handle:
+            # Returns the file in small pieces, remembering how far it got
+            def __init__(self):
+                self.position = 0
+            def read(self, size):
+                size = min(size, 1000)
+                data = text[self.position:self.position + size]
+                self.position += len(data)
+                return data
+        handle = Handle()
+        iterator = Entrez.parse(handle)
+        record = iterator.next()
+        self.assertEqual(record["MedlineCitation"]["PMID"], "11748933")
+        self.assert_(handle.position < end_first + 1000)
+        record = iterator.next()
+        self.assertEqual(record["MedlineCitation"]["PMID"], "11700088")
+        self.assertRaises(StopIteration, iterator.next)
+
+    def test_keep_parse(self):
+        '''Test parsing PubMed records keeping only some elements
+        '''
+        keep = ["PubmedArticle/MedlineCitation/PMID",
+                "PubmedArticle/MedlineCitation/Article/ArticleTitle",
+                "PubmedArticle/MedlineCitation/DateCreated"]
+        handle = open('Entrez/pubmed2.xml')
+        records = list(Entrez.parse(handle, keep))
+        handle.close()
+        self.assertEqual(len(records), 2)
+        citation = records[1]["MedlineCitation"]
+        # Keys of the structure which can have several values are always
+        # present, but are empty lists here
+        self.assertEqual(sorted([key for key in citation if citation[key]]),
+                         ["Article", "DateCreated", "PMID"])
+        self.assertEqual(citation["PMID"], "11700088")
+        self.assertEqual(citation.attributes,
+                         {"Owner": "NLM", "Status": "PubMed-not-MEDLINE"})
+        article = citation["Article"]
+        self.assertEqual([key for key in article if article[key]],
+                         ["ArticleTitle"])
+        self.assertEqual(citation["Article"]["ArticleTitle"], "Proton MRI of (13)C distribution by J and chemical shift editing.")
+        self.assertEqual(citation["DateCreated"]["Year"], "2001")
+        self.assertEqual(records[1].keys(), ["MedlineCitation"])
+        # The same records without the keep option
+        handle = open('Entrez/pubmed2.xml')
+        full = list(Entrez.parse(handle))
+        handle.close()
+        self.assertEqual(full[1]["MedlineCitation"]["PMID"], "11700088")
+        self.assertEqual(full[1]["MedlineCitation"]["DateCreated"],
+                         citation["DateCreated"])
+        self.assert_("PubmedData" in full[1])
+
+    def test_keep_read(self):
+        '''Test reading an EInfo result keeping only some elements
+        '''
+        handle = open('Entrez/einfo2.xml')
+        record = Entrez.read(handle, ["DbInfo/DbName", "DbInfo/Count"])
+        handle.close()
+        self.assertEqual(record.keys(), ["DbInfo"])
+        self.assertEqual(sorted(record["DbInfo"].keys()), ["Count", "DbName"])
+        self.assertEqual(record["DbInfo"]["DbName"], "pubmed")
+        self.assertEqual(record["DbInfo"]["Count"], "17905967")
+
+
 if __name__ == '__main__':
     runner = unittest.TextTestRunner(verbosity = 2)
     unittest.main(testRunner=runner)
@@ -0,0 +1,151 @@
+# Copyright 2026 by the Biopython contributors.  All rights reserved.
+# This code is part of the Biopython distribution and governed by its
+# license.  Please see the LICENSE file that should have been included
+# as part of this package.
+"""Tests for Bio.Entrez.Cache, using a local stand in for NCBI."""
+
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+from Bio import Entrez
+from Bio.Entrez.Cache import ResponseCache
+from Bio.Entrez.Session import Session
+
+from test_Entrez_Session import FakeEntrezServer, FakeEntrezHandler
+
+url = "http://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = ResponseCache(os.path.join(self.directory, "cache"))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_get_put(self):
+        "Storing and retrieving replies"
+        params = {"db": "nucleotide", "id": "1", "email": "a@example.com"}
+        self.assertEqual(self.cache.get(url, params), None)
+        self.cache.put(url, params, "ACGT" * 1000)
+        #Parameter order, tool and email don't matter
+        same = {"id": "1", "db": "nucleotide", "tool": "biopython"}
+        self.assertEqual(self.cache.get(url, same), "ACGT" * 1000)
+        self.assertEqual(self.cache.get(url, {"db": "protein", "id": "1"}),
+                         None)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+        #Stored compressed
+        filename = self.cache.key(url, params)
+        self.assert_(os.path.getsize(filename) < 1000)
+
+    def test_ttl(self):
+        "Expiring old replies"
+        params = {"db": "nucleotide", "id": "1"}
+        self.cache.put(url, params, "old")
+        self.cache.ttl = 1000
+        self.assertEqual(self.cache.get(url, params), "old")
+        self.cache.ttl = 0
+        time.sleep(0.01)
+        self.assertEqual(self.cache.get(url, params), None)
+
+    def test_lru(self):
+        "Removing the least recently used replies"
+        self.cache.max_size = 2000
+        now = time.time()
+        for i in range(3):
+            self.cache.put(url, {"id": str(i)}, os.urandom(600))
+            #Make sure the files have different times
+            os.utime(self.cache.key(url, {"id": str(i)}),
+                     (now - 100 + i, now - 100 + i))
+        self.assertEqual(self.cache.evictions, 0)
+        self.assertNotEqual(self.cache.get(url, {"id": "0"}), None)
+        self.cache.put(url, {"id": "3"}, os.urandom(600))
+        self.assertEqual(self.cache.evictions, 1)
+        self.assertEqual(self.cache.get(url, {"id": "1"}), None)
+        for i in [0, 2, 3]:
+            self.assertNotEqual(self.cache.get(url, {"id": str(i)}), None)
+        self.cache.clear()
+        self.assertEqual(os.listdir(self.cache.directory), [])
+
+
+class CachedRequestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeEntrezServer(("127.0.0.1", 0), FakeEntrezHandler)
+        self.server.connections = 0
+        self.server.requests = []
+        self.server.failures = {}
+        self.server.posted = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+        self.url = "http://127.0.0.1:%i/eutils/" \
+                   % self.server.server_address[1]
+        self.directory = tempfile.mkdtemp()
+        self.email = Entrez.email
+        Entrez.email = "biopython-dev@biopython.org"
+        Entrez.cache = ResponseCache(self.directory)
+
+    def tearDown(self):
+        Entrez.cache = None
+        Entrez.email = self.email
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def test_open(self):
+        "Answering Bio.Entrez requests from the cache"
+        for i in range(3):
+            handle = Entrez._open(self.url + "efetch.fcgi", {"id": "1,2"})
+            self.assertEqual(handle.read(), ">1\n>2\n")
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual((Entrez.cache.hits, Entrez.cache.misses), (2, 1))
+        #Errors are not cached
+        for i in range(2):
+            self.assertRaises(IOError, Entrez._open, self.url + "efetch.fcgi",
+                              {"id": "1", "error": "y"})
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_session(self):
+        "Answering Session requests from the cache"
+        session = Session(rate=1000, base_url=self.url)
+        for i in range(3):
+            handle = session.efetch(db="nucleotide", id="7")
+            self.assertEqual(handle.read(), ">7\n")
+        self.assertEqual(len(self.server.requests), 1)
+        #EPost is never cached
+        session.epost("nucleotide", id="1,2")
+        session.epost("nucleotide", id="1,2")
+        self.assertEqual(len(self.server.requests), 3)
+        session.close()
+
+    def test_history(self):
+        "Not caching requests using the history server"
+        self.assertEqual(Entrez.cache.cacheable({"id": "1"}), True)
+        self.assertEqual(Entrez.cache.cacheable({"usehistory": "y"}), False)
+        self.assertEqual(Entrez.cache.cacheable({"WebEnv": "x"}), False)
+        for i in range(2):
+            handle = Entrez._open(self.url + "efetch.fcgi",
+                                  {"id": "1", "usehistory": "y"})
+            self.assertEqual(handle.read(), ">1\n")
+        self.assertEqual(len(self.server.requests), 2)
+        session = Session(rate=1000, base_url=self.url)
+        session.epost("nucleotide", id="1,2")
+        for i in range(2):
+            handle = session.efetch(db="nucleotide", WebEnv="X", query_key=1,
+                                    retstart=0, retmax=10)
+            self.assertEqual(handle.read(), ">1\nACGT\n>2\nACGT\n")
+        self.assertEqual(len(self.server.requests), 5)
+        self.assertEqual((Entrez.cache.hits, Entrez.cache.misses), (0, 0))
+        session.close()
+
+
+if __name__ == "__main__":
+    runner = unittest.TextTestRunner(verbosity = 2)
+    unittest.main(testRunner=runner)
@@ -0,0 +1,274 @@
+# Copyright 2026 by the Biopython contributors.  All rights reserved.
+# This code is part of the Biopython distribution and governed by its
+# license.  Please see the LICENSE file that should have been included
+# as part of this package.
+"""Tests for Bio.Entrez.Session, using a local stand in for NCBI."""
+
+import os
+import cgi
+import tempfile
+import time
+import threading
+import unittest
+import BaseHTTPServer
+import SocketServer
+
+from Bio import Entrez
+from Bio.Entrez.Session import Session, RateLimiter
+
+
+EPOST_RESULT = """<?xml version="1.0"?>
+<!DOCTYPE ePostResult PUBLIC "-//NLM//DTD ePostResult, 11 May 2002//EN" \
+"http://www.ncbi.nlm.nih.gov/entrez/query/DTD/ePost_020511.dtd">
+<ePostResult>
+<QueryKey>%i</QueryKey>
+<WebEnv>FAKE_WEBENV</WebEnv>
+</ePostResult>
+"""
+
+
+class FakeEntrezHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Answers epost and efetch, and can fail a few times first."""
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, text):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(text)))
+        self.end_headers()
+        self.wfile.write(text)
+
+    def answer(self, query):
+        params = cgi.parse_qs(query)
+        utility = self.path.split("?")[0].split("/")[-1]
+        self.server.requests.append((utility, params))
+        if "fail" in params:
+            key = params["fail"][0]
+            failed = self.server.failures.get(key, 0)
+            if failed < int(params["times"][0]):
+                self.server.failures[key] = failed + 1
+                self.reply(503, "Busy")
+                return
+        if "error" in params:
+            self.reply(200, "Error: Your session has expired.\n")
+        elif utility == "epost.fcgi":
+            self.server.posted.append(params["id"][0].split(","))
+            self.reply(200, EPOST_RESULT % len(self.server.posted))
+        elif utility == "efetch.fcgi" and "WebEnv" in params:
+            ids = self.server.posted[int(params["query_key"][0]) - 1]
+            start = int(params["retstart"][0])
+            ids = ids[start:start + int(params["retmax"][0])]
+            self.reply(200, "".join([">%s\nACGT\n" % identifier
+                                     for identifier in ids]))
+        elif utility == "efetch.fcgi":
+            self.reply(200, "".join([">%s\n" % identifier for identifier
+                                     in params["id"][0].split(",")]))
+        else:
+            self.reply(404, "Not found")
+
+    def do_GET(self):
+        self.answer(self.path.split("?", 1)[1])
+
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        self.answer(self.rfile.read(length))
+
+
+class FakeEntrezServer(SocketServer.ThreadingMixIn,
+                       BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeEntrezServer(("127.0.0.1", 0), FakeEntrezHandler)
+        self.server.connections = 0
+        self.server.requests = []
+        self.server.failures = {}
+        self.server.posted = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+        url = "http://127.0.0.1:%i/eutils/" % self.server.server_address[1]
+        self.session = Session(rate=1000, backoff=0.01, base_url=url)
+        self.email = Entrez.email
+        Entrez.email = "biopython-dev@biopython.org"
+        self.checkpoint = None
+
+    def tearDown(self):
+        if self.checkpoint and os.path.isfile(self.checkpoint):
+            os.remove(self.checkpoint)
+        self.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+        Entrez.email = self.email
+
+    def test_keep_alive(self):
+        "Reusing one connection for several requests"
+        for i in range(5):
+            handle = self.session.efetch(db="nucleotide", id=str(i))
+            self.assertEqual(handle.read(), ">%i\n" % i)
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(self.session.connections, 1)
+        utility, params = self.server.requests[0]
+        self.assertEqual(utility, "efetch.fcgi")
+        self.assertEqual(params["db"], ["nucleotide"])
+        self.assertEqual(params["tool"], ["biopython"])
+        self.assertEqual(params["email"], ["biopython-dev@biopython.org"])
+
+    def test_post(self):
+        "Sending a request with HTTP POST"
+        handle = self.session.open("efetch", {"id": "1,2,3"}, post=True)
+        self.assertEqual(handle.read(), ">1\n>2\n>3\n")
+
+    def test_closed_connection(self):
+        "Reconnecting when the server closed an idle connection"
+        self.session.efetch(db="nucleotide", id="1").read()
+        for connections in self.session._idle.values():
+            for connection in connections:
+                connection.sock.close()
+        handle = self.session.efetch(db="nucleotide", id="2")
+        self.assertEqual(handle.read(), ">2\n")
+        self.assertEqual(self.session.connections, 2)
+        self.assertEqual(self.session.retried, 0)
+
+    def test_retry(self):
+        "Retrying after a server error"
+        handle = self.session.efetch(db="nucleotide", id="1",
+                                     fail="a", times=2)
+        self.assertEqual(handle.read(), ">1\n")
+        self.assertEqual(self.session.retried, 2)
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertRaises(IOError, self.session.efetch,
+                          db="nucleotide", id="1", fail="b", times=10)
+        self.assertEqual(len(self.server.requests), 3 + 4)
+
+    def test_errors(self):
+        "Reporting error pages and bad requests"
+        self.assertRaises(IOError, self.session.efetch,
+                          db="nucleotide", id="1", error="y")
+        self.assertRaises(IOError, self.session.esearch,
+                          db="nucleotide", term="Opuntia")
+        self.assertEqual(self.session.retried, 0)
+
+    def test_batch(self):
+        "Running requests in several threads"
+        calls = [("efetch", {"db": "protein", "id": str(i)})
+                 for i in range(20)]
+        results = self.session.batch(calls, num_threads=4,
+                                     parser=lambda handle: handle.read())
+        self.assertEqual(results, [">%i\n" % i for i in range(20)])
+        self.assert_(self.session.connections <= 4)
+        calls[7] = ("esearch", {"db": "protein", "term": "x"})
+        self.assertRaises(IOError, self.session.batch, calls)
+
+    def test_efetch_records(self):
+        "Fetching records in batches from the history server"
+        ids = ["id%i" % i for i in range(25)]
+        records = list(self.session.efetch_records("nucleotide", ids,
+                                                   rettype="fasta",
+                                                   batch_size=4, post_size=10))
+        self.assertEqual([record.id for record in records], ids)
+        self.assertEqual(str(records[0].seq), "ACGT")
+        self.assertEqual(self.server.posted,
+                         [ids[:10], ids[10:20], ids[20:]])
+        fetches = [params for utility, params in self.server.requests
+                   if utility == "efetch.fcgi"]
+        self.assertEqual(len(fetches), 3 + 3 + 2)
+        self.assertEqual(fetches[3]["query_key"], ["2"])
+        self.assertEqual(fetches[3]["retstart"], ["0"])
+        self.assertEqual(fetches[4]["retstart"], ["4"])
+        self.assertEqual(fetches[3]["WebEnv"], ["FAKE_WEBENV"])
+        self.assertEqual(fetches[3]["rettype"], ["fasta"])
+
+    def test_efetch_history(self):
+        "Fetching the records of an earlier post"
+        self.server.posted.append(["a", "b", "c", "d", "e"])
+        records = self.session.efetch_records("nucleotide",
+                                              webenv="FAKE_WEBENV",
+                                              query_key=1, count=5,
+                                              rettype="fasta", batch_size=2)
+        self.assertEqual([record.id for record in records],
+                         ["a", "b", "c", "d", "e"])
+        self.assertRaises(ValueError, self.session.efetch_records,
+                          "nucleotide", webenv="FAKE_WEBENV", rettype="fasta")
+
+    def test_efetch_checkpoint(self):
+        "Resuming a download from a checkpoint"
+        handle, self.checkpoint = tempfile.mkstemp()
+        os.close(handle)
+        os.remove(self.checkpoint)
+        ids = ["id%i" % i for i in range(10)]
+        done = []
+        records = self.session.efetch_records("nucleotide", ids,
+                                              rettype="fasta", batch_size=3,
+                                              parser=self.parse_failing,
+                                              checkpoint=self.checkpoint)
+        self.assertRaises(ValueError, done.extend, records)
+        #The record before the failure was returned, but not its batch
+        self.assertEqual([record.id for record in done], ids[:7])
+        self.assertEqual(open(self.checkpoint).read(), "6\n")
+        records = self.session.efetch_records("nucleotide", ids,
+                                              rettype="fasta", batch_size=3,
+                                              checkpoint=self.checkpoint)
+        self.assertEqual([record.id for record in records], ids[6:])
+        self.assertEqual(self.server.posted[-1], ids[6:])
+        self.assertEqual(open(self.checkpoint).read(), "10\n")
+        records = self.session.efetch_records("nucleotide", ids,
+                                              rettype="fasta",
+                                              checkpoint=self.checkpoint)
+        self.assertEqual(list(records), [])
+
+    def parse_failing(self, handle):
+        """Yield the FASTA records, failing in the third batch."""
+        from Bio import SeqIO
+        for record in SeqIO.parse(handle, "fasta"):
+            if record.id == "id7":
+                raise ValueError("Parser failure")
+            yield record
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def test_rate(self):
+        "Spacing requests from several threads"
+        limiter = RateLimiter(50)
+        times = []
+        def work():
+            for i in range(5):
+                limiter.wait()
+                times.append(time.time())
+        threads = [threading.Thread(target=work) for i in range(4)]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        #The first request is immediate, then one every 1/50 seconds
+        self.assert_(time.time() - start >= 19 / 50.0 - 0.01)
+        times.sort()
+        gaps = [b - a for a, b in zip(times[:-1], times[1:])]
+        self.assert_(sum(gaps) / len(gaps) >= 0.9 / 50)
+
+    def test_pause(self):
+        "Holding off requests after a failure"
+        limiter = RateLimiter(100)
+        limiter.wait()
+        limiter.pause(0.2)
+        start = time.time()
+        limiter.wait()
+        self.assert_(time.time() - start >= 0.15)
+
+
+if __name__ == "__main__":
+    runner = unittest.TextTestRunner(verbosity = 2)
+    unittest.main(testRunner=runner)
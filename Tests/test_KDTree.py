@@ -19,3 +19,8 @@ radius=0.01
 for i in range(0, 10):
     _neighbor_test(nr_points, dim, bucket_size, radius)
     _test(nr_points, dim, bucket_size, radius)
+
+from Bio.KDTree.KDTree import _batch_test
+
+for i in range(0, 5):
+    _batch_test(nr_points, dim, bucket_size, 0.1, 5)
@@ -5,7 +5,8 @@
 
 import os
 import unittest
-from Bio.Blast import NCBIXML
+import tempfile
+from Bio.Blast import NCBIXML, ParseBlastTable
 
 E_VALUE_THRESH = 1e-10
 
@@ -1818,6 +1819,208 @@ class TestNCBIXML(unittest.TestCase):
         #<Iteration_message>CONVERGED</Iteration_message>
         self.assertRaises(StopIteration, records.next)
 
+    def test_max_evalue(self):
+        "Parsing BLASTP 2.2.18, dropping HSPs above an e-value (xbt011)"
+        datafile = os.path.join("Blast", "xbt011.xml")
+        all_records = list(NCBIXML.parse(open(datafile)))
+        records = list(NCBIXML.parse(open(datafile), max_evalue=E_VALUE_THRESH))
+        self.assertEqual(len(records), 3)
+        for record, all_record in zip(records, all_records):
+            expected = [a.hit_id for a in all_record.alignments
+                        if [h for h in a.hsps if h.expect <= E_VALUE_THRESH]]
+            self.assertEqual([a.hit_id for a in record.alignments], expected)
+            self.assertEqual(len(record.descriptions), len(expected))
+            for alignment in record.alignments:
+                for hsp in alignment.hsps:
+                    self.assert_(hsp.expect <= E_VALUE_THRESH)
+        self.assertEqual(len(records[0].alignments), 2)
+
+    def test_parse_hsps(self):
+        "Parsing HSPs as tuples (xbt009, xbt011)"
+        for filename in ["xbt009.xml", "xbt011.xml"]:
+            datafile = os.path.join("Blast", filename)
+            expected = []
+            for record in NCBIXML.parse(open(datafile)):
+                for alignment in record.alignments:
+                    for hsp in alignment.hsps:
+                        expected.append((record.query_id, record.query,
+                                         alignment.hit_id, alignment.hit_def,
+                                         hsp.expect, hsp.bits, hsp.score,
+                                         hsp.align_length, hsp.query_start,
+                                         hsp.query_end, hsp.sbjct_start,
+                                         hsp.sbjct_end))
+            hsps = list(NCBIXML.parse_hsps(open(datafile)))
+            self.assertEqual(len(hsps), len(expected))
+            for hsp in hsps:
+                self.assertEqual(len(hsp), len(NCBIXML.HSP_FIELDS))
+            self.assertEqual([hsp[:7] + hsp[10:] for hsp in hsps], expected)
+        hsps = list(NCBIXML.parse_hsps(open(datafile), E_VALUE_THRESH))
+        self.assertEqual(len(hsps), 2 + 2 + 4)
+        hsp = hsps[0]
+        self.assertEqual(hsp[NCBIXML.HSP_FIELDS.index("identities")], 131)
+        self.assertEqual(hsp[NCBIXML.HSP_FIELDS.index("expect")], 4.72196e-70)
+
+    def test_concatenated(self):
+        "Parsing several concatenated XML files (xbt002, xbt006)"
+        text = open(os.path.join("Blast", "xbt002.xml")).read() \
+             + open(os.path.join("Blast", "xbt006.xml")).read()
+        from StringIO import StringIO
+        records = list(NCBIXML.parse(StringIO(text)))
+        self.assertEqual(len(records), 2)
+        self.assertEqual(len(records[1].alignments), 10)
+        self.assertEqual(len(list(NCBIXML.parse_hsps(StringIO(text)))), 2 + 14)
+
+
+
+class TestIndex(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.index_filename = tempfile.mkstemp(".idx")
+        os.close(handle)
+        os.remove(self.index_filename)
+
+    def tearDown(self):
+        if os.path.isfile(self.index_filename):
+            os.remove(self.index_filename)
+
+    def compare(self, record, old):
+        self.assertEqual(record.query, old.query)
+        self.assertEqual(record.query_id, old.query_id)
+        self.assertEqual(record.query_letters, old.query_letters)
+        self.assertEqual(record.database, old.database)
+        self.assertEqual(len(record.alignments), len(old.alignments))
+        for alignment, old_alignment in zip(record.alignments,
+                                            old.alignments):
+            self.assertEqual(alignment.hit_id, old_alignment.hit_id)
+            self.assertEqual([(hsp.expect, hsp.query, hsp.sbjct)
+                              for hsp in alignment.hsps],
+                             [(hsp.expect, hsp.query, hsp.sbjct)
+                              for hsp in old_alignment.hsps])
+
+    def test_xml(self):
+        "Indexing XML output (xbt010)"
+        datafile = os.path.join("Blast", "xbt010.xml")
+        records = list(NCBIXML.parse(open(datafile)))
+        index = NCBIXML.index(datafile)
+        self.assertEqual(sorted(index.keys()), ["1", "2", "3", "4"])
+        for old in records[::-1]:
+            self.compare(index[old.query_id], old)
+        self.assertEqual(index["2"].query_letters, 304)
+        self.assertEqual(index.get("5"), None)
+        self.assertRaises(NotImplementedError, index.values)
+        index = NCBIXML.index(datafile, lambda name : "query" + name)
+        self.assertEqual(sorted(index.keys()),
+                         ["query1", "query2", "query3", "query4"])
+        self.compare(index["query3"], records[2])
+
+    def test_xml_concatenated(self):
+        "Indexing concatenated XML output (xbt002, xbt006)"
+        datafile = os.path.join("Blast", "xbt002.xml")
+        records = list(NCBIXML.parse(open(datafile))) \
+                + list(NCBIXML.parse(open(os.path.join("Blast",
+                                                      "xbt006.xml"))))
+        handle = open(self.index_filename, "w")
+        handle.write(open(datafile).read())
+        handle.write(open(os.path.join("Blast", "xbt006.xml")).read())
+        handle.close()
+        index = NCBIXML.index(self.index_filename)
+        self.assertEqual(len(index), 2)
+        for old in records:
+            self.compare(index[old.query_id], old)
+
+    def test_xml_duplicates(self):
+        "Indexing XML output with several rounds per query (xbt011)"
+        self.assertRaises(ValueError, NCBIXML.index,
+                          os.path.join("Blast", "xbt011.xml"))
+
+    def test_index_file(self):
+        "Saving and reusing an index file (xbt009)"
+        datafile = os.path.join("Blast", "xbt009.xml")
+        index = NCBIXML.index(datafile, index_filename=self.index_filename)
+        self.assertTrue(os.path.isfile(self.index_filename))
+        offsets = dict((key, index.get_offset(key)) for key in index)
+        self.assertEqual(len(offsets), 7)
+        #Change the saved index, to check that it is used
+        lines = open(self.index_filename).readlines()
+        handle = open(self.index_filename, "w")
+        handle.write(lines[0])
+        for line in lines[1:]:
+            handle.write("saved_" + line)
+        handle.close()
+        index = NCBIXML.index(datafile, index_filename=self.index_filename)
+        for key in offsets:
+            self.assertEqual(index.get_offset("saved_" + key), offsets[key])
+            self.assertEqual(index["saved_" + key].query_id, key)
+        #An index file for another file is not used (but replaced)
+        datafile = os.path.join("Blast", "xbt010.xml")
+        index = NCBIXML.index(datafile, index_filename=self.index_filename)
+        self.assertEqual(sorted(index.keys()), ["1", "2", "3", "4"])
+        index = NCBIXML.index(datafile, index_filename=self.index_filename)
+        self.assertEqual(sorted(index.keys()), ["1", "2", "3", "4"])
+
+    def test_table(self):
+        "Indexing tabular output (tab001)"
+        datafile = os.path.join("Blast", "tab001.txt")
+        index = ParseBlastTable.index(datafile)
+        self.assertEqual(sorted(index.keys()),
+                         ["gi|11464971:4-101",
+                          "gi|16080617|ref|NP_391444.1|",
+                          "gi|6273291|gb|AF191665.1|AF191665"])
+        record = index["gi|16080617|ref|NP_391444.1|"]
+        self.assertEqual(record.program, "BLASTP")
+        self.assertEqual(record.database, "nr")
+        self.assertEqual(len(record.entries), 3)
+        self.assertEqual(record.entries[2].e_value, 1e-79)
+        self.assertEqual(len(index["gi|11464971:4-101"].entries), 0)
+        record = index["gi|6273291|gb|AF191665.1|AF191665"]
+        self.assertEqual(record.query[1:], ["Opuntia", "marenae", "rpl16",
+                                            "gene"])
+        self.assertEqual([entry.sid[1] for entry in record.entries],
+                         ["6273290", "6273289"])
+
+    def test_table_blast_plus(self):
+        "Indexing BLAST+ -outfmt 7 tabular output (tab002)"
+        datafile = os.path.join("Blast", "tab002.txt")
+        index = ParseBlastTable.index(datafile)
+        #The final "# BLAST processed 3 queries" line is not a query
+        self.assertEqual(sorted(index.keys()),
+                         ["gi|11464971:4-101",
+                          "gi|16080617|ref|NP_391444.1|",
+                          "gi|6273291|gb|AF191665.1|AF191665"])
+        record = index["gi|16080617|ref|NP_391444.1|"]
+        self.assertEqual((record.program, record.version, record.date),
+                         ("BLASTP", "2.2.22+", None))
+        self.assertEqual(len(record.entries), 3)
+        self.assertEqual(record.entries[2].e_value, 1e-79)
+        record = index["gi|11464971:4-101"]
+        self.assertEqual(record.database, "nr")
+        self.assertEqual(len(record.entries), 0)
+        record = index["gi|6273291|gb|AF191665.1|AF191665"]
+        self.assertEqual([entry.sid[1] for entry in record.entries],
+                         ["6273290", "6273289"])
+        #Reading the whole file gives the same records
+        handle = open(datafile)
+        reader = ParseBlastTable.BlastTableReader(handle)
+        records = [reader.next() for i in range(3)]
+        self.assertEqual(reader.next(), None)
+        handle.close()
+        self.assertEqual([len(r.entries) for r in records], [3, 0, 2])
+
+    def test_plain_table(self):
+        "Indexing tabular output without comment lines"
+        handle = open(self.index_filename, "w")
+        for line in open(os.path.join("Blast", "tab001.txt")):
+            if not line.startswith("#"):
+                handle.write(line)
+        handle.close()
+        index = ParseBlastTable.index(self.index_filename)
+        self.assertEqual(len(index), 2)
+        record = index["gi|16080617|ref|NP_391444.1|"]
+        self.assertEqual(record.query, ["gi|16080617|ref|NP_391444.1|"])
+        self.assertEqual(len(record.entries), 3)
+        self.assertEqual(len(index["gi|6273291|gb|AF191665.1|AF191665"].entries),
+                         2)
+
 
 if __name__ == "__main__":
     runner = unittest.TextTestRunner(verbosity = 2)
@@ -9,10 +9,23 @@
 # as part of this package.
 
 """Unit tests for the Bio.PDB module."""
+import os
+import sys
+import gzip
+import shutil
+import tempfile
+import threading
+import time
 import unittest
 import warnings
+from math import pi
+import BaseHTTPServer
+import SocketServer
+from StringIO import StringIO
 
 try:
+    import numpy
+    from numpy import isnan
     from numpy.random import random
 except ImportError:
     from Bio import MissingExternalDependencyError
@@ -21,10 +34,20 @@ except ImportError:
 
 from Bio.Seq import Seq
 from Bio.Alphabet import generic_protein
-from Bio.PDB import PDBParser, PPBuilder, CaPPBuilder
+from Bio.PDB import PDBParser, PPBuilder, CaPPBuilder, is_aa
 from Bio.PDB import HSExposureCA, HSExposureCB, ExposureCN
+from Bio.PDB import calc_angle, calc_dihedral
 from Bio.PDB.NeighborSearch import NeighborSearch
+from Bio.PDB.ResidueDepth import min_dist, min_dists, residue_depth, ca_depth
+from Bio.PDB.ResidueDepth import residue_depths
+from Bio.PDB.MMCIF2Dict import MMCIF2Dict, MMCIFTokenizer, get_loop_arrays
+from Bio.PDB.MMCIFParser import MMCIFParser
+from Bio.PDB.PDBList import PDBList, _open_connection
+from Bio.PDB.EnsembleRMSD import get_coord_stack, rmsd_matrix, rmsd_rows
+from Bio.PDB.EnsembleRMSD import rmsd_to_reference
+from Bio.SVDSuperimposer import SVDSuperimposer
 from Bio.PDB.PDBExceptions import PDBConstructionException, PDBConstructionWarning
+from Bio.PDB.PDBExceptions import PDBException
 
 class PDBNeighborTest(unittest.TestCase):
     def setUp(self):
@@ -45,6 +68,70 @@ class PDBNeighborTest(unittest.TestCase):
             ns = NeighborSearch(atoms)
             hits = ns.search_all(5.0)
             self.assert_(hits >= 0)
+
+    def test_neighbor_search_grid(self):
+        """NeighborSearch: Compare the KD tree and grid backends."""
+        class RandomAtom:
+            def __init__(self):
+                self.coord = 100 * random(3)
+            def get_coord(self):
+                return self.coord
+        atoms = [RandomAtom() for j in range(500)]
+        centers = 100 * random((50, 3))
+        kd_ns = NeighborSearch(atoms)
+        grid_ns = NeighborSearch(atoms, cell_size=4.0)
+        kd_indptr, kd_indices = kd_ns.search_batch(centers, 10.0)
+        grid_indptr, grid_indices = grid_ns.search_batch(centers, 10.0)
+        self.assertEqual(list(kd_indptr), list(grid_indptr))
+        self.assertEqual(list(kd_indices), list(grid_indices))
+        for i in range(len(centers)):
+            found = [atoms[j] for j in kd_indices[kd_indptr[i]:kd_indptr[i+1]]]
+            expected = [a for a in atoms
+                        if sum((a.coord - centers[i]) ** 2) <= 100.0]
+            self.assertEqual(found, expected)
+        kd_pairs = kd_ns.search_all(10.0)
+        grid_pairs = grid_ns.search_all(10.0)
+        self.assertEqual(len(kd_pairs), len(grid_pairs))
+
+    def test_neighbor_search_many_parents(self):
+        """NeighborSearch: Pairs of parents when n*n passes 2**31."""
+        class Parent:
+            pass
+        class ChildAtom:
+            def __init__(self, coord, parent):
+                self.coord = coord
+                self.parent = parent
+            def get_coord(self):
+                return self.coord
+            def get_parent(self):
+                return self.parent
+        # 50000 parents with one atom each, on a line 1A apart, and
+        # spread over a sparse grid of more than 2**31 cells
+        n = 50000
+        coords = numpy.zeros((n, 3))
+        coords[:, 0] = numpy.arange(n)
+        coords[-1] = (n, 20000.0, 20000.0)
+        atoms = [ChildAtom(coord, Parent()) for coord in coords]
+        ns = NeighborSearch(atoms, cell_size=1.5)
+        pairs = ns.search_all(1.1, "R")
+        self.assertEqual(len(pairs), n - 2)
+        self.assert_((atoms[-3].parent, atoms[-2].parent) in pairs
+                     or (atoms[-2].parent, atoms[-3].parent) in pairs)
+
+    def test_neighbor_search_periodic(self):
+        """NeighborSearch: Grid search in a periodic box."""
+        class FixedAtom:
+            def __init__(self, coord):
+                self.coord = coord
+            def get_coord(self):
+                return self.coord
+        atoms = [FixedAtom((0.5, 5.0, 5.0)), FixedAtom((9.5, 5.0, 5.0)),
+                 FixedAtom((5.0, 5.0, 5.0))]
+        ns = NeighborSearch(atoms, cell_size=2.0, box=(10.0, 10.0, 10.0))
+        self.assertEqual(len(ns.search_all(1.5)), 1)
+        self.assertEqual(ns.search((0.0, 5.0, 5.0), 1.0), atoms[:2])
+        self.assertRaises(PDBException, NeighborSearch, atoms,
+                          box=(10.0, 10.0, 10.0))
  
  
 class PDBExceptionTest(unittest.TestCase):
@@ -66,6 +153,36 @@ class PDBParseTest(unittest.TestCase):
         p = PDBParser(PERMISSIVE=1)
         self.structure = p.get_structure("example", "PDB/a_structure.pdb")
  
+    def test_backbone_angles(self):
+        """Compare array and Vector based backbone angles."""
+        pp = PPBuilder().build_peptides(self.structure[1])[0]
+        phi_psi = pp.get_phi_psi_array()
+        self.assertEqual(phi_psi.shape, (len(pp), 2))
+        self.assert_(isnan(phi_psi[0, 0]))
+        self.assert_(isnan(phi_psi[-1, 1]))
+        for i in range(1, len(pp) - 1):
+            n = pp[i]["N"].get_vector()
+            ca = pp[i]["CA"].get_vector()
+            c = pp[i]["C"].get_vector()
+            phi = calc_dihedral(pp[i-1]["C"].get_vector(), n, ca, c)
+            psi = calc_dihedral(n, ca, c, pp[i+1]["N"].get_vector())
+            self.assertAlmostEqual(phi_psi[i, 0], phi)
+            self.assertAlmostEqual(phi_psi[i, 1], psi)
+        phi_psi_list = pp.get_phi_psi_list()
+        self.assertEqual(phi_psi_list[0][0], None)
+        self.assertEqual(phi_psi_list[-1][1], None)
+        self.assertAlmostEqual(phi_psi_list[1][1], phi_psi[1, 1])
+        self.assertAlmostEqual(pp[1].xtra["PSI"], phi_psi[1, 1])
+        ca = [res["CA"].get_vector() for res in pp]
+        tau = pp.get_tau_array()
+        self.assertEqual(len(tau), len(pp) - 3)
+        self.assertAlmostEqual(tau[5], calc_dihedral(*ca[5:9]))
+        self.assertEqual(list(tau), pp.get_tau_list())
+        theta = pp.get_theta_array()
+        self.assertEqual(len(theta), len(pp) - 2)
+        self.assertAlmostEqual(theta[5], calc_angle(*ca[5:8]))
+        self.assertEqual(list(theta), pp.get_theta_list())
+
     def test_c_n(self):
         """Extract polypeptides using C-N."""
         ppbuild = PPBuilder()
@@ -492,6 +609,98 @@ class Exposure(unittest.TestCase):
         self.assertEqual(1, len(residues[-1].xtra))
         self.assertEqual(38, residues[-1].xtra["EXP_CN"])
 
+    def pairwise_exposure(self, model, radius, offset, hse=None):
+        """Count the CA atoms around each residue pair by pair.
+
+        Without hse this is the coordination number, else the upper
+        and lower half sphere counts using its pseudo CB vectors.
+        """
+        ppl = CaPPBuilder().build_peptides(model)
+        values = {}
+        for pp1 in ppl:
+            for i in range(len(pp1)):
+                r2 = pp1[i]
+                if hse is None:
+                    if not is_aa(r2) or not r2.has_id("CA"):
+                        continue
+                    pcb = None
+                else:
+                    r1 = r3 = None
+                    if i > 0:
+                        r1 = pp1[i-1]
+                    if i < len(pp1) - 1:
+                        r3 = pp1[i+1]
+                    result = hse._get_cb(r1, r2, r3)
+                    if result is None:
+                        continue
+                    pcb = result[0]
+                up = down = 0
+                ca2 = r2["CA"].get_vector()
+                for pp2 in ppl:
+                    for j in range(len(pp2)):
+                        if pp1 is pp2 and abs(i - j) <= offset:
+                            continue
+                        ro = pp2[j]
+                        if not is_aa(ro) or not ro.has_id("CA"):
+                            continue
+                        d = ro["CA"].get_vector() - ca2
+                        if d.norm() < radius:
+                            if pcb is not None and d.angle(pcb) >= pi/2:
+                                down += 1
+                            else:
+                                up += 1
+                key = (r2.get_parent().get_id(), r2.get_id())
+                if hse is None:
+                    values[key] = up
+                else:
+                    values[key] = (up, down)
+        return values
+
+    def test_batch_against_pairwise(self):
+        """Compare batch and pairwise exposure on two chains."""
+        # Add a shifted copy of chain A as chain C, close enough
+        # for the two chains to be neighbors
+        pdb_filename = "PDB/a_structure.pdb"
+        copy = PDBParser(PERMISSIVE=True).get_structure('Y', pdb_filename)
+        chain = copy[1]["A"]
+        chain.detach_parent()
+        chain.id = "C"
+        for atom in chain.get_atoms():
+            atom.transform(numpy.identity(3), numpy.array((10.0, 4.0, 2.0)))
+        self.model.add(chain)
+        for offset in (0, 3):
+            cn = ExposureCN(self.model, self.radius, offset)
+            values = self.pairwise_exposure(self.model, self.radius, offset)
+            self.assertEqual(sorted(values.keys()), sorted(cn.keys()))
+            self.assertEqual(85, len([k for k in cn.keys() if k[0] == "C"]))
+            for key in cn.keys():
+                self.assertEqual(values[key], cn[key])
+            for hse_class in (HSExposureCA, HSExposureCB):
+                hse = hse_class(self.model, self.radius, offset)
+                values = self.pairwise_exposure(self.model, self.radius,
+                                                offset, hse)
+                self.assertEqual(sorted(values.keys()), sorted(hse.keys()))
+                for key in hse.keys():
+                    self.assertEqual(values[key], hse[key][:2])
+
+    def test_residue_depths(self):
+        """Compare batch and per residue depths on a random surface."""
+        residues = self.a_residues
+        coords = [a.get_coord() for r in residues for a in r.get_unpacked_list()]
+        # random vertices around the atoms, more than the sample size
+        surface = coords[0] - 10 + (numpy.array(coords).ptp(0) + 20) \
+                  * random((3000, 3))
+        dists = min_dists(coords, surface)
+        for i in range(0, len(coords), 50):
+            self.assertAlmostEqual(dists[i], min_dist(coords[i], surface), 6)
+        rd, ca_rd = residue_depths(residues, surface)
+        for i in range(len(residues)):
+            self.assertAlmostEqual(rd[i], residue_depth(residues[i], surface), 6)
+            if residues[i].has_id("CA"):
+                self.assertAlmostEqual(ca_rd[i], ca_depth(residues[i], surface), 6)
+            else:
+                self.assert_(isnan(ca_rd[i]))
+
 class AssortedMisc(unittest.TestCase):
     "Testing with real PDB files."
 
@@ -591,6 +800,357 @@ class AssortedMisc(unittest.TestCase):
                          "O O O O O O O O O O O O O O O O O O O O O")
 
 
+MMCIF_EXAMPLE = """data_TEST
+# a comment
+_entry.id   TEST
+_struct.title
+;A multi-line
+title
+;
+_cell.length_a 10.0
+_cell.length_b 20.0
+_cell.length_c 30.0
+_cell.angle_alpha 90.0
+_cell.angle_beta 90.0
+_cell.angle_gamma 90.0
+_symmetry.space_group_name_H-M 'P 1'
+loop_
+_entity_poly.entity_id
+_entity_poly.type
+1 'polypeptide(L)'
+loop_
+_atom_site.group_PDB
+_atom_site.id
+_atom_site.label_atom_id
+_atom_site.label_alt_id
+_atom_site.label_comp_id
+_atom_site.label_asym_id
+_atom_site.label_seq_id
+_atom_site.Cartn_x
+_atom_site.Cartn_y
+_atom_site.Cartn_z
+_atom_site.occupancy
+_atom_site.B_iso_or_equiv
+ATOM   1 N  . GLY A 1 1.000 2.000 3.000 1.00 10.00
+ATOM   2 CA . GLY A 1 2.000 2.000 3.000 1.00 11.00
+ATOM   3 N  . ALA A 2 3.000 2.000 3.000 1.00 12.00
+HETATM 4 O  . HOH B 3 9.000 9.000 9.000 0.50 20.00
+"""
+
+class EnsembleRMSDTest(unittest.TestCase):
+    def setUp(self):
+        warnings.resetwarnings()
+        warnings.simplefilter('ignore', PDBConstructionWarning)
+        structure = PDBParser().get_structure("example", "PDB/1A8O.pdb")
+        ca_atoms = [a for a in structure.get_atoms() if a.get_id() == "CA"]
+        self.ca_atoms = ca_atoms
+        coords = get_coord_stack([ca_atoms])[0]
+        # rotated and translated copies of the CA trace with noise
+        self.coords = numpy.zeros((12,) + coords.shape, "d")
+        for i in range(12):
+            angle = 0.5 * i
+            rot = numpy.array([[numpy.cos(angle), -numpy.sin(angle), 0],
+                               [numpy.sin(angle), numpy.cos(angle), 0],
+                               [0, 0, 1]])
+            noise = 0.3 * i * (random(coords.shape) - 0.5)
+            self.coords[i] = numpy.dot(coords + noise, rot) + i
+        self.coords[11] = self.coords[5]
+
+    def test_rmsd_matrix(self):
+        """Compare the RMSD matrix with SVDSuperimposer."""
+        matrix = rmsd_matrix(self.coords)
+        self.assertEqual(matrix.shape, (12, 12))
+        sup = SVDSuperimposer()
+        for i in range(12):
+            self.assertEqual(matrix[i, i], 0.0)
+            for j in range(i):
+                sup.set(self.coords[i], self.coords[j])
+                sup.run()
+                self.assertAlmostEqual(matrix[i, j], sup.get_rms(), 5)
+                self.assertEqual(matrix[i, j], matrix[j, i])
+        self.assertAlmostEqual(matrix[11, 5], 0.0, 5)
+        self.assertAlmostEqual(matrix[1, 0],
+                               rmsd_to_reference(self.coords[0],
+                                                 self.coords)[1], 10)
+        rows = list(rmsd_rows(self.coords))
+        self.assertEqual([len(row) for row in rows], range(12))
+        self.assertRaises(PDBException, get_coord_stack,
+                          [self.ca_atoms, self.ca_atoms[1:]])
+
+    def test_processes_and_file(self):
+        """RMSD matrix with several processes, written to a file."""
+        matrix = rmsd_matrix(self.coords)
+        filename = tempfile.mktemp(".npy")
+        try:
+            streamed = rmsd_matrix(self.coords, num_processes=2,
+                                   filename=filename)
+            self.assert_(numpy.allclose(streamed, matrix))
+            del streamed
+            self.assert_(numpy.allclose(numpy.load(filename), matrix))
+        finally:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def test_processes_stopped(self):
+        """Stop the processes when the rows are not all used."""
+        try:
+            import multiprocessing
+        except ImportError:
+            return
+        rows = rmsd_rows(self.coords, num_processes=2, block_size=1)
+        self.assertEqual(len(rows.next()), 0)
+        self.assertEqual(len(rows.next()), 1)
+        self.assertNotEqual(multiprocessing.active_children(), [])
+        rows.close()
+        self.assertEqual(multiprocessing.active_children(), [])
+
+    def test_cluster(self):
+        """Cluster an ensemble on the RMSD matrix."""
+        try:
+            from Bio.Cluster import kmedoids
+        except ImportError:
+            return
+        matrix = rmsd_matrix(self.coords)
+        clusterid, error, nfound = kmedoids(matrix, nclusters=2, npass=10)
+        self.assertEqual(clusterid[5], clusterid[11])
+
+
+class MMCIFTest(unittest.TestCase):
+    "Testing Bio.PDB.MMCIF2Dict and MMCIFParser."
+
+    def setUp(self):
+        warnings.resetwarnings()
+        warnings.simplefilter('ignore', PDBConstructionWarning)
+
+    def test_tokenizer(self):
+        """Tokenize mmCIF values, quotes and semicolons."""
+        tokens = list(MMCIFTokenizer(StringIO(MMCIF_EXAMPLE)))
+        self.assertEqual(tokens[0], (3, "data_TEST"))
+        self.assertEqual(tokens[1], (1, "_entry.id"))
+        self.assertEqual(tokens[2], (7, "TEST"))
+        self.assertEqual(tokens[4], (4, ";A multi-line\ntitle\n;"))
+        self.assertEqual(tokens[18], (6, "'P 1'"))
+        self.assertEqual(tokens[19], (2, "loop_"))
+        tokenizer = MMCIFTokenizer(StringIO("_a.b \"O5'\" 'C1' x'\n"))
+        self.assertEqual(tokenizer.get_token(), (1, "_a.b"))
+        self.assertEqual(tokenizer.get_token(), (5, "\"O5'\""))
+        self.assertEqual(tokenizer.get_token(), (6, "'C1'"))
+        self.assertEqual(tokenizer.get_token(), (7, "x'"))
+        self.assertEqual(tokenizer.get_token(), (0, ""))
+
+    def test_dict(self):
+        """Turn an mmCIF handle into a dictionary."""
+        mmcif_dict = MMCIF2Dict(StringIO(MMCIF_EXAMPLE))
+        self.assertEqual(mmcif_dict["data_"], "TEST")
+        self.assertEqual(mmcif_dict["_entry.id"], "TEST")
+        self.assertEqual(mmcif_dict["_entity_poly.type"], ["'polypeptide(L)'"])
+        self.assertEqual(mmcif_dict["_atom_site.label_atom_id"],
+                         ["N", "CA", "N", "O"])
+
+    def test_dict_categories(self):
+        """Only load the requested mmCIF categories."""
+        mmcif_dict = MMCIF2Dict(StringIO(MMCIF_EXAMPLE), ["_atom_site"])
+        self.assert_("_entry.id" not in mmcif_dict)
+        self.assert_("_entity_poly.type" not in mmcif_dict)
+        self.assert_("_cell.length_a" not in mmcif_dict)
+        self.assertEqual(mmcif_dict["_atom_site.Cartn_x"],
+                         ["1.000", "2.000", "3.000", "9.000"])
+
+    def test_loop_arrays(self):
+        """Read the _atom_site loop into NumPy arrays."""
+        arrays = get_loop_arrays(StringIO(MMCIF_EXAMPLE))
+        self.assertEqual(len(arrays), 12)
+        self.assertEqual(arrays["_atom_site.id"].dtype.char, "i")
+        self.assertEqual(list(arrays["_atom_site.id"]), [1, 2, 3, 4])
+        self.assertEqual(arrays["_atom_site.Cartn_x"].dtype.char, "d")
+        self.assertAlmostEqual(arrays["_atom_site.B_iso_or_equiv"][3], 20.0)
+        # Unknown and inapplicable values
+        text = MMCIF_EXAMPLE.replace("1.00 10.00", "?    10.00")
+        text = text.replace("0.50 20.00", "0.50 .    ")
+        arrays = get_loop_arrays(StringIO(text))
+        self.assert_(isnan(arrays["_atom_site.occupancy"][0]))
+        self.assertAlmostEqual(arrays["_atom_site.occupancy"][1], 1.0)
+        self.assertAlmostEqual(arrays["_atom_site.B_iso_or_equiv"][0], 10.0)
+        self.assert_(isnan(arrays["_atom_site.B_iso_or_equiv"][3]))
+        # but integers can't be unknown
+        text = MMCIF_EXAMPLE.replace("ATOM   2 CA", "ATOM   ? CA")
+        try:
+            get_loop_arrays(StringIO(text))
+            self.fail("Expected a ValueError")
+        except ValueError, e:
+            self.assert_("_atom_site.id" in str(e))
+        arrays = get_loop_arrays(StringIO(text),
+                                 dtypes={"_atom_site.id": "d"})
+        self.assert_(isnan(arrays["_atom_site.id"][1]))
+        self.assertEqual(list(arrays["_atom_site.label_comp_id"]),
+                         ["GLY", "GLY", "ALA", "HOH"])
+        arrays = get_loop_arrays(StringIO(MMCIF_EXAMPLE), "_entity_poly")
+        self.assertEqual(list(arrays["_entity_poly.entity_id"]), ["1"])
+        self.assertRaises(KeyError, get_loop_arrays,
+                          StringIO(MMCIF_EXAMPLE), "_missing")
+
+    def test_parser(self):
+        """Build a structure from an mmCIF handle."""
+        structure = MMCIFParser().get_structure("test", StringIO(MMCIF_EXAMPLE))
+        chains = structure[0].get_list()
+        self.assertEqual([chain.id for chain in chains], ["A", "B"])
+        self.assertEqual([res.resname for res in chains[0]], ["GLY", "ALA"])
+        self.assertEqual(len(list(structure.get_atoms())), 4)
+
+
+
+class _PDBServerHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Stand-in for a PDB mirror, serving files from a dictionary."""
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.log.append(("CONNECT", None, None))
+
+    def do_HEAD(self):
+        self._respond(send_data=False)
+
+    def do_GET(self):
+        self._respond(send_data=True)
+
+    def _respond(self, send_data):
+        self.server.log.append((self.command, self.path,
+                                self.headers.getheader("Range")))
+        if self.path not in self.server.files:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        data = self.server.files[self.path]
+        byte_range = self.headers.getheader("Range")
+        if send_data and byte_range and self.server.ranges:
+            data = data[int(byte_range[6:-1]):]
+            self.send_response(206)
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Last-Modified", "Mon, 04 Jan 2010 10:00:00 GMT")
+        self.end_headers()
+        if send_data:
+            self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _PDBServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class PDBListTest(unittest.TestCase):
+    "Testing parallel downloads with Bio.PDB.PDBList."
+
+    def setUp(self):
+        self.codes = ["1abc", "2abd", "3xyz"]
+        self.files = {}
+        for code in self.codes:
+            handle = StringIO()
+            gz = gzip.GzipFile(fileobj=handle, mode="wb")
+            gz.write("HEADER    %s\n" % code.upper() * 100)
+            gz.close()
+            self.files["/pub/pdb/data/structures/divided/pdb/%s/pdb%s.ent.gz"
+                       % (code[1:3], code)] = handle.getvalue()
+        self.server = _PDBServer(("127.0.0.1", 0), _PDBServerHandler)
+        self.server.files = self.files
+        self.server.log = []
+        self.server.ranges = True
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+        self.local = tempfile.mkdtemp()
+        self.pdblist = PDBList(server="http://127.0.0.1:%i"
+                               % self.server.server_address[1],
+                               pdb=self.local)
+        self.stdout = sys.stdout
+        sys.stdout = StringIO()
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.local)
+
+    def check_file(self, filename, code):
+        handle = open(filename)
+        self.assertEqual(handle.read(), "HEADER    %s\n" % code.upper() * 100)
+        handle.close()
+
+    def test_retrieve(self):
+        """Retrieve files in parallel, then skip unchanged files."""
+        filenames = self.pdblist.retrieve_pdb_files(self.codes + ["4nop"],
+                                                    num_workers=2)
+        self.assertEqual(filenames[3], None)
+        for code, filename in zip(self.codes, filenames[:3]):
+            self.assertEqual(filename, os.path.join(self.local, code[1:3],
+                                                    "pdb%s.ent" % code))
+            self.check_file(filename, code)
+        connects = [entry for entry in self.server.log if entry[0] == "CONNECT"]
+        self.assert_(len(connects) <= 2)
+        # Nothing changed on the server, so nothing is downloaded
+        self.server.log = []
+        self.assertEqual(self.pdblist.retrieve_pdb_files(self.codes),
+                         filenames[:3])
+        self.assertEqual([entry for entry in self.server.log
+                          if entry[0] == "GET"], [])
+
+    def test_resume(self):
+        """Resume an interrupted download."""
+        path = "/pub/pdb/data/structures/divided/pdb/ab/pdb1abc.ent.gz"
+        os.mkdir(os.path.join(self.local, "ab"))
+        handle = open(os.path.join(self.local, "ab", "pdb1abc.ent.gz.part"),
+                      "wb")
+        handle.write(self.files[path][:20])
+        handle.close()
+        filenames = self.pdblist.retrieve_pdb_files(["1abc"])
+        self.check_file(filenames[0], "1abc")
+        self.assert_(("GET", path, "bytes=20-") in self.server.log)
+
+    def mirror_partial(self, path):
+        """Resume a download of 1abc, return the number of bytes."""
+        os.mkdir(os.path.join(self.local, "ab"))
+        handle = open(os.path.join(self.local, "ab", "pdb1abc.ent.gz.part"),
+                      "wb")
+        handle.write(self.files[path][:20])
+        handle.close()
+        connection = _open_connection(self.pdblist.pdb_server)
+        try:
+            final_file, nbytes, downloaded = self.pdblist._mirror_file(
+                connection, "1abc", 0, ".gz", "gunzip", None)
+        finally:
+            connection.close()
+        self.check_file(final_file, "1abc")
+        return nbytes
+
+    def test_resume_bytes(self):
+        """Count the bytes written when resuming a download."""
+        path = "/pub/pdb/data/structures/divided/pdb/ab/pdb1abc.ent.gz"
+        self.assertEqual(self.mirror_partial(path), len(self.files[path]) - 20)
+        # without range support, the whole file is downloaded again
+        shutil.rmtree(os.path.join(self.local, "ab"))
+        self.server.ranges = False
+        self.assertEqual(self.mirror_partial(path), len(self.files[path]))
+
+    def test_resume_revised(self):
+        """Don't resume a download of an older version of the file."""
+        path = "/pub/pdb/data/structures/divided/pdb/ab/pdb1abc.ent.gz"
+        os.mkdir(os.path.join(self.local, "ab"))
+        partial_file = os.path.join(self.local, "ab", "pdb1abc.ent.gz.part")
+        handle = open(partial_file, "wb")
+        handle.write("old version" * 2)
+        handle.close()
+        # written before the server copy was modified
+        old = time.mktime((2009, 1, 1, 0, 0, 0, 0, 0, -1))
+        os.utime(partial_file, (old, old))
+        filenames = self.pdblist.retrieve_pdb_files(["1abc"])
+        self.check_file(filenames[0], "1abc")
+        self.assert_(("GET", path, None) in self.server.log)
+
+
 # -------------------------------------------------------------
 
 if __name__ == '__main__':
@@ -0,0 +1,108 @@
+# Copyright 2026 by the Biopython contributors.  All rights reserved.
+# This code is part of the Biopython distribution and governed by its
+# license.  Please see the LICENSE file that should have been included
+# as part of this package.
+"""Tests for reading BLAST tables into NumPy arrays."""
+
+import os
+import unittest
+from StringIO import StringIO
+
+try:
+    import numpy
+except ImportError:
+    from Bio import MissingExternalDependencyError
+    raise MissingExternalDependencyError(\
+        "Install NumPy if you want to use Bio.Blast.ParseBlastTable.parse_columns")
+
+from Bio.Blast import ParseBlastTable
+
+datafile = os.path.join("Blast", "tab001.txt")
+
+class ParseColumnsTest(unittest.TestCase):
+
+    def test_columns(self):
+        "Reading a table with comment lines (tab001)"
+        chunks = list(ParseBlastTable.parse_columns(open(datafile)))
+        self.assertEqual(len(chunks), 1)
+        columns = chunks[0]
+        self.assertEqual(len(columns), 5)
+        entries = [ParseBlastTable.BlastTableEntry(line)
+                   for line in open(datafile) if line[0] != "#"]
+        self.assertEqual([columns.ids["qseqid"][code]
+                          for code in columns.qseqid],
+                         ["|".join(entry.qid) for entry in entries])
+        self.assertEqual([columns.ids["sseqid"][code]
+                          for code in columns.sseqid],
+                         ["|".join(entry.sid) for entry in entries])
+        self.assertEqual(columns.qseqid.tolist(), [0, 0, 0, 1, 1])
+        self.assertEqual(columns.pident.tolist(),
+                         [entry.pid for entry in entries])
+        self.assertEqual(columns.length.tolist(),
+                         [entry.ali_len for entry in entries])
+        self.assertEqual(columns.sstart.tolist(),
+                         [entry.s_bounds[0] for entry in entries])
+        self.assertEqual(columns.evalue.tolist(),
+                         [entry.e_value for entry in entries])
+        self.assertEqual(columns.bitscore.tolist(),
+                         [entry.bit_score for entry in entries])
+        self.assertEqual(columns.evalue.dtype, numpy.dtype("d"))
+        self.assertEqual(columns.qend.dtype, numpy.dtype("i"))
+
+    def test_chunks(self):
+        "Reading a table in small chunks"
+        text = "".join([line for line in open(datafile) if line[0] != "#"])
+        #No newline at the end
+        text = text * 3
+        text = text[:-1]
+        for block_size in [10, 100, 1000]:
+            chunks = list(ParseBlastTable.parse_columns(StringIO(text),
+                                                        block_size=block_size))
+            self.assertEqual(sum([len(chunk) for chunk in chunks]), 15)
+            self.assertEqual(chunks[-1].bitscore[-1], 242)
+            #The codes are shared between the chunks
+            codes = numpy.concatenate([chunk.sseqid for chunk in chunks])
+            self.assertEqual(codes.tolist(), [0, 1, 2, 3, 4] * 3)
+
+    def test_operations(self):
+        "Filtering, best hits and coverage"
+        columns = ParseBlastTable.parse_columns(open(datafile)).next()
+        good = columns.take(columns.evalue <= 1e-70)
+        self.assertEqual(len(good), 3)
+        best = columns.take([1, 2, 0, 4, 3]).best_hits()
+        self.assertEqual(best.sseqid.tolist(), [0, 3])
+        self.assertEqual(best.bitscore.tolist(), [622, 259])
+        lines = [line for line in open(datafile) if line[0] != "#"]
+        text = "".join(["%s\t%i\n" % (line.rstrip("\n"), 316 - i)
+                        for i, line in enumerate(lines)])
+        fields = ParseBlastTable.STANDARD_FIELDS + ("qlen",)
+        columns = ParseBlastTable.parse_columns(StringIO(text), fields).next()
+        self.assertEqual(columns.qlen.tolist(), [316, 315, 314, 313, 312])
+        self.assertEqual(columns.query_coverage()[0], 1.0)
+        self.assertEqual(columns.query_coverage()[4], 140 / 312.0)
+
+    def test_query_groups(self):
+        "Iterating over the hits of each query"
+        text = open(datafile).read()
+        for block_size in [10, 400, 100000]:
+            groups = list(ParseBlastTable.parse_query_groups(StringIO(text),
+                                                block_size=block_size))
+            self.assertEqual([query for query, hits in groups],
+                             ["gi|16080617|ref|NP_391444.1|",
+                              "gi|6273291|gb|AF191665.1|AF191665"])
+            self.assertEqual([len(hits) for query, hits in groups], [3, 2])
+            self.assertEqual(groups[0][1].evalue.tolist(),
+                             [1e-177, 2e-151, 1e-79])
+
+    def test_bad_lines(self):
+        "Reading a table with missing or bad fields"
+        self.assertRaises(ValueError, list,
+                          ParseBlastTable.parse_columns(StringIO("a\tb\t1\n")))
+        line = "a\tb\t100.0\t10\t0\t0\t1\t10\t1\t10\tnone\t50\n"
+        self.assertRaises(ValueError, list,
+                          ParseBlastTable.parse_columns(StringIO(line)))
+
+
+if __name__ == "__main__":
+    runner = unittest.TextTestRunner(verbosity = 2)
+    unittest.main(testRunner=runner)
@@ -11,7 +11,7 @@ from itertools import izip
 from cStringIO import StringIO
 
 from Bio import Phylo
-from Bio.Phylo import PhyloXML
+from Bio.Phylo import PhyloXML, NewickIO
 
 
 # Example PhyloXML files
@@ -20,6 +20,8 @@ EX_BCL2 = 'PhyloXML/bcl_2.xml'
 EX_MADE = 'PhyloXML/made_up.xml'
 EX_PHYLO = 'PhyloXML/phyloxml_examples.xml'
 EX_MOLLUSCA = 'PhyloXML/ncbi_taxonomy_mollusca.xml.zip'
+# Example Newick file
+EX_NEWICK = 'Nexus/int_node_labels.nwk'
 
 
 def unzip(fname):
@@ -239,6 +241,65 @@ class TreeTests(unittest.TestCase):
         pass
 
 
+class NewickTests(unittest.TestCase):
+    """Tests for parsing the Newick format."""
+    def test_read(self):
+        """Read a tree with internal node labels."""
+        tree = Phylo.read(EX_NEWICK, 'newick')
+        self.assertEqual(tree.root.name, 'gymnosperm')
+        self.assertEqual(len(tree.get_terminals()), 28)
+        taxaceae = tree.root.clades[0].clades[0].clades[0].clades[0]
+        self.assertEqual(taxaceae.name, 'Taxaceae')
+        self.assertEqual(taxaceae.branch_length, 90.0)
+        self.assertEqual(taxaceae.clades[0].name, 'Cephalotaxus')
+
+    def test_tags(self):
+        """Read names, support values, branch lengths and comments."""
+        tree = Phylo.read(StringIO("((A[&x=1]:0.1, B :0.2)0.95:0.3,,C);"),
+                          'newick')
+        inner, empty, c = tree.root.clades
+        self.assertEqual((inner.support, inner.branch_length), (0.95, 0.3))
+        a, b = inner.clades
+        self.assertEqual((a.name, a.branch_length, a.comment),
+                         ('A', 0.1, 'x=1'))
+        self.assertEqual((b.name, b.branch_length), ('B', 0.2))
+        self.assertEqual((empty.name, empty.clades), (None, []))
+        self.assertEqual(c.name, 'C')
+
+    def test_several_trees(self):
+        """Read several trees, on one line or spread over lines."""
+        handle = StringIO("(A,B);(C,(D,E));\n(F,\n(G,H)[&comment\n"
+                          "on two lines]);\n(I,J)\n")
+        trees = list(Phylo.parse(handle, 'newick'))
+        self.assertEqual(len(trees), 4)
+        self.assertEqual([[t.name for t in tree.get_terminals()]
+                          for tree in trees],
+                         [['A', 'B'], ['C', 'D', 'E'], ['F', 'G', 'H'],
+                          ['I', 'J']])
+        self.assertEqual(trees[2].root.clades[1].comment,
+                         'commenton two lines')
+
+    def test_deep_tree(self):
+        """Read a tree deeper than the recursion limit."""
+        size = 5000
+        text = "(" * (size - 1) + "t0" + \
+               "".join([",t%i:%i)" % (i, i) for i in range(1, size)])
+        clade = Phylo.read(StringIO(text), 'newick').root
+        depth = 0
+        while clade.clades:
+            self.assertEqual(len(clade.clades), 2)
+            self.assertEqual(clade.clades[1].name, 't%i' % (size - 1 - depth))
+            clade = clade.clades[0]
+            depth += 1
+        self.assertEqual((depth, clade.name), (size - 1, 't0'))
+
+    def test_errors(self):
+        """Report unbalanced parentheses and unterminated comments."""
+        for text in ["((A,B);", "(A,B));", "(A[&x,B);", "(A,B)(C,D);"]:
+            self.assertRaises(NewickIO.NewickError, list,
+                              Phylo.parse(StringIO(text), 'newick'))
+
+
 # ---------------------------------------------------------
 
 if __name__ == '__main__':
@@ -5,6 +5,7 @@ import unittest
 
 from Bio.Restriction import *
 from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
 from Bio.Alphabet.IUPAC import IUPACAmbiguousDNA
 
 
@@ -43,6 +44,21 @@ class SimpleEnzyme(unittest.TestCase):
         locations = EcoRI.search(parts[0], linear = False)
         assert locations == [1]
 
+    def test_compsite(self):
+        """The site regular expression is compiled when first needed.
+        """
+        from Bio.Restriction.Restriction import SiteScanner
+        if '_compiled_site' in Sse8647I.__dict__:
+            #Already used by another test
+            del Sse8647I._compiled_site
+        SiteScanner([Sse8647I])
+        assert '_compiled_site' not in Sse8647I.__dict__
+        assert Sse8647I.compsite.pattern == \
+               '(?P<Sse8647I>AGG[AT]CCT)|(?P<Sse8647I_as>AGG[AT]CCT)'
+        assert Sse8647I.compsite is Sse8647I.compsite
+        assert Sse8647I.search(Seq("AAAGGACCTAA", IUPACAmbiguousDNA())) \
+               == [5]
+
 class EnzymeComparison(unittest.TestCase):
     """Tests for comparing various enzymes.
     """
@@ -114,6 +130,191 @@ class RestrictionBatches(unittest.TestCase):
         assert hits[EcoRV] == [8] and hits[EcoRI] == [16]
 
 
+class SiteScanning(unittest.TestCase):
+    """Tests for searching with many enzymes in one pass.
+    """
+    def compare(self, batch, seq, linear):
+        """Check the batch search agrees with each enzyme's own search."""
+        hits = batch.search(seq, linear)
+        for enzyme in batch:
+            self.assertEqual(hits[enzyme], enzyme.search(seq, linear),
+                             "%s on %s" % (enzyme, seq))
+        return hits
+
+    def test_all_enzymes(self):
+        """Search with all the enzymes, linear and circular.
+        """
+        import random
+        random.seed(1)
+        batch = RestrictionBatch(AllEnzymes)
+        for letters in ["ACGT", "GC", "ACGTACGTNRY"]:
+            seq = Seq("".join([random.choice(letters) for i in range(2000)]),
+                      IUPACAmbiguousDNA())
+            for linear in [True, False]:
+                self.compare(batch, seq, linear)
+        scanner = batch.scanner()
+        self.assertEqual(scanner.others, [])
+        #The scanner is kept until the batch changes
+        self.assert_(batch.scanner() is scanner)
+        batch.remove(EcoRI)
+        self.assert_(batch.scanner() is not scanner)
+
+    def test_overlapping_sites(self):
+        """Overlapping sites and sites spanning the origin.
+        """
+        batch = RestrictionBatch([EcoRI, HhaI, BsaI, AluI])
+        seq = Seq("ATTCGCGCGCTTCGAGACCGAGACCAGCAGCTATTCGGA",
+                  IUPACAmbiguousDNA())
+        hits = self.compare(batch, seq, True)
+        #Only the first of the overlapping HhaI sites is used
+        self.assertEqual(hits[HhaI], [8])
+        #BsaI sites on the reverse strand
+        self.assertEqual(hits[BsaI], [9, 15])
+        self.assertEqual(hits[EcoRI], [])
+        hits = self.compare(batch, seq, False)
+        self.assertEqual(hits[EcoRI], [39])
+        self.compare(batch, Seq("GAATT", IUPACAmbiguousDNA()), False)
+        self.compare(batch, Seq("", IUPACAmbiguousDNA()), True)
+
+
+class ConcurrentSearch(unittest.TestCase):
+    """Tests for searching several sequences at once.
+    """
+    def setUp(self):
+        import random
+        random.seed(2)
+        self.seqs = [Seq("".join([random.choice("ACGT") for i in range(3000)]),
+                         IUPACAmbiguousDNA()) for j in range(8)]
+        self.batch = RestrictionBatch([EcoRI, BsaI, HhaI, AluI, BglI, EcoRV])
+        self.expected = [dict([(enzyme, enzyme.search(seq))
+                               for enzyme in self.batch])
+                         for seq in self.seqs]
+
+    def test_threads(self):
+        """Searching with the same enzymes in several threads.
+        """
+        import threading
+        found = {}
+        def work(index):
+            for i in range(20):
+                seq = self.seqs[(index + i) % len(self.seqs)]
+                found[index, i] = (seq, self.batch.search(seq),
+                                   EcoRI.search(seq), BsaI.catalyse(seq))
+        threads = [threading.Thread(target=work, args=(index,))
+                   for index in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(found), 80)
+        for seq, hits, eco, fragments in found.itervalues():
+            expected = self.expected[self.seqs.index(seq)]
+            self.assertEqual(hits, expected)
+            self.assertEqual(eco, expected[EcoRI])
+            self.assertEqual(len(fragments), len(expected[BsaI]) + 1)
+
+    def test_search_many(self):
+        """Searching a list of sequences in threads or processes.
+        """
+        self.assertEqual(self.batch.search_many(self.seqs), self.expected)
+        self.assertEqual(self.batch.search_many(self.seqs, num_threads=3),
+                         self.expected)
+        self.assertEqual(self.batch.search_many(self.seqs, num_processes=2),
+                         self.expected)
+        circular = self.batch.search_many(self.seqs[:2], linear=False)
+        self.assertEqual(circular[1], self.batch.search(self.seqs[1], False))
+        self.assertRaises(TypeError, self.batch.search_many, ["GAATTC"],
+                          num_threads=2)
+
+    def test_process_error(self):
+        """Stop the processes when a search fails in one of them.
+        """
+        try:
+            import multiprocessing
+        except ImportError:
+            return
+        from Bio.Restriction.Restriction import FormattedSeq
+        broken = FormattedSeq(self.seqs[0])
+        #   fails in the worker process, when the sequence is searched
+        broken.data = None
+        self.assertRaises(TypeError, self.batch.search_many,
+                          [broken] + self.seqs, num_processes=2)
+        self.assertEqual(multiprocessing.active_children(), [])
+
+
+class VirtualDigest(unittest.TestCase):
+    """Tests for digesting many sequences with a batch of enzymes.
+    """
+    def setUp(self):
+        import random
+        random.seed(3)
+        self.records = [SeqRecord(Seq("".join([random.choice("ACGT")
+                                               for i in range(2000)]),
+                                      IUPACAmbiguousDNA()), id=str(j))
+                        for j in range(10)]
+        self.records.append(SeqRecord(Seq("A" * 100, IUPACAmbiguousDNA()),
+                                      id="uncut"))
+        self.batch = RestrictionBatch([EcoRI, HhaI, BsaI, AluI, DdeI])
+
+    def check(self, digest, linear):
+        """Compare the digests with the fragments of catalyse."""
+        self.assertEqual([record.id for record, cuts, sizes in digest],
+                         [record.id for record in self.records])
+        for record, cuts, sizes in digest:
+            self.assertEqual(sum(sizes), len(record))
+            #An uncut circular sequence is still one fragment
+            self.assertEqual(len(sizes), max(len(cuts) + linear, 1))
+            for enzyme in self.batch:
+                for cut in enzyme.search(record.seq, linear):
+                    assert cut in cuts or (linear and cut == 1)
+            single = RestrictionBatch([EcoRI]).digest([record], linear)
+            self.assertEqual(list(list(single)[0][2]),
+                             [len(f) for f in EcoRI.catalyse(record.seq,
+                                                             linear)])
+
+    def test_linear(self):
+        """Digest of linear sequences.
+        """
+        digest = list(self.batch.digest(self.records))
+        self.check(digest, True)
+        record, cuts, sizes = digest[-1]
+        self.assertEqual((list(cuts), list(sizes)), ([], [100]))
+
+    def test_circular(self):
+        """Digest of circular sequences.
+        """
+        digest = list(self.batch.digest(iter(self.records), linear=False))
+        self.check(digest, False)
+        seq = Seq("AATTCAAAAAAAAAGCTAAAAAAG", IUPACAmbiguousDNA())
+        record, cuts, sizes = list(RestrictionBatch([EcoRI, AluI]).digest(
+            [SeqRecord(seq)], linear=False))[0]
+        self.assertEqual(list(cuts), [1, 16])
+        self.assertEqual(list(sizes), [9, 15])
+
+    def test_processes(self):
+        """Digest in several processes.
+        """
+        for linear in [True, False]:
+            serial = list(self.batch.digest(self.records, linear))
+            digest = list(self.batch.digest(iter(self.records), linear,
+                                            num_processes=2, chunk_size=3))
+            self.assertEqual(digest, serial)
+
+    def test_processes_stopped(self):
+        """Stop the processes when the digests are not all used.
+        """
+        try:
+            import multiprocessing
+        except ImportError:
+            return
+        digest = self.batch.digest(self.records, num_processes=2,
+                                   chunk_size=1)
+        self.assertEqual(digest.next()[0].id, "0")
+        self.assertNotEqual(multiprocessing.active_children(), [])
+        digest.close()
+        self.assertEqual(multiprocessing.active_children(), [])
+
+
 if __name__ == "__main__":
     runner = unittest.TextTestRunner(verbosity = 2)
     unittest.main(testRunner=runner)